@@ -1,43 +1,66 @@
+import threading
+import time
 import streamlit as st
 from langchain import PromptTemplate
-from langchain.chains import RetrievalQA
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFacePipeline
 from transformers import pipeline
 from config.paths_config import *
 from utils.common_functions import read_yaml
+from src.data_retrieval import DataRetriever
+from src.data_generator import DataGenerator
+from src.answer_cache import open_answer_cache
+from src.text_streaming import stream_generate, stop_at, StreamTimer
+from src.context_packer import ContextPacker
+from src.micro_batcher import MicroBatcher
+from src.logger import get_logger
+from utils.helpers import content_hash
+
+logger = get_logger(__name__)
 
 config = read_yaml(CONFIG_PATH)
 
+# The model keeps going after its answer; everything from this marker on is cut off
+END_MARKER = "|end|"
+
+# Decoding params of the app's LLM, also part of the answer cache key
+LLM_SETTINGS = {
+    "model": config['text_to_text_model'],
+    "max_new_tokens": 512,
+    "do_sample": True,
+    "temperature": 0.6,
+    "context_token_budget": config['data_generator']['context_token_budget'] if config['data_generator'].get('context_packing') else None
+}
+
 # Title
 st.set_page_config(page_title="RAG QA App")
 st.title("📚 RAG Question Answering")
 
-# Load embeddings and vector DB
+# Load embeddings and vector DB (memory-mapped store, ANN index and query cache as configured)
 @st.cache_resource
-def load_vector_db():
-    embedding_model = HuggingFaceEmbeddings(model_name=config['embedding_model'])
-    vector_db = FAISS.load_local(
-        VECTORDB_PATH,
-        embedding_model,
-        allow_dangerous_deserialization=True
-    )
-    return vector_db
+def load_retriever():
+    retriever = DataRetriever(config, VECTORDB_PATH, RETRIEVAL_STORE_DIR, RETRIEVAL_DIR)
+    retriever.load_vectordb()
+    retriever.top_k = config['data_generator']['top_k']
+    return retriever
 
 # Load LLM
 @st.cache_resource
 def load_llm():
     llm_pipeline = pipeline(
         "text2text-generation",
-        model=config['text_to_text_model'],
-        tokenizer=config['text_to_text_model'],
-        max_new_tokens=512,
-        do_sample=True,
-        temperature=0.6,
+        model=LLM_SETTINGS['model'],
+        tokenizer=LLM_SETTINGS['model'],
+        max_new_tokens=LLM_SETTINGS['max_new_tokens'],
+        do_sample=LLM_SETTINGS['do_sample'],
+        temperature=LLM_SETTINGS['temperature'],
         device=-1  # CPU; change to 0 for GPU
     )
-    return HuggingFacePipeline(pipeline=llm_pipeline)
+    return llm_pipeline
+
+# One lock for the app's model and tokenizer: Streamlit runs every session on its own thread, and
+# HF fast tokenizers and generate() must not be entered by two of them at once
+@st.cache_resource
+def load_llm_lock():
+    return threading.RLock()
 
 # Load prompt template
 def get_prompt_template():
@@ -45,31 +68,108 @@ def get_prompt_template():
 
     return PromptTemplate(template=template, input_variables=["context", "question"])
 
-# Initialize RAG chain
+# Answer cache shared by every session of this app process
 @st.cache_resource
-def build_rag_chain():
-    retriever = load_vector_db().as_retriever(search_kwargs={"k": config['data_generator']['top_k']})
-    prompt = get_prompt_template()
-    llm = load_llm()
-    rag_chain = RetrievalQA.from_chain_type(
-        llm=llm,
-        chain_type='stuff',
-        retriever=retriever,
-        chain_type_kwargs={"prompt": prompt},
-        verbose=True
-    )
-    return rag_chain
+def load_answer_cache():
+    return open_answer_cache(ANSWER_CACHE_DIR, config)
+
+# Merges overlapping retrieved chunks and fits them into the context token budget
+@st.cache_resource
+def load_packer():
+    if not config['data_generator'].get('context_packing', False):
+        return None
+    return ContextPacker(load_llm().tokenizer, config['data_generator'], config['data_generator'].get('max_input_length', 2048))
+
+def build_context(query, chunks):
+    packer = load_packer()
+    if packer is not None:
+        # the packer counts tokens with the shared pipeline tokenizer
+        with load_llm_lock():
+            reserved_tokens = len(load_llm().tokenizer(get_prompt_template().format(context="", question=query))["input_ids"])
+            chunks = packer.pack(chunks, reserved_tokens=reserved_tokens)
+    return "\n\n".join(chunks)
+
+# Text deltas of the answer as the LLM decodes them; generate() runs on a background thread
+def stream_llm(prompt):
+    llm_pipeline = load_llm()
+    with load_llm_lock():
+        inputs = llm_pipeline.tokenizer(
+            prompt,
+            return_tensors="pt",
+            max_length=config['data_generator'].get('max_input_length', 2048),
+            truncation=True
+        )
+    generation_kwargs = {k: v for k, v in LLM_SETTINGS.items() if k not in ("model", "context_token_budget")}
+    # the generate() thread holds the lock until the answer is done or the stream is closed
+    return stream_generate(llm_pipeline.model, llm_pipeline.tokenizer, inputs, generation_kwargs, lock=load_llm_lock())
+
+# The batch generator of the pipeline, loaded only when micro-batching is on. Its answers use the
+# data_generator decoding settings and input truncation, and its own answer cache key, not LLM_SETTINGS
+@st.cache_resource
+def load_generator():
+    generator = DataGenerator(config, RETRIEVAL_STORE_DIR, GENERATOR_DIR, GENERATOR_STORE_DIR)
+    generator.set_query_embedder(load_retriever().embed_query)
+    generator.model_lock = load_llm_lock()
+    return generator
+
+# Whole answers for the questions of every session that arrived within the batching window:
+# one embedding call, one index search and one generate() over the answer cache misses
+def answer_batch(queries):
+    retriever = load_retriever()
+    query_vectors = retriever.embed_queries(queries)
+    rows = retriever.retrieve_batch(queries, query_vectors)
+    pairs = [(query, [row["document"] for row in query_rows]) for query, query_rows in zip(queries, rows)]
+    return load_generator().cached_batch(pairs, query_vectors=query_vectors)
+
+# One scheduler per app process, shared by every session; None when micro-batching is off
+@st.cache_resource
+def load_answer_batcher():
+    batching = config.get('micro_batching', {})
+    if not batching.get('enabled', False):
+        return None
+    return MicroBatcher("app_answer", answer_batch, max_batch_size=batching.get('max_batch_size', 16), max_wait_ms=batching.get('max_wait_ms', 10))
+
+def stream_answer(query):
+    # batched answers arrive whole: throughput under concurrent sessions instead of token streaming
+    batcher = load_answer_batcher()
+    if batcher is not None:
+        yield from stop_at(iter([batcher.submit(query).result()]), END_MARKER)
+        return
+
+    # retrieve the top_k chunks and fill the prompt template with their packed context
+    retriever = load_retriever()
+    query_vector = retriever.embed_query(query)
+    chunks = [row["document"] for row in retriever.retrieve(query, query_vector)]
+    prompt = get_prompt_template().format(context=build_context(query, chunks), question=query)
+
+    # stop_at ends the answer at the end marker and stops the model's generate() thread with it
+    answer_cache = load_answer_cache()
+    if answer_cache is None:
+        yield from stop_at(stream_llm(prompt), END_MARKER)
+        return
+
+    chunk_ids = [content_hash(chunk) for chunk in chunks]
+    answer = answer_cache.lookup(query, query_vector, chunk_ids, LLM_SETTINGS)
+    if answer is not None:
+        yield from stop_at(iter([answer]), END_MARKER)
+        return
+
+    # only an answer that was read to its end is cached
+    start = time.perf_counter()
+    parts = []
+    for delta in stop_at(stream_llm(prompt), END_MARKER):
+        parts.append(delta)
+        yield delta
+    answer_cache.put(query, query_vector, chunk_ids, LLM_SETTINGS, "".join(parts), time.perf_counter() - start)
 
 # Input box
 query = st.text_input("Ask a question:")
 
 if query:
-    with st.spinner("Generating answer..."):
-        rag = build_rag_chain()
-        result = rag.invoke(query)
-        output_text = result['result']
-        end_token = "|end|"
-
-        if end_token in output_text:
-            output_text = output_text.split(end_token)[0].strip()
-        st.success(output_text)
+    # tokens are rendered as they arrive; the answer ends at the model's end token
+    timer = StreamTimer()
+    st.write_stream(timer.wrap(stream_answer(query)))
+    timing = timer.as_dict()
+    logger.info(f"App answer timing: time to first token {timing['ttft_ms']} ms, total {timing['total_ms']} ms")
+    if timing['ttft_ms'] is not None and timing['total_ms'] is not None:
+        st.caption(f"First token after {timing['ttft_ms']:.0f} ms, full answer after {timing['total_ms']:.0f} ms")
@@ -0,0 +1,85 @@
+import argparse
+import os
+import time
+import faiss
+import numpy as np
+from config.paths_config import *
+from src.ann_index import build_ann_index, set_search_params, index_memory_bytes
+from src.retrieval_engine import normalize_rows
+
+# Recall@k against exact search, query latency, build time and index memory of every vector_index
+# type, on the real vector DB or on synthetic clustered unit vectors of the same dimension.
+#   python benchmarks/ann_benchmark.py --vectors 200000 --queries 1000
+#   python benchmarks/ann_benchmark.py --from-vector-db
+
+CONFIGS = [
+    ("flat", {"type": "flat"}, [{}]),
+    ("hnsw M=16", {"type": "hnsw", "hnsw_m": 16, "ef_construction": 200}, [{"ef_search": ef} for ef in (16, 64, 128)]),
+    ("hnsw M=32", {"type": "hnsw", "hnsw_m": 32, "ef_construction": 200}, [{"ef_search": ef} for ef in (16, 64, 128)]),
+    ("ivf_flat", {"type": "ivf_flat"}, [{"nprobe": n} for n in (1, 8, 32)]),
+    ("ivf_pq 16x8", {"type": "ivf_pq", "pq_m": 16, "pq_bits": 8}, [{"nprobe": n} for n in (8, 32)]),
+    ("ivf_pq 48x8", {"type": "ivf_pq", "pq_m": 48, "pq_bits": 8}, [{"nprobe": n} for n in (8, 32)]),
+]
+
+
+def synthetic_vectors(num_vectors, dim, num_clusters=256, seed=0):
+    # embeddings of real text are clustered, uniform random vectors would flatter no index
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(num_clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, num_clusters, num_vectors)
+    return normalize_rows(centers[labels] + 0.6 * rng.normal(size=(num_vectors, dim)).astype(np.float32))
+
+
+def recall_at_k(truth, found):
+    return float(np.mean([len(set(t) & set(f)) / len(t) for t, f in zip(truth, found)]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--from-vector-db", action="store_true")
+    args = parser.parse_args()
+
+    if args.from_vector_db:
+        flat = faiss.read_index(os.path.join(VECTORDB_PATH, "index.faiss"))
+        vectors = normalize_rows(flat.reconstruct_n(0, flat.ntotal))
+    else:
+        vectors = synthetic_vectors(args.vectors, args.dim)
+
+    # queries are perturbed corpus vectors, the way a question lands near the chunk that answers it
+    rng = np.random.default_rng(1)
+    queries = normalize_rows(vectors[rng.choice(len(vectors), args.queries)] + 0.3 * rng.normal(size=(args.queries, vectors.shape[1])).astype(np.float32))
+
+    exact = faiss.IndexFlatIP(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, args.top_k)
+    print(f"vectors: {len(vectors)} x {vectors.shape[1]}  queries: {len(queries)}  k: {args.top_k}")
+    print(f"{'index':<14} {'params':<14} {'recall@k':>9} {'p50 ms':>8} {'p95 ms':>8} {'build s':>8} {'memory MB':>10}")
+
+    for name, index_config, search_params in CONFIGS:
+        if index_config["type"] == "flat":
+            start = time.perf_counter()
+            index = faiss.IndexFlatIP(vectors.shape[1])
+            index.add(vectors)
+        else:
+            start = time.perf_counter()
+            index = build_ann_index(vectors, index_config)
+        build_time = time.perf_counter() - start
+        memory_mb = index_memory_bytes(index) / (1024 * 1024)
+
+        for params in search_params:
+            set_search_params(index, nprobe=params.get("nprobe"), ef_search=params.get("ef_search"))
+            # one query at a time, as the retriever serves them
+            latencies = []
+            found = []
+            for query in queries:
+                query_start = time.perf_counter()
+                _, ids = index.search(query[None, :], args.top_k)
+                latencies.append(1000 * (time.perf_counter() - query_start))
+                found.append(ids[0])
+            label = ", ".join(f"{k}={v}" for k, v in params.items()) or "-"
+            print(f"{name:<14} {label:<14} {recall_at_k(truth, found):9.3f} {np.percentile(latencies, 50):8.3f} "
+                  f"{np.percentile(latencies, 95):8.3f} {build_time:8.2f} {memory_mb:10.1f}")
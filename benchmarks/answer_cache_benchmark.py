@@ -0,0 +1,69 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+from config.paths_config import *
+from utils.common_functions import read_yaml
+from src.answer_cache import AnswerCache
+from src.data_retrieval import DataRetriever
+from src.data_generator import DataGenerator
+
+# Replays a question file plus light paraphrases of it through retrieval + generation with and
+# without the answer cache, and reports hit rates and latency saved.
+#   python benchmarks/answer_cache_benchmark.py artifacts/retrieval/queries.txt --repeats 3
+
+TEMPLATES = ["{q}", "{q_lower}", "Please tell me: {q}", "{q} Explain briefly.", "  {q}  "]
+
+
+def workload(questions, repeats, seed=0):
+    rng = random.Random(seed)
+    replay = []
+    for _ in range(repeats):
+        for question in questions:
+            template = rng.choice(TEMPLATES)
+            replay.append(template.format(q=question, q_lower=question.lower()))
+    rng.shuffle(replay)
+    return replay
+
+
+def run(retriever, generator, replay):
+    start = time.perf_counter()
+    for question in replay:
+        rows = retriever.retrieve(question)
+        generator.answer_question(question, [row["document"] for row in rows])
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("queries_file", nargs="?", default=QUERIES_FILE_PATH)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--threshold", type=float, default=None)
+    args = parser.parse_args()
+
+    config = read_yaml(CONFIG_PATH)
+    threshold = args.threshold or config.get("answer_cache", {}).get("similarity_threshold", 0.95)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        retriever = DataRetriever(config, VECTORDB_PATH, os.path.join(tmp, "retrieval"), tmp)
+        retriever.load_vectordb()
+        retriever.load_query_file(args.queries_file)
+        replay = workload(retriever.questions, args.repeats)
+
+        generator = DataGenerator(config, os.path.join(tmp, "retrieval"), tmp, os.path.join(tmp, "generator"))
+        generator.set_query_embedder(retriever.embed_query)
+
+        generator.answer_cache = None
+        uncached = run(retriever, generator, replay)
+
+        generator.answer_cache = AnswerCache(os.path.join(tmp, "answers"), config["embedding_model"], similarity_threshold=threshold)
+        cached = run(retriever, generator, replay)
+        stats = generator.answer_cache.stats()
+
+    n = len(replay)
+    print(f"questions: {n} ({len(set(replay))} distinct strings)  semantic threshold: {threshold}")
+    print(f"no cache:     {n / uncached:8.2f} answers/sec")
+    print(f"answer cache: {n / cached:8.2f} answers/sec  ({uncached / cached:.1f}x)")
+    print(f"exact hits {stats['exact_hits']}  semantic hits {stats['semantic_hits']}  misses {stats['misses']}  "
+          f"hit rate {stats['hit_rate']:.2%}  generation time saved {stats['latency_saved_seconds']:.1f}s")
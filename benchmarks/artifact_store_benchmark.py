@@ -0,0 +1,62 @@
+import argparse
+import os
+import tempfile
+import time
+import pandas as pd
+from src.artifact_store import ArtifactStore, new_run_id
+
+# Per-query save cost of the old read-concat-rewrite CSV versus the append-only store,
+# plus the cost of finding the last run again.
+#   python benchmarks/artifact_store_benchmark.py --queries 2000
+
+
+def rows(query, top_k, run_id=None):
+    df = pd.DataFrame({
+        "query": [query] * top_k,
+        "document": [f"chunk {i} for {query} " * 20 for i in range(top_k)],
+        "score": [1.0 - i / top_k for i in range(top_k)]
+    })
+    if run_id:
+        df.insert(0, "run_id", run_id)
+    return df
+
+
+def csv_append(path, df):
+    if os.path.exists(path):
+        df = pd.concat([pd.read_csv(path), df], ignore_index=True)
+    df.to_csv(path, index=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "retrived_df.csv")
+        start = time.perf_counter()
+        for q in range(args.queries):
+            csv_append(csv_path, rows(f"question {q}", args.top_k))
+        csv_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        df = pd.read_csv(csv_path)
+        last_query = df["query"].iloc[-1]
+        df[df["query"] == last_query]
+        csv_read = time.perf_counter() - start
+
+        store = ArtifactStore(os.path.join(tmp, "store"))
+        start = time.perf_counter()
+        for q in range(args.queries):
+            store.append(rows(f"question {q}", args.top_k, new_run_id()))
+        store_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        store.read_run(store.latest_run_id())
+        store_read = time.perf_counter() - start
+
+    n = args.queries
+    print(f"queries: {n}  rows per query: {args.top_k}")
+    print(f"csv rewrite:  {1000 * csv_time / n:8.2f} ms/save  last run lookup {1000 * csv_read:8.2f} ms")
+    print(f"append store: {1000 * store_time / n:8.2f} ms/save  last run lookup {1000 * store_read:8.2f} ms  ({csv_time / store_time:.1f}x)")
@@ -0,0 +1,209 @@
+import argparse
+import difflib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from config.paths_config import *
+from utils.common_functions import read_yaml
+
+# Inference backends (inference.embedding_backend / generator_backend in config.yaml) against the
+# float32 torch baseline. Each backend is loaded in a fresh process, so load time and RSS are its own.
+# Embeddings: latency per batch, chunks/s, RSS, then cosine to the baseline vector of the same chunk
+# and overlap@k of the top-k chunks for every query. Generator: latency per answer, tokens/s, RSS,
+# and greedy-decoded answers compared with the baseline's (exact match and sequence similarity).
+#   python benchmarks/backend_comparison.py --backends torch torch_int8 onnx --chunks 2000 --queries 200
+#   MODEL_LOADER_MODULE=stand_in_models python benchmarks/backend_comparison.py   (offline plumbing check)
+
+
+def memory_mb():
+    if os.path.exists("/proc/self/statm"):
+        with open("/proc/self/statm", "r") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def load_texts(num_chunks, num_queries):
+    # the processed chunks and saved queries when the pipeline has run, synthetic text otherwise
+    if os.path.exists(CHUNKS_DF_PATH):
+        chunks = pd.read_csv(CHUNKS_DF_PATH)["chunks_text"].astype(str).tolist()[:num_chunks]
+    else:
+        rng = np.random.default_rng(0)
+        chunks = [" ".join(f"word{w}" for w in rng.integers(0, 5000, 120)) for _ in range(num_chunks)]
+    if os.path.exists(QUERIES_FILE_PATH):
+        with open(QUERIES_FILE_PATH, "r", encoding="utf-8") as file:
+            queries = [line.strip() for line in file if line.strip()][:num_queries]
+    else:
+        # the opening words of random chunks, so every query has an obvious neighbourhood
+        rng = np.random.default_rng(1)
+        queries = [" ".join(chunks[i].split()[:12]) for i in rng.integers(0, len(chunks), num_queries)]
+    return chunks, queries
+
+
+def percentiles(latencies_ms):
+    return round(float(np.percentile(latencies_ms, 50)), 3), round(float(np.percentile(latencies_ms, 95)), 3)
+
+
+def child_embeddings(args, config, chunks, queries):
+    from src.model_loader import load_embeddings
+
+    rss_before = memory_mb()
+    start = time.perf_counter()
+    model = load_embeddings(config["embedding_model"], backend=args.backend, encode_kwargs={"batch_size": args.batch_size})
+    load_ms = 1000 * (time.perf_counter() - start)
+
+    latencies, vectors = [], []
+    for begin in range(0, len(chunks), args.batch_size):
+        batch_start = time.perf_counter()
+        vectors.extend(model.embed_documents(chunks[begin:begin + args.batch_size]))
+        latencies.append(1000 * (time.perf_counter() - batch_start))
+    query_latencies, query_vectors = [], []
+    for query in queries:
+        query_start = time.perf_counter()
+        query_vectors.append(model.embed_query(query))
+        query_latencies.append(1000 * (time.perf_counter() - query_start))
+
+    np.save(os.path.join(args.workdir, f"{args.backend}_chunks.npy"), np.asarray(vectors, dtype=np.float32))
+    np.save(os.path.join(args.workdir, f"{args.backend}_queries.npy"), np.asarray(query_vectors, dtype=np.float32))
+    p50, p95 = percentiles(latencies)
+    query_p50, query_p95 = percentiles(query_latencies)
+    return {
+        "load_ms": round(load_ms, 1), "batch_p50_ms": p50, "batch_p95_ms": p95,
+        "query_p50_ms": query_p50, "query_p95_ms": query_p95,
+        "throughput": round(len(chunks) / (sum(latencies) / 1000), 2), "rss_mb": round(memory_mb() - rss_before, 1)
+    }
+
+
+def child_generator(args, config, chunks, queries):
+    from src.model_loader import load_tokenizer, load_seq2seq_model, onnx_export_dir
+
+    model_name = config["text_to_text_model"]
+    rss_before = memory_mb()
+    start = time.perf_counter()
+    tokenizer = load_tokenizer(model_name)
+    model = load_seq2seq_model(model_name, backend=args.backend, onnx_dir=onnx_export_dir(MODELS_DIR, model_name))
+    load_ms = 1000 * (time.perf_counter() - start)
+
+    # greedy decoding, so any difference between backends comes from the numerics
+    prompts = [f"Context: {chunks[i % len(chunks)]}\nQuestion: {query}\nAnswer:" for i, query in enumerate(queries[:args.answers])]
+    latencies, answers, tokens = [], [], 0
+    for prompt in prompts:
+        answer_start = time.perf_counter()
+        inputs = tokenizer(prompt, max_length=config["data_generator"].get("max_input_length", 2048), truncation=True, return_tensors="pt")
+        outputs = model.generate(**inputs, max_new_tokens=args.max_new_tokens, do_sample=False, num_beams=1)
+        answers.append(tokenizer.decode(outputs[0], skip_special_tokens=True))
+        latencies.append(1000 * (time.perf_counter() - answer_start))
+        tokens += len(outputs[0])
+
+    with open(os.path.join(args.workdir, f"{args.backend}_answers.json"), "w", encoding="utf-8") as file:
+        json.dump(answers, file)
+    p50, p95 = percentiles(latencies)
+    return {
+        "load_ms": round(load_ms, 1), "p50_ms": p50, "p95_ms": p95,
+        "throughput": round(tokens / (sum(latencies) / 1000), 2), "rss_mb": round(memory_mb() - rss_before, 1)
+    }
+
+
+def top_k(chunk_vectors, query_vectors, k):
+    chunk_vectors = chunk_vectors / np.linalg.norm(chunk_vectors, axis=1, keepdims=True)
+    query_vectors = query_vectors / np.linalg.norm(query_vectors, axis=1, keepdims=True)
+    return np.argsort(-(query_vectors @ chunk_vectors.T), axis=1, kind="stable")[:, :k]
+
+
+def embedding_agreement(workdir, baseline, backend, k):
+    base_chunks = np.load(os.path.join(workdir, f"{baseline}_chunks.npy"))
+    chunks = np.load(os.path.join(workdir, f"{backend}_chunks.npy"))
+    cosine = np.sum(base_chunks * chunks, axis=1) / (np.linalg.norm(base_chunks, axis=1) * np.linalg.norm(chunks, axis=1))
+
+    # each backend ranks the chunks with its own query and chunk vectors
+    base_top = top_k(base_chunks, np.load(os.path.join(workdir, f"{baseline}_queries.npy")), k)
+    backend_top = top_k(chunks, np.load(os.path.join(workdir, f"{backend}_queries.npy")), k)
+    overlap = [len(set(a) & set(b)) / k for a, b in zip(base_top.tolist(), backend_top.tolist())]
+    return {"cosine_mean": round(float(cosine.mean()), 5), "cosine_min": round(float(cosine.min()), 5), f"overlap@{k}": round(float(np.mean(overlap)), 4)}
+
+
+def generator_agreement(workdir, baseline, backend):
+    with open(os.path.join(workdir, f"{baseline}_answers.json"), "r", encoding="utf-8") as file:
+        base_answers = json.load(file)
+    with open(os.path.join(workdir, f"{backend}_answers.json"), "r", encoding="utf-8") as file:
+        answers = json.load(file)
+    similarity = [difflib.SequenceMatcher(None, a, b).ratio() for a, b in zip(base_answers, answers)]
+    return {
+        "exact_match": round(float(np.mean([a == b for a, b in zip(base_answers, answers)])), 4),
+        "similarity_mean": round(float(np.mean(similarity)), 4), "similarity_min": round(float(np.min(similarity)), 4)
+    }
+
+
+def spawn(args, model, backend, workdir):
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", model, "--backend", backend, "--workdir", workdir,
+         "--chunks", str(args.chunks), "--queries", str(args.queries), "--answers", str(args.answers),
+         "--batch-size", str(args.batch_size), "--max-new-tokens", str(args.max_new_tokens)],
+        capture_output=True, text=True, env={**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+    )
+    if result.returncode != 0:
+        # optional runtimes (optimum / onnxruntime) may be missing; report it and go on
+        print(f"{model} {backend}: failed - {(result.stderr.strip().splitlines() or ['no output'])[-1]}")
+        return None
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def compare(args, model, workdir):
+    results = {}
+    for backend in args.backends:
+        stats = spawn(args, model, backend, workdir)
+        if stats is None:
+            continue
+        if backend != args.baseline and args.baseline in results:
+            if model == "embeddings":
+                stats.update(embedding_agreement(workdir, args.baseline, backend, args.k))
+            else:
+                stats.update(generator_agreement(workdir, args.baseline, backend))
+        results[backend] = stats
+
+    print(f"\n{model}")
+    # timing columns first, then the agreement columns the compared backends add
+    columns = list(dict.fromkeys(key for stats in results.values() for key in stats))
+    print(f"{'backend':<12}" + "".join(f"{column:>16}" for column in columns))
+    for backend, stats in results.items():
+        print(f"{backend:<12}" + "".join(f"{stats[c]:>16}" if c in stats else f"{'-':>16}" for c in columns))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backends", nargs="+", default=["torch", "torch_int8", "onnx"])
+    parser.add_argument("--baseline", default="torch")
+    parser.add_argument("--models", nargs="+", choices=["embeddings", "generator"], default=["embeddings", "generator"])
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--answers", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--output")
+    parser.add_argument("--child", choices=["embeddings", "generator"])
+    parser.add_argument("--backend")
+    parser.add_argument("--workdir")
+    args = parser.parse_args()
+
+    config = read_yaml(CONFIG_PATH)
+    if args.child:
+        chunks, queries = load_texts(args.chunks, args.queries)
+        run_child = child_embeddings if args.child == "embeddings" else child_generator
+        print(json.dumps(run_child(args, config, chunks, queries)))
+        sys.exit(0)
+
+    # the baseline runs first, every other backend is compared with it
+    args.backends = [args.baseline] + [backend for backend in args.backends if backend != args.baseline]
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {model: compare(args, model, tmp) for model in args.models}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+        print(f"results written to {args.output}")
@@ -0,0 +1,49 @@
+import argparse
+import os
+import tempfile
+import time
+from config.paths_config import *
+from utils.common_functions import read_yaml
+from src.data_retrieval import DataRetriever
+
+# Queries/sec of the batch retrieval mode versus looping over the single-question path,
+# both against the real vector DB built by the ingestion pipeline.
+#   python benchmarks/batch_retrieval_benchmark.py artifacts/retrieval/queries.txt
+
+
+def make_retriever(output_dir, store_name):
+    retriever = DataRetriever(read_yaml(CONFIG_PATH), VECTORDB_PATH, os.path.join(output_dir, store_name), output_dir)
+    start = time.perf_counter()
+    retriever.load_vectordb()
+    return retriever, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("queries_file", nargs="?", default=QUERIES_FILE_PATH)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        single, load_time = make_retriever(output_dir, "single_store")
+        single.load_query_file(args.queries_file)
+        questions = single.questions
+
+        start = time.perf_counter()
+        for question in questions:
+            single.question = question
+            single.get_cosine_similarity()
+            single.save_retrieved_chunks()
+        single_time = time.perf_counter() - start
+
+        batch, _ = make_retriever(output_dir, "batch_store")
+        start = time.perf_counter()
+        batch.load_query_file(args.queries_file)
+        batch.get_batch_similarity()
+        batch.save_batch_retrieved_chunks()
+        batch_time = time.perf_counter() - start
+
+    n = len(questions)
+    print(f"questions: {n}  model + index load: {load_time:.2f}s (paid per question by the CLI path)")
+    print(f"single-question loop (warm): {n / single_time:10.1f} queries/sec")
+    print(f"single-question CLI (cold):  {n / (single_time + n * load_time):10.1f} queries/sec")
+    print(f"batch mode:                  {n / batch_time:10.1f} queries/sec  ({single_time / batch_time:.1f}x warm loop)")
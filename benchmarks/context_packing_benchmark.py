@@ -0,0 +1,53 @@
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+import torch
+from config.paths_config import *
+from utils.common_functions import read_yaml
+from src.artifact_store import open_store
+from src.data_generator import DataGenerator
+
+# Prompt length, question survival and encoder time of the old "join every chunk" prompt versus the
+# packed context, over the retrieval runs already in the retrieval store.
+#   python benchmarks/context_packing_benchmark.py --runs 50
+
+
+def encoder_ms(generator, prompt):
+    inputs = generator.tokenize_prompt(prompt)
+    start = time.perf_counter()
+    with torch.no_grad():
+        generator.model.get_encoder()(input_ids=inputs["input_ids"], attention_mask=inputs["attention_mask"])
+    return 1000 * (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    config = read_yaml(CONFIG_PATH)
+    store = open_store(RETRIEVAL_STORE_DIR, config)
+    runs = [store.read_run(run_id) for run_id in store.run_ids()[-args.runs:]]
+    pairs = [(run_df["query"].iloc[0], run_df["document"].tolist()) for run_df in runs]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        generator = DataGenerator(config, RETRIEVAL_STORE_DIR, tmp, os.path.join(tmp, "generator"))
+        packer = generator.packer
+        if packer is None:
+            raise SystemExit("set data_generator.context_packing to compare against the packed context")
+
+        results = {"joined (old)": [], "packed": []}
+        for query, chunks in pairs:
+            for name, use_packer in (("joined (old)", None), ("packed", packer)):
+                generator.packer = use_packer
+                prompt, _ = generator.build_prompt(query, chunks)
+                tokens = len(generator.tokenizer(prompt)["input_ids"])
+                # the question sits at the end of the prompt, so it survives only if nothing is truncated
+                results[name].append((min(tokens, generator.max_input_length), tokens <= generator.max_input_length, encoder_ms(generator, prompt)))
+
+    print(f"runs: {len(pairs)}  max_input_length: {generator.max_input_length}  context budget: {packer.token_budget}")
+    for name, rows in results.items():
+        tokens, question_kept, ms = (np.array(column) for column in zip(*rows))
+        print(f"{name:<14} prompt tokens mean {tokens.mean():7.1f}  question kept {question_kept.mean():7.1%}  encoder {ms.mean():8.1f} ms")
@@ -0,0 +1,62 @@
+import argparse
+import time
+from langchain_huggingface import HuggingFaceEmbeddings
+from config.paths_config import *
+from utils.common_functions import read_yaml
+from src.chunk_dedup import ChunkDeduplicator
+from src.embedding_engine import EmbeddingEngine
+
+# Index shrink and ingestion speed-up from the dedup stage on our corpus (content_data.txt),
+# with the chunking settings from config.yaml.
+#   python benchmarks/dedup_benchmark.py --threshold 0.9
+
+
+def chunk_sources(config):
+    # per source chunking, like the incremental path; falls back to the content file lines
+    step = config["chunk_size"] - config["overlap_chunk_size"]
+    with open(CONTENT_DATA_TXT, "r", encoding="utf-8") as file:
+        articles = [line.rstrip("\n") for line in file if line.strip()]
+    return [
+        article[i:i + config["chunk_size"]].replace("\n", " ")
+        for article in articles
+        for i in range(0, len(article), step)
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threshold", type=float)
+    args = parser.parse_args()
+
+    config = read_yaml(CONFIG_PATH)
+    processing = config["data_processing"]
+    dedup_config = dict(processing.get("dedup", {}))
+    if args.threshold is not None:
+        dedup_config["similarity_threshold"] = args.threshold
+
+    chunks = chunk_sources(processing)
+
+    start = time.perf_counter()
+    deduplicator = ChunkDeduplicator(dedup_config)
+    kept = [chunks[i] for i in deduplicator.filter(chunks, list(range(len(chunks))))]
+    dedup_time = time.perf_counter() - start
+    report = deduplicator.report()
+
+    model = HuggingFaceEmbeddings(model_name=config["embedding_model"], encode_kwargs={"batch_size": processing.get("embedding_batch_size", 64)})
+    engine = EmbeddingEngine(model, config["embedding_model"], processing)
+
+    start = time.perf_counter()
+    vectors = engine.embed(chunks)
+    full_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    engine.embed(kept)
+    kept_time = time.perf_counter() - start
+
+    bytes_per_vector = vectors.shape[1] * 4
+    print(f"threshold={dedup_config.get('similarity_threshold', 0.9)}  chunks={report['chunks']}  kept={report['kept']}")
+    print(f"exact duplicates={report['exact_duplicates']}  near duplicates={report['near_duplicates']}  index shrink={report['index_shrink_pct']}%")
+    print(f"index size: {len(chunks) * bytes_per_vector / 1e6:.2f} MB -> {len(kept) * bytes_per_vector / 1e6:.2f} MB")
+    print(f"dedup stage: {dedup_time:.2f}s ({len(chunks) / dedup_time:.0f} chunks/sec)")
+    print(f"embed all: {full_time:.2f}s   dedup + embed kept: {dedup_time + kept_time:.2f}s   "
+          f"speed-up {full_time / (dedup_time + kept_time):.2f}x")
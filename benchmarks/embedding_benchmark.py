@@ -0,0 +1,63 @@
+import argparse
+import time
+import numpy as np
+from langchain_huggingface import HuggingFaceEmbeddings
+from config.paths_config import *
+from utils.common_functions import read_yaml
+from src.embedding_engine import EmbeddingEngine
+
+# The old embedding call (one embed_documents over every chunk, as FAISS.from_texts does) versus
+# EmbeddingEngine with length sorted batches, in-process and with a worker pool.
+#   python benchmarks/embedding_benchmark.py --chunks 5000 --workers 4
+
+
+def load_chunks(num_chunks):
+    config = read_yaml(CONFIG_PATH)["data_processing"]
+    with open(CONTENT_DATA_TXT, "r", encoding="utf-8") as file:
+        text = file.read()
+    step = config["chunk_size"] - config["overlap_chunk_size"]
+    chunks = [text[i:i + config["chunk_size"]].replace("\n", " ") for i in range(0, len(text), step)]
+    # the tail of every article is short, repeat the corpus to reach the requested size
+    return (chunks * (num_chunks // max(len(chunks), 1) + 1))[:num_chunks]
+
+
+def agreement(reference, vectors):
+    cosine = np.sum(reference * vectors, axis=1) / (np.linalg.norm(reference, axis=1) * np.linalg.norm(vectors, axis=1))
+    return float(np.abs(reference - vectors).max()), float(cosine.min())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=-1)
+    args = parser.parse_args()
+
+    config = read_yaml(CONFIG_PATH)
+    texts = load_chunks(args.chunks)
+
+    baseline_model = HuggingFaceEmbeddings(model_name=config["embedding_model"])
+    start = time.perf_counter()
+    reference = np.asarray(baseline_model.embed_documents(texts), dtype=np.float32)
+    baseline_time = time.perf_counter() - start
+    print(f"{'embed_documents (old)':<26} {len(texts) / baseline_time:8.1f} chunks/sec")
+
+    model = HuggingFaceEmbeddings(model_name=config["embedding_model"], encode_kwargs={"batch_size": args.batch_size})
+    runs = [
+        ("engine, unsorted", {"length_sorted_batches": False, "embedding_workers": 0}),
+        ("engine, length sorted", {"length_sorted_batches": True, "embedding_workers": 0}),
+        (f"engine, {args.workers} workers", {"length_sorted_batches": True, "embedding_workers": args.workers}),
+    ]
+    for name, overrides in runs:
+        engine = EmbeddingEngine(model, config["embedding_model"], {"embedding_batch_size": args.batch_size, **overrides})
+        engine.start_pool()  # worker start-up is a one-off cost, keep it out of the timing
+        if engine.pool is not None:
+            engine.embed(texts[:engine.num_workers * args.batch_size])
+            engine.stats = {"chunks": 0, "tokens": 0, "seconds": 0.0}
+
+        vectors = engine.embed(texts)
+        engine.close()
+        stats = engine.throughput()
+        max_diff, min_cosine = agreement(reference, vectors)
+        print(f"{name:<26} {stats['chunks_per_sec']:8.1f} chunks/sec {stats['tokens_per_sec']:10.1f} tokens/sec"
+              f"  ({baseline_time / stats['seconds']:.2f}x)  max |diff| {max_diff:.1e}  min cosine {min_cosine:.6f}")
@@ -0,0 +1,86 @@
+import hashlib
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-ins for the Wikipedia pages ingestion downloads, so benchmarks run offline.
+
+
+def synthetic_article(page_id, num_words=2000, seed=0):
+    rng = random.Random(f"{seed}-{page_id}")
+    vocabulary = [f"word{i}" for i in range(5000)]
+    paragraphs = []
+    for _ in range(max(1, num_words // 100)):
+        paragraphs.append(" ".join(rng.choice(vocabulary) for _ in range(100)))
+    body = "".join(f"<p>{p}</p>" for p in paragraphs)
+    return (
+        f"<html><body><div class=\"mw-parser-output\"><h2><span class=\"mw-headline\">Page {page_id}</span></h2>"
+        f"{body}<table><tr><td>infobox</td></tr></table></div></body></html>"
+    ).encode("utf-8")
+
+
+class LocalWikiServer:
+    # ThreadingHTTPServer on a free localhost port serving /wiki/Page_<n> with ETag and
+    # Last-Modified headers; honours If-None-Match with a 304. `latency` simulates network RTT.
+    def __init__(self, num_pages=50, num_words=2000, latency=0.05, seed=0):
+        self.pages = {f"/wiki/Page_{i}": synthetic_article(i, num_words, seed) for i in range(num_pages)}
+        self.latency = latency
+        self.requests = 0
+        self.not_modified = 0
+        self.server = None
+        self.thread = None
+
+    def urls(self):
+        host, port = self.server.server_address
+        return [f"http://{host}:{port}{path}" for path in self.pages]
+
+    def update_page(self, index, seed):
+        path = f"/wiki/Page_{index}"
+        self.pages[path] = synthetic_article(index, seed=seed)
+
+    def __enter__(self):
+        fixture = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                fixture.requests += 1
+                time.sleep(fixture.latency)
+                body = fixture.pages.get(self.path)
+                if body is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                etag = '"' + hashlib.md5(body).hexdigest() + '"'
+                if self.headers.get("If-None-Match") == etag:
+                    fixture.not_modified += 1
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("ETag", etag)
+                self.send_header("Last-Modified", "Mon, 01 Jan 2024 00:00:00 GMT")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
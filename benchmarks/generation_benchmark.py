@@ -0,0 +1,86 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+import numpy as np
+from config.paths_config import *
+from utils.common_functions import read_yaml
+from src.data_generator import DataGenerator
+
+# Answers/sec and per-answer latency of the old single-prompt path (padding to max_length),
+# the single-prompt path with dynamic padding, and batched generation with length buckets, on CPU.
+#   python benchmarks/generation_benchmark.py --queries 32 --max-new-tokens 64
+
+
+def make_pairs(num_queries, top_k, seed=0):
+    config = read_yaml(CONFIG_PATH)["data_processing"]
+    with open(CONTENT_DATA_TXT, "r", encoding="utf-8") as file:
+        text = file.read()
+    step = config["chunk_size"] - config["overlap_chunk_size"]
+    chunks = [text[i:i + config["chunk_size"]] for i in range(0, len(text), step)]
+
+    # a varying number of context chunks per question gives the realistic spread of prompt lengths
+    rng = random.Random(seed)
+    return [
+        (f"What does passage {q} say about the war?", rng.sample(chunks, rng.randint(1, min(top_k, len(chunks)))))
+        for q in range(num_queries)
+    ]
+
+
+def old_single(generator, prompt):
+    inputs = generator.tokenizer(
+        prompt, return_tensors="pt", max_length=generator.max_input_length, truncation=True, padding="max_length"
+    )
+    outputs = generator.model.generate(**inputs, **generator.generation_kwargs())
+    return generator.tokenizer.decode(outputs[0], skip_special_tokens=True)
+
+
+def report(name, total, latencies):
+    latencies = np.array(latencies) * 1000
+    print(
+        f"{name:<28} {len(latencies) / total:8.2f} answers/sec   latency p50 {np.percentile(latencies, 50):9.1f} ms"
+        f"  p95 {np.percentile(latencies, 95):9.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=16)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--skip-old", action="store_true", help="skip the max_length padded path, it is slow")
+    args = parser.parse_args()
+
+    config = read_yaml(CONFIG_PATH)
+    config["data_generator"].update(max_new_tokens=args.max_new_tokens, generation_batch_size=args.batch_size)
+    pairs = make_pairs(args.queries, args.top_k)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        generator = DataGenerator(config, os.path.join(tmp, "retrieval"), tmp, os.path.join(tmp, "generator"))
+        prompts = [generator.build_prompt(query, context_chunks)[0] for query, context_chunks in pairs]
+        lengths = [len(ids) for ids in generator.tokenizer(prompts, truncation=True, max_length=generator.max_input_length)["input_ids"]]
+        print(f"queries: {len(pairs)}  prompt tokens min/mean/max: {min(lengths)}/{np.mean(lengths):.0f}/{max(lengths)}")
+
+        single_paths = [("single, dynamic padding", generator.generate_text)]
+        if not args.skip_old:
+            single_paths.insert(0, ("single, max_length (old)", lambda prompt: old_single(generator, prompt)))
+
+        for name, generate in single_paths:
+            latencies = []
+            start = time.perf_counter()
+            for prompt in prompts:
+                call_start = time.perf_counter()
+                generate(prompt)
+                latencies.append(time.perf_counter() - call_start)
+            report(name, time.perf_counter() - start, latencies)
+
+        # every answer in a batch is ready when its batch is, measured from the start of the run
+        _, batches = generator.make_generation_batches(prompts)
+        latencies = []
+        start = time.perf_counter()
+        for batch in batches:
+            generator.generate_batch([pairs[i] for i in batch])
+            latencies.extend([time.perf_counter() - start] * len(batch))
+        report(f"batched ({len(batches)} batches)", time.perf_counter() - start, latencies)
@@ -0,0 +1,104 @@
+import argparse
+import os
+import tempfile
+import time
+from collections import Counter
+import numpy as np
+from config.paths_config import *
+from utils.common_functions import read_yaml
+from src.data_retrieval import DataRetriever
+from src.lexical_index import LexicalIndex, build_lexical_index, tokenize
+from src.retrieval_engine import reciprocal_rank_fusion
+
+# Hit rate, MRR and per-query latency of dense, BM25 and hybrid (RRF) retrieval over the real
+# vector DB. Without a queries file the queries are entity-style: the rarest capitalised words and
+# numbers of a random chunk, relevant = every chunk containing all of them. A queries file has
+# `question<TAB>text the answer chunk contains` per line.
+#   python benchmarks/hybrid_retrieval_benchmark.py --queries 300
+#   python benchmarks/hybrid_retrieval_benchmark.py --queries-file labelled_queries.tsv
+
+
+def tokenize_raw(text):
+    return [word.strip(".,;:()[]\"'") for word in text.split() if word.strip(".,;:()[]\"'").isalnum()]
+
+
+def entity_queries(texts, num_queries, terms_per_query=3, seed=0):
+    document_freqs = Counter(term for text in texts for term in set(tokenize(text)))
+    rng = np.random.default_rng(seed)
+    queries = []
+    for position in rng.choice(len(texts), num_queries):
+        entities = {word.lower() for word in tokenize_raw(texts[position]) if word[0].isupper() or word[0].isdigit()}
+        entities = sorted(entities, key=lambda term: (document_freqs[term], term))[:terms_per_query]
+        if entities:
+            queries.append(" ".join(entities))
+    token_sets = [set(tokenize(text)) for text in texts]
+    return [(query, {i for i, tokens in enumerate(token_sets) if set(query.split()) <= tokens}) for query in queries]
+
+
+def labelled_queries(path, texts):
+    queries = []
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            if "\t" in line:
+                question, answer = line.rstrip("\n").split("\t", 1)
+                queries.append((question, {i for i, text in enumerate(texts) if answer.lower() in text.lower()}))
+    return queries
+
+
+def score(found, relevant):
+    for rank, position in enumerate(found):
+        if int(position) in relevant:
+            return 1.0, 1.0 / (rank + 1)
+    return 0.0, 0.0
+
+
+def report(name, results, latencies):
+    hits, reciprocal_ranks = zip(*results)
+    print(f"{name:<8} {np.mean(hits):9.3f} {np.mean(reciprocal_ranks):7.3f} "
+          f"{np.percentile(latencies, 50):8.3f} {np.percentile(latencies, 95):8.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--queries-file")
+    args = parser.parse_args()
+
+    config = read_yaml(CONFIG_PATH)
+    with tempfile.TemporaryDirectory() as tmp:
+        retriever = DataRetriever(config, VECTORDB_PATH, os.path.join(tmp, "store"), tmp)
+        retriever.load_vectordb()
+        texts = [retriever.chunk_text(i) for i in range(retriever.vector_db.index.ntotal)]
+        build_lexical_index(texts, os.path.join(tmp, "lexical_index"))
+        lexical = LexicalIndex(os.path.join(tmp, "lexical_index"), max_df=config.get("lexical_index", {}).get("max_df", 0.5))
+
+        queries = labelled_queries(args.queries_file, texts) if args.queries_file else entity_queries(texts, args.queries)
+        queries = [(question, relevant) for question, relevant in queries if relevant]
+        embeddings = np.array(retriever.embed_queries([question for question, _ in queries]), dtype=np.float32)
+
+        top_k = retriever.top_k
+        depth = max(retriever.hybrid_candidates, top_k)
+        results = {"dense": [], "bm25": [], "hybrid": []}
+        latencies = {"dense": [], "bm25": [], "hybrid": []}
+        # query embedding time is left out, dense and hybrid pay it alike
+        for (question, relevant), embedding in zip(queries, embeddings):
+            start = time.perf_counter()
+            _, dense = retriever.engine.search(embedding[None, :], top_k)
+            latencies["dense"].append(1000 * (time.perf_counter() - start))
+            results["dense"].append(score(dense[0], relevant))
+
+            start = time.perf_counter()
+            _, bm25 = lexical.search(question, top_k)
+            latencies["bm25"].append(1000 * (time.perf_counter() - start))
+            results["bm25"].append(score(bm25, relevant))
+
+            start = time.perf_counter()
+            _, dense_candidates = retriever.engine.search(embedding[None, :], depth)
+            _, fused = reciprocal_rank_fusion([dense_candidates[0], lexical.search(question, depth)[1]], top_k, retriever.rrf_k)
+            latencies["hybrid"].append(1000 * (time.perf_counter() - start))
+            results["hybrid"].append(score(fused, relevant))
+
+    print(f"chunks: {len(texts)}  queries: {len(queries)}  k: {top_k}  hybrid candidates: {depth}  rrf_k: {retriever.rrf_k}")
+    print(f"{'mode':<8} {'hit@k':>9} {'MRR':>7} {'p50 ms':>8} {'p95 ms':>8}")
+    for name in ("dense", "bm25", "hybrid"):
+        report(name, results[name], latencies[name])
@@ -0,0 +1,52 @@
+import argparse
+import os
+import tempfile
+import time
+from src import metrics
+
+# Cost per call of the instrumentation: a plain function, the same function under @timed and
+# inside span() with metrics disabled, then enabled with and without the JSON log.
+#   python benchmarks/metrics_overhead_benchmark.py --calls 1000000
+
+
+def work():
+    return None
+
+
+@metrics.timed("benchmark.work")
+def timed_work():
+    return None
+
+
+def spanned_work():
+    with metrics.span("benchmark.work"):
+        return None
+
+
+def ns_per_call(function, calls):
+    start = time.perf_counter_ns()
+    for _ in range(calls):
+        function()
+    return (time.perf_counter_ns() - start) / calls
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=1000000)
+    args = parser.parse_args()
+
+    baseline = ns_per_call(work, args.calls)
+    print(f"{'plain call':<34} {baseline:8.1f} ns")
+    print(f"{'@timed, disabled':<34} {ns_per_call(timed_work, args.calls):8.1f} ns")
+    print(f"{'span(), disabled':<34} {ns_per_call(spanned_work, args.calls):8.1f} ns")
+    print(f"{'increment(), disabled':<34} {ns_per_call(lambda: metrics.increment('benchmark_calls'), args.calls):8.1f} ns")
+
+    # enabled runs are far slower per call, fewer calls keep the log small
+    calls = max(1, args.calls // 20)
+    metrics._registry.configure(True)
+    print(f"{'@timed, enabled, no log':<34} {ns_per_call(timed_work, calls):8.1f} ns")
+    with tempfile.TemporaryDirectory() as tmp:
+        metrics._registry.configure(True, log_path=os.path.join(tmp, "metrics.jsonl"))
+        print(f"{'@timed, enabled, JSON log':<34} {ns_per_call(timed_work, calls):8.1f} ns")
+        metrics._registry.log_file.close()
+        metrics._registry.log_file = None
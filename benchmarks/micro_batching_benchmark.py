@@ -0,0 +1,99 @@
+import argparse
+import copy
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from config.paths_config import *
+from utils.common_functions import read_yaml
+from fixtures import LocalWikiServer
+
+# Throughput of the RAG service's one-question-per-call path (every request embeds, searches and
+# generates on its own worker thread) against the micro-batching scheduler, with `clients` threads
+# asking at once. Runs in-process over an index built from the local HTTP fixture, with the models
+# from config.yaml, or with --stand-in for an offline run (their cost is serialized on one "device",
+# so only what batching saves shows up, not free parallel sleeps).
+#   python benchmarks/micro_batching_benchmark.py --endpoint answer --clients 16 --questions 128
+#   python benchmarks/micro_batching_benchmark.py --endpoint retrieve --clients 32 --stand-in
+
+
+def build_index(config):
+    from src.data_ingestion import DataIngestion
+    from src.data_processing import DataProcessor
+    DataIngestion(config).run()
+    DataProcessor(config, CONTENT_DATA_TXT, PROCESSED_DIR, CHUNKS_DF_PATH, VECTORDB_PATH).run()
+
+
+def drive(call, questions, clients):
+    # every client thread sends its questions back to back; (wall seconds, latencies in ms)
+    def timed_call(question):
+        start = time.perf_counter()
+        call(question)
+        return 1000 * (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        latencies = list(executor.map(timed_call, questions))
+    return time.perf_counter() - start, latencies
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--endpoint", choices=["retrieve", "answer"], default="answer")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--questions", type=int, default=128)
+    parser.add_argument("--max-batch-size", type=int, default=16)
+    parser.add_argument("--max-wait-ms", type=float, default=10)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--stand-in", action="store_true")
+    parser.add_argument("--seconds-per-token", type=float, default=0.00005)
+    args = parser.parse_args()
+
+    if args.stand_in:
+        import stand_in_models
+        stand_in_models.register(seconds_per_token=args.seconds_per_token)
+    from src.rag_service import RAGService
+    from src.micro_batcher import MicroBatcher
+
+    cwd = os.getcwd()
+    with LocalWikiServer(num_pages=args.pages, num_words=2000, latency=0.0) as server, tempfile.TemporaryDirectory() as tmp:
+        config = copy.deepcopy(read_yaml(CONFIG_PATH))
+        config["data_ingestion"].update({"urls": server.urls(), "refresh": True, "per_host_rate": 1000})
+        config["data_processing"]["embedding_workers"] = 0
+        config["data_retriever"]["top_k"] = args.top_k
+        config["data_generator"].update({"max_new_tokens": args.max_new_tokens, "stream": False})
+        # every question is new to both paths
+        config["query_cache"]["enabled"] = False
+        config["answer_cache"]["enabled"] = False
+        config["micro_batching"]["enabled"] = False
+        config["service"]["max_workers"] = args.clients
+
+        os.chdir(tmp)
+        try:
+            build_index(config)
+            service = RAGService(config)
+            service.load_models()
+            rng = np.random.default_rng(0)
+            questions = [f"what does the source say about word{a} and word{b}" for a, b in rng.integers(0, 5000, (args.questions, 2))]
+            single = service.retrieve if args.endpoint == "retrieve" else service.answer
+            batched = service.retrieve_batch if args.endpoint == "retrieve" else service.answer_batch
+
+            # warm up both paths, then the same questions through each
+            single(questions[0])
+            batched(questions[:2])
+            results = {"one per call": drive(single, questions, args.clients)}
+            batcher = MicroBatcher(args.endpoint, batched, max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms)
+            results["micro-batched"] = drive(batcher, questions, args.clients)
+            batcher.close()
+        finally:
+            os.chdir(cwd)
+
+    print(f"endpoint: /{args.endpoint}  clients: {args.clients}  questions: {args.questions}  "
+          f"window: {args.max_wait_ms} ms  max batch: {args.max_batch_size}  {'stand-in' if args.stand_in else 'configured'} models")
+    print(f"{'path':<14} {'questions/s':>12} {'p50 ms':>10} {'p95 ms':>10}")
+    for name, (seconds, latencies) in results.items():
+        print(f"{name:<14} {len(latencies) / seconds:12.2f} {np.percentile(latencies, 50):10.2f} {np.percentile(latencies, 95):10.2f}")
+    print(f"scheduler: {batcher.stats()}")
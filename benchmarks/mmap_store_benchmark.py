@@ -0,0 +1,114 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from src.retrieval_engine import normalize_rows, vector_db_kwargs
+
+# Startup time and memory of FAISS.load_local (pickled docstore, index read into memory) versus the
+# memory-mapped store, each opened in fresh processes over the same synthetic vector DB.
+# PSS splits shared pages between the processes mapping them, so N workers on the mmap store
+# should cost far less than N times one worker.
+#   python benchmarks/mmap_store_benchmark.py --chunks 200000 --workers 4
+
+
+def memory_mb():
+    # (rss, pss) in MB; PSS needs Linux, elsewhere RSS stands in for it
+    values = {}
+    if os.path.exists("/proc/self/smaps_rollup"):
+        with open("/proc/self/smaps_rollup", "r") as file:
+            for line in file:
+                key, _, rest = line.partition(":")
+                if key in ("Rss", "Pss"):
+                    values[key] = int(rest.split()[0]) / 1024
+        return values["Rss"], values["Pss"]
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    return rss, rss
+
+
+def build(workdir, num_chunks, dim):
+    from langchain_community.embeddings import FakeEmbeddings
+    from langchain_community.vectorstores import FAISS
+    from src.mmap_store import export_vector_db
+
+    rng = np.random.default_rng(0)
+    vectors = normalize_rows(rng.normal(size=(num_chunks, dim)).astype(np.float32))
+    texts = [f"chunk {i} " + "lorem ipsum dolor sit amet " * 35 for i in range(num_chunks)]
+    vector_db = FAISS.from_embeddings(zip(texts, vectors), FakeEmbeddings(size=dim), **vector_db_kwargs(True))
+    vector_db.save_local(os.path.join(workdir, "vector_db"))
+    export_vector_db(vector_db, os.path.join(workdir, "mmap_store"))
+
+
+def child(args):
+    from src.retrieval_engine import RetrievalEngine
+    rss_before, pss_before = memory_mb()
+    start = time.perf_counter()
+    if args.mode == "pickle":
+        from langchain_community.embeddings import FakeEmbeddings
+        from langchain_community.vectorstores import FAISS
+        vector_db = FAISS.load_local(os.path.join(args.workdir, "vector_db"), FakeEmbeddings(size=args.dim),
+                                     allow_dangerous_deserialization=True, **vector_db_kwargs(True))
+        text = lambda i: vector_db.docstore.search(vector_db.index_to_docstore_id[i]).page_content
+    else:
+        from src.mmap_store import MmapVectorStore
+        vector_db = MmapVectorStore(os.path.join(args.workdir, "mmap_store"))
+        text = vector_db.text
+    load_ms = 1000 * (time.perf_counter() - start)
+    rss_loaded, _ = memory_mb()
+
+    engine = RetrievalEngine(vector_db.index)
+    queries = np.random.default_rng(os.getpid()).normal(size=(args.queries, args.dim)).astype(np.float32)
+    start = time.perf_counter()
+    for query in queries:
+        _, ids = engine.search(query[None, :], 10)
+        [text(int(i)) for i in ids[0]]
+    query_ms = 1000 * (time.perf_counter() - start) / args.queries
+
+    if args.hold:
+        # keep the mapping alive until every worker has measured
+        time.sleep(args.hold)
+    rss, pss = memory_mb()
+    print(json.dumps({
+        "mode": args.mode, "load_ms": round(load_ms, 1), "query_ms": round(query_ms, 2),
+        "rss_load_mb": round(rss_loaded - rss_before, 1), "rss_mb": round(rss - rss_before, 1), "pss_mb": round(pss - pss_before, 1)
+    }))
+
+
+def spawn(args, mode, workdir, hold=0):
+    return subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--mode", mode, "--workdir", workdir,
+         "--dim", str(args.dim), "--queries", str(args.queries), "--hold", str(hold)],
+        stdout=subprocess.PIPE, text=True, env={**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--mode", choices=["pickle", "mmap"])
+    parser.add_argument("--workdir")
+    parser.add_argument("--hold", type=float, default=0)
+    args = parser.parse_args()
+
+    if args.mode:
+        child(args)
+        sys.exit(0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        build(tmp, args.chunks, args.dim)
+        print(f"chunks: {args.chunks}  dim: {args.dim}")
+        for mode in ("pickle", "mmap"):
+            # one cold process, then `workers` processes mapping the same files at once
+            single = json.loads(spawn(args, mode, tmp).communicate()[0].strip().splitlines()[-1])
+            workers = [spawn(args, mode, tmp, hold=2) for _ in range(args.workers)]
+            results = [json.loads(w.communicate()[0].strip().splitlines()[-1]) for w in workers]
+            print(f"{mode:<7} load {single['load_ms']:9.1f} ms  query {single['query_ms']:6.2f} ms  "
+                  f"RSS after load {single['rss_load_mb']:8.1f} MB  after queries {single['rss_mb']:8.1f} MB  "
+                  f"{args.workers} workers total PSS {sum(r['pss_mb'] for r in results):8.1f} MB")
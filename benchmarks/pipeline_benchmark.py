@@ -0,0 +1,270 @@
+import argparse
+import copy
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import faiss
+import numpy as np
+from config.paths_config import *
+from utils.common_functions import read_yaml
+from fixtures import LocalWikiServer
+import stand_in_models
+
+# End-to-end benchmark of the real stage classes (DataIngestion, DataProcessor, DataRetriever,
+# DataGenerator) on a synthetic corpus served by a local HTTP fixture, with deterministic stand-in
+# models, so it runs offline and the numbers measure the pipeline code. Every stage reports
+# throughput, p50/p95 latency and peak RSS; results go to a JSON file that `compare` checks
+# against a baseline.
+#   python benchmarks/pipeline_benchmark.py run --pages 50 --queries 200 --output baseline.json
+#   python benchmarks/pipeline_benchmark.py run --pages 50 --queries 200 --output current.json
+#   python benchmarks/pipeline_benchmark.py compare baseline.json current.json --threshold 0.1
+
+# metric -> True when higher is better
+METRICS = {"throughput": True, "p50_ms": False, "p95_ms": False, "peak_rss_mb": False}
+
+
+def rss_mb():
+    if os.path.exists("/proc/self/statm"):
+        with open("/proc/self/statm", "r") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+class PeakMemory:
+    # samples RSS on a background thread while the stage runs
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = 0.0
+        self.running = False
+        self.thread = None
+
+    def _sample(self):
+        while self.running:
+            self.peak = max(self.peak, rss_mb())
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self.peak = rss_mb()
+        self.running = True
+        self.thread = threading.Thread(target=self._sample, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.running = False
+        self.thread.join()
+        self.peak = max(self.peak, rss_mb())
+
+
+def stage_result(units, count, seconds, latencies_ms, memory):
+    return {
+        "units": units,
+        "count": count,
+        "seconds": round(seconds, 4),
+        "throughput": round(count / seconds, 2) if seconds else None,
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies_ms, 95)), 3),
+        "peak_rss_mb": round(memory.peak, 1)
+    }
+
+
+def benchmark_config(urls, args):
+    config = copy.deepcopy(read_yaml(CONFIG_PATH))
+    config["data_ingestion"].update({"urls": urls, "refresh": True, "per_host_rate": args.per_host_rate})
+    # one process, so the stand-in models are the only ones in play
+    config["data_processing"]["embedding_workers"] = 0
+    config["data_generator"]["stream"] = False
+    return config
+
+
+def synthetic_questions(num_questions, seed=0):
+    # the fixture's vocabulary, so lexical and dense search both find something
+    rng = np.random.default_rng(seed)
+    return [f"what does the source say about word{a} and word{b}" for a, b in rng.integers(0, 5000, (num_questions, 2))]
+
+
+def run_ingest_and_process(config, base_dir, repeats):
+    from src.data_ingestion import DataIngestion
+    from src.data_processing import DataProcessor
+
+    # every repeat gets an empty working directory, so nothing is incremental; the last one stays
+    run_dirs = [os.path.join(base_dir, f"run{repeat}") for repeat in range(repeats)]
+    ingest_ms, process_ms = [], []
+    with PeakMemory() as ingest_memory:
+        for run_dir in run_dirs:
+            os.makedirs(run_dir)
+            os.chdir(run_dir)
+            start = time.perf_counter()
+            DataIngestion(config).run()
+            ingest_ms.append(1000 * (time.perf_counter() - start))
+
+    with PeakMemory() as process_memory:
+        for run_dir in run_dirs:
+            os.chdir(run_dir)
+            start = time.perf_counter()
+            DataProcessor(config, CONTENT_DATA_TXT, PROCESSED_DIR, CHUNKS_DF_PATH, VECTORDB_PATH).run()
+            process_ms.append(1000 * (time.perf_counter() - start))
+    if not os.path.exists(os.path.join(VECTORDB_PATH, "index.faiss")):
+        raise RuntimeError("data processing failed, see the log")
+
+    pages = len(config["data_ingestion"]["urls"])
+    chunks = faiss.read_index(os.path.join(VECTORDB_PATH, "index.faiss")).ntotal
+    return {
+        "ingest": stage_result("pages", pages * repeats, sum(ingest_ms) / 1000, ingest_ms, ingest_memory),
+        "process": stage_result("chunks", chunks * repeats, sum(process_ms) / 1000, process_ms, process_memory)
+    }
+
+
+def run_retrieval(config, questions):
+    from src.data_retrieval import DataRetriever
+
+    results = {}
+    with PeakMemory() as memory:
+        start = time.perf_counter()
+        retriever = DataRetriever(config, VECTORDB_PATH, RETRIEVAL_STORE_DIR, RETRIEVAL_DIR)
+        retriever.load_vectordb()
+        load_ms = 1000 * (time.perf_counter() - start)
+        latencies = []
+        for question in questions:
+            query_start = time.perf_counter()
+            retriever.retrieve(question)
+            latencies.append(1000 * (time.perf_counter() - query_start))
+    results["retrieve"] = stage_result("queries", len(questions), sum(latencies) / 1000, latencies, memory)
+    results["retrieve"]["load_ms"] = round(load_ms, 1)
+
+    with PeakMemory() as memory:
+        start = time.perf_counter()
+        retriever.questions = questions
+        retriever.get_batch_similarity()
+        retriever.save_batch_retrieved_chunks()
+        batch_ms = 1000 * (time.perf_counter() - start)
+    results["retrieve_batch"] = stage_result("queries", len(questions), batch_ms / 1000, [batch_ms], memory)
+    return results, retriever
+
+
+def run_generation(config, questions, retriever):
+    from src.data_generator import DataGenerator
+
+    pairs = [(question, [row["document"] for row in retriever.retrieve(question)]) for question in questions]
+    results = {}
+    with PeakMemory() as memory:
+        generator = DataGenerator(config, RETRIEVAL_STORE_DIR, GENERATOR_DIR, GENERATOR_STORE_DIR)
+        latencies = []
+        for query, context_chunks in pairs:
+            start = time.perf_counter()
+            generator.generate_text(generator.build_prompt(query, context_chunks)[0])
+            latencies.append(1000 * (time.perf_counter() - start))
+    results["generate"] = stage_result("answers", len(pairs), sum(latencies) / 1000, latencies, memory)
+
+    with PeakMemory() as memory:
+        start = time.perf_counter()
+        generator.generate_batch(pairs)
+        batch_ms = 1000 * (time.perf_counter() - start)
+    results["generate_batch"] = stage_result("answers", len(pairs), batch_ms / 1000, [batch_ms], memory)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def run(args):
+    # MODEL_LOADER_MODULE reaches worker processes too, register() covers this one
+    os.environ["MODEL_LOADER_MODULE"] = "stand_in_models"
+    os.environ["STAND_IN_SECONDS_PER_TOKEN"] = str(args.seconds_per_token)
+    stand_in_models.register()
+    output = os.path.abspath(args.output)
+    commit = git_commit()
+    cwd = os.getcwd()
+
+    with LocalWikiServer(num_pages=args.pages, num_words=args.words, latency=args.latency) as server, tempfile.TemporaryDirectory() as tmp:
+        config = benchmark_config(server.urls(), args)
+        questions = synthetic_questions(args.queries)
+        try:
+            stages = run_ingest_and_process(config, tmp, args.repeats)
+            retrieval, retriever = run_retrieval(config, questions)
+            stages.update(retrieval)
+            if not args.skip_generation:
+                stages.update(run_generation(config, questions[:args.generation_queries], retriever))
+        finally:
+            os.chdir(cwd)
+
+    results = {
+        "meta": {
+            "commit": commit, "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+            "machine": platform.machine(), "cpus": os.cpu_count(), "pages": args.pages, "words": args.words,
+            "queries": args.queries, "generation_queries": args.generation_queries, "repeats": args.repeats,
+            "seconds_per_token": args.seconds_per_token
+        },
+        "stages": stages
+    }
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2)
+
+    print(f"{'stage':<16} {'units':<8} {'throughput/s':>13} {'p50 ms':>10} {'p95 ms':>10} {'peak RSS MB':>12}")
+    for name, stage in stages.items():
+        print(f"{name:<16} {stage['units']:<8} {stage['throughput']:13.2f} {stage['p50_ms']:10.3f} {stage['p95_ms']:10.3f} {stage['peak_rss_mb']:12.1f}")
+    print(f"results written to {output}")
+
+
+def compare(args):
+    with open(args.baseline, "r", encoding="utf-8") as file:
+        baseline = json.load(file)
+    with open(args.current, "r", encoding="utf-8") as file:
+        current = json.load(file)
+
+    regressions = 0
+    print(f"{'stage':<16} {'metric':<12} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, stage in current["stages"].items():
+        if name not in baseline["stages"]:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            old, new = baseline["stages"][name].get(metric), stage.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            flag = "REGRESSION" if worse > args.threshold else ""
+            regressions += bool(flag)
+            print(f"{name:<16} {metric:<12} {old:12.3f} {new:12.3f} {change:+8.1%} {flag}")
+
+    print(f"{regressions} regression(s) beyond {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run")
+    run_parser.add_argument("--pages", type=int, default=50)
+    run_parser.add_argument("--words", type=int, default=2000)
+    run_parser.add_argument("--queries", type=int, default=200)
+    run_parser.add_argument("--generation-queries", type=int, default=32)
+    run_parser.add_argument("--repeats", type=int, default=3)
+    run_parser.add_argument("--latency", type=float, default=0.01)
+    # the fixture is local, the politeness limit meant for Wikipedia would only measure itself
+    run_parser.add_argument("--per-host-rate", type=float, default=1000)
+    run_parser.add_argument("--seconds-per-token", type=float, default=0.0)
+    run_parser.add_argument("--skip-generation", action="store_true")
+    run_parser.add_argument("--output", default="pipeline_benchmark.json")
+
+    compare_parser = commands.add_parser("compare")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.1)
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+    else:
+        sys.exit(compare(args))
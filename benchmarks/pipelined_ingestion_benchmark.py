@@ -0,0 +1,72 @@
+import argparse
+import copy
+import os
+import tempfile
+import time
+import faiss
+from config.paths_config import *
+from utils.common_functions import read_yaml
+from fixtures import LocalWikiServer
+import stand_in_models
+
+# Wall time of ingestion + processing run one after the other (DataIngestion, then DataProcessor)
+# against the pipelined executor, on the local HTTP fixture with stand-in models whose
+# --seconds-per-token gives embedding a real cost. The pipelined run prints its per-stage busy
+# time; its wall time should sit near the busiest stage rather than the sum of them.
+#   python benchmarks/pipelined_ingestion_benchmark.py --pages 100 --latency 0.1 --seconds-per-token 0.00002
+
+
+def benchmark_config(urls, args):
+    config = copy.deepcopy(read_yaml(CONFIG_PATH))
+    config["data_ingestion"].update({"urls": urls, "refresh": True, "per_host_rate": 1000, "fetch_workers": args.fetch_workers})
+    config["data_processing"]["embedding_workers"] = 0
+    config["pipelined_ingestion"].update({"queue_size": args.queue_size, "embed_batch_size": args.embed_batch_size})
+    return config
+
+
+def sequential(config):
+    from src.data_ingestion import DataIngestion
+    from src.data_processing import DataProcessor
+    DataIngestion(config).run()
+    DataProcessor(config, CONTENT_DATA_TXT, PROCESSED_DIR, CHUNKS_DF_PATH, VECTORDB_PATH).run()
+
+
+def pipelined(config):
+    from src.pipelined_ingestion import PipelinedIngestion
+    ingestion = PipelinedIngestion(config, PROCESSED_DIR, CHUNKS_DF_PATH, VECTORDB_PATH)
+    ingestion.run()
+    print(ingestion.executor.report())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--words", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--fetch-workers", type=int, default=4)
+    parser.add_argument("--queue-size", type=int, default=8)
+    parser.add_argument("--embed-batch-size", type=int, default=256)
+    parser.add_argument("--seconds-per-token", type=float, default=0.00002)
+    args = parser.parse_args()
+
+    stand_in_models.register(seconds_per_token=args.seconds_per_token)
+    cwd = os.getcwd()
+    results = {}
+    with LocalWikiServer(num_pages=args.pages, num_words=args.words, latency=args.latency) as server:
+        config = benchmark_config(server.urls(), args)
+        for name, run in (("sequential", sequential), ("pipelined", pipelined)):
+            # an empty working directory each, so both download and embed every page
+            with tempfile.TemporaryDirectory() as tmp:
+                os.chdir(tmp)
+                try:
+                    start = time.perf_counter()
+                    run(config)
+                    seconds = time.perf_counter() - start
+                    chunks = faiss.read_index(os.path.join(VECTORDB_PATH, "index.faiss")).ntotal
+                finally:
+                    os.chdir(cwd)
+            results[name] = (seconds, chunks)
+
+    for name, (seconds, chunks) in results.items():
+        print(f"{name:<11} {seconds:8.2f} s  {chunks} chunks indexed")
+    print(f"speedup {results['sequential'][0] / results['pipelined'][0]:.2f}x")
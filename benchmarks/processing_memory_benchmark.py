@@ -0,0 +1,86 @@
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from config.paths_config import *
+from utils.common_functions import read_yaml
+from src.data_processing import DataProcessor
+
+# Peak RSS of DataProcessor in the in-memory mode versus the streaming mode, each in a fresh
+# process so the numbers do not contaminate each other.
+#   python benchmarks/processing_memory_benchmark.py --size-mb 50
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def write_corpus(path, size_mb, seed=0):
+    rng = random.Random(seed)
+    vocabulary = [f"word{i}" for i in range(20000)]
+    with open(path, "w", encoding="utf-8") as file:
+        written = 0
+        while written < size_mb * 1024 * 1024:
+            line = " ".join(rng.choice(vocabulary) for _ in range(2000)) + "\n"
+            file.write(line)
+            written += len(line)
+
+
+def child(args):
+    config = read_yaml(args.config)
+    config["data_processing"].update(incremental=False, streaming=args.mode == "streaming")
+
+    processor = DataProcessor(
+        config, args.input, args.workdir,
+        os.path.join(args.workdir, "chunks.csv"), os.path.join(args.workdir, "vector_db")
+    )
+    processor.load_embedding_model()
+    baseline = peak_rss_mb()
+
+    start = time.perf_counter()
+    processor.run()
+    print(json.dumps({
+        "mode": args.mode,
+        "seconds": round(time.perf_counter() - start, 2),
+        "rss_after_model_load_mb": round(baseline, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "chunks": processor.vector_db.index.ntotal
+    }))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=float, default=20)
+    parser.add_argument("--mode", choices=["in_memory", "streaming"])
+    parser.add_argument("--config", default=os.path.abspath(CONFIG_PATH))
+    parser.add_argument("--input")
+    parser.add_argument("--workdir")
+    args = parser.parse_args()
+
+    if args.mode:
+        child(args)
+        sys.exit(0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = os.path.join(tmp, "content_data.txt")
+        write_corpus(corpus, args.size_mb)
+        print(f"corpus: {os.path.getsize(corpus) / (1024 * 1024):.1f} MB")
+
+        for mode in ("in_memory", "streaming"):
+            workdir = os.path.join(tmp, mode)
+            os.makedirs(workdir)
+            # cwd is the scratch dir so relative artifact paths (e.g. the index manifest) stay out of the repo
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--mode", mode, "--config", args.config,
+                 "--input", corpus, "--workdir", workdir],
+                cwd=workdir, capture_output=True, text=True, check=True,
+                env={**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+            ).stdout
+            print(output.strip().splitlines()[-1])
@@ -0,0 +1,64 @@
+import argparse
+import time
+import faiss
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+from src.retrieval_engine import RetrievalEngine, normalize_rows
+
+# Compares the old retrieval path (reconstruct every vector + sklearn cosine + full argsort)
+# against RetrievalEngine on a synthetic corpus.
+#   python benchmarks/retrieval_benchmark.py --num-vectors 200000 --dim 384 --queries 50
+
+
+def legacy_search(index, query_vector, top_k):
+    chunks_embedding = index.reconstruct_batch(list(range(index.ntotal)))
+    similarities = cosine_similarity(np.array(query_vector).reshape(1, -1), np.array(chunks_embedding))[0]
+    top_k_indices = similarities.argsort()[-top_k:][::-1]
+    return similarities[top_k_indices], top_k_indices
+
+
+def timed(fn, queries):
+    results = []
+    start = time.perf_counter()
+    for query in queries:
+        results.append(fn(query))
+    return (time.perf_counter() - start) / len(queries), results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-vectors", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = normalize_rows(rng.standard_normal((args.num_vectors, args.dim)))
+    queries = normalize_rows(rng.standard_normal((args.queries, args.dim)))
+
+    # old layout: raw vectors in an L2 index
+    l2_index = faiss.IndexFlatL2(args.dim)
+    l2_index.add(vectors)
+
+    # new layout: normalized vectors in an inner product index
+    ip_index = faiss.IndexFlatIP(args.dim)
+    ip_index.add(vectors)
+
+    ip_engine = RetrievalEngine(ip_index)
+    l2_engine = RetrievalEngine(l2_index)
+    l2_engine.search(queries[:1], args.top_k)  # warm the cached normalized matrix
+
+    legacy_time, legacy_results = timed(lambda q: legacy_search(l2_index, q, args.top_k), queries)
+    ip_time, ip_results = timed(lambda q: ip_engine.search([q], args.top_k), queries)
+    partial_time, partial_results = timed(lambda q: l2_engine.search([q], args.top_k), queries)
+
+    for name, results in (("index search", ip_results), ("argpartition", partial_results)):
+        same_ids = all(np.array_equal(old[1], new[1][0]) for old, new in zip(legacy_results, results))
+        max_diff = max(float(np.abs(old[0] - new[0][0]).max()) for old, new in zip(legacy_results, results))
+        print(f"{name:<14} same ordering as legacy: {same_ids}  max score diff: {max_diff:.2e}")
+
+    print(f"\ncorpus={args.num_vectors} dim={args.dim} top_k={args.top_k} queries={args.queries}")
+    print(f"{'legacy':<14} {legacy_time * 1000:10.2f} ms/query")
+    print(f"{'index search':<14} {ip_time * 1000:10.2f} ms/query  ({legacy_time / ip_time:.1f}x)")
+    print(f"{'argpartition':<14} {partial_time * 1000:10.2f} ms/query  ({legacy_time / partial_time:.1f}x)")
@@ -0,0 +1,74 @@
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+# Load test for the RAG service (pipeline/service_pipeline.py must be running).
+#   python benchmarks/service_load_test.py --endpoint /retrieve --clients 16 --requests 20
+
+
+async def client(host, port, endpoint, questions, latencies, errors):
+    # one keep-alive connection per client, requests sent back to back
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for question in questions:
+            body = json.dumps({"question": question}).encode("utf-8")
+            start = time.perf_counter()
+            writer.write(
+                f"POST {endpoint} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+            )
+            await writer.drain()
+
+            status = int((await reader.readline()).split()[1])
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                key, value = line.decode("latin-1").split(":", 1)
+                headers[key.strip().lower()] = value.strip()
+            await reader.readexactly(int(headers.get("content-length", 0)))
+
+            if status == 200:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+async def main(args):
+    with open(args.queries_file, "r", encoding="utf-8") as file:
+        questions = [line.strip() for line in file if line.strip()]
+    latencies, errors = [], []
+
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        client(args.host, args.port, args.endpoint,
+               [questions[(c * args.requests + i) % len(questions)] for i in range(args.requests)],
+               latencies, errors)
+        for c in range(args.clients)
+    ])
+    elapsed = time.perf_counter() - start
+
+    if len(latencies) > 1:
+        quantiles = statistics.quantiles(latencies, n=100)
+        p50, p95 = quantiles[49], quantiles[94]
+    else:
+        p50 = p95 = latencies[0] if latencies else float("nan")
+    print(f"endpoint={args.endpoint} clients={args.clients} requests/client={args.requests}")
+    print(f"ok={len(latencies)} errors={len(errors)} throughput={len(latencies) / elapsed:.2f} req/s")
+    print(f"p50={p50 * 1000:.1f} ms  p95={p95 * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--endpoint", default="/retrieve", choices=["/retrieve", "/answer"])
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--queries-file", default="artifacts/retrieval/queries.txt")
+    asyncio.run(main(parser.parse_args()))
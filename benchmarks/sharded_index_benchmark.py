@@ -0,0 +1,62 @@
+import argparse
+import os
+import tempfile
+import time
+import faiss
+import numpy as np
+from src.retrieval_engine import normalize_rows
+from src.sharded_index import build_sharded_index, ShardedVectorStore
+
+# Build time and query latency of the sharded index as the shard count grows, over synthetic unit
+# vectors. Single queries show what the fan-out buys one user, the batch the throughput; recall@k is
+# against exact search over all vectors, so with --index-type flat it has to stay at 1.0 (exact merge).
+#   python benchmarks/sharded_index_benchmark.py --vectors 500000 --shards 1 2 4 8
+#   python benchmarks/sharded_index_benchmark.py --vectors 500000 --shards 1 2 4 8 --index-type hnsw --ef-search 128
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vectors", type=int, default=200000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--index-type", default="flat", choices=["flat", "hnsw", "ivf_flat", "ivf_pq"])
+    parser.add_argument("--build-workers", type=int, default=os.cpu_count())
+    parser.add_argument("--search-workers", type=int, default=0)
+    # per shard search depth of the approximate types, as data_retriever.ef_search / nprobe
+    parser.add_argument("--ef-search", type=int)
+    parser.add_argument("--nprobe", type=int)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = normalize_rows(rng.normal(size=(args.vectors, args.dim)).astype(np.float32))
+    queries = normalize_rows(rng.normal(size=(args.queries, args.dim)).astype(np.float32))
+    texts = [f"chunk {i}" for i in range(args.vectors)]
+    ids = [f"id-{i}" for i in range(args.vectors)]
+    metadatas = [{}] * args.vectors
+
+    exact = faiss.IndexFlatIP(args.dim)
+    exact.add(vectors)
+    _, truth = exact.search(queries, args.top_k)
+
+    print(f"vectors: {args.vectors}  dim: {args.dim}  index: {args.index_type}  cpus: {os.cpu_count()}")
+    print(f"{'shards':>6} {'build s':>9} {'query p50 ms':>13} {'query p95 ms':>13} {'batch q/s':>10} {'recall@k':>9}")
+    for num_shards in args.shards:
+        with tempfile.TemporaryDirectory() as tmp:
+            build_s = build_sharded_index(vectors, texts, ids, metadatas, tmp, num_shards, index_config={"type": args.index_type},
+                                          build_workers=args.build_workers)
+            store = ShardedVectorStore(tmp, search_workers=args.search_workers, nprobe=args.nprobe, ef_search=args.ef_search)
+
+            latencies = []
+            for query in queries:
+                start = time.perf_counter()
+                store.index.search(query[None, :], args.top_k)
+                latencies.append(1000 * (time.perf_counter() - start))
+            start = time.perf_counter()
+            _, positions = store.index.search(queries, args.top_k)
+            batch_qps = args.queries / (time.perf_counter() - start)
+
+            recall = np.mean([len(set(a) & set(b)) / args.top_k for a, b in zip(truth.tolist(), positions.tolist())])
+            print(f"{num_shards:>6} {build_s:9.2f} {np.percentile(latencies, 50):13.3f} {np.percentile(latencies, 95):13.3f} "
+                  f"{batch_qps:10.1f} {recall:9.4f}")
@@ -0,0 +1,145 @@
+import os
+import re
+import threading
+import time
+import zlib
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from src.model_loader import register_model_loaders
+
+# Deterministic, offline stand-ins for the HuggingFace models, for benchmarks of the pipeline code
+# around them. Same inputs give the same vectors / tokens / answers in every process and run.
+# `seconds_per_token` adds a fixed model cost so batching and streaming still behave like a model.
+#   register()                                  - in this process
+#   MODEL_LOADER_MODULE=stand_in_models (benchmarks/ on sys.path)  - also in every worker it spawns
+
+WORD_PATTERN = re.compile(r"\w+|[^\w\s]")
+# one compute device per process: concurrent model calls queue for it, as they would for saturated
+# cores, instead of sleeping side by side for free
+DEVICE = threading.Lock()
+
+
+def compute(seconds):
+    if seconds:
+        with DEVICE:
+            time.sleep(seconds)
+
+
+def stable_hash(text):
+    return zlib.crc32(text.encode("utf-8"))
+
+
+class HashEmbeddings(Embeddings):
+    # feature-hashed bag of words with a fixed random projection per bucket, L2 normalised
+    def __init__(self, dim=384, buckets=4096, seconds_per_token=0.0):
+        self.dim = dim
+        self.buckets = buckets
+        self.seconds_per_token = seconds_per_token
+        self.projection = np.random.default_rng(0).normal(size=(buckets, dim)).astype(np.float32)
+
+    def _embed(self, texts):
+        counts = np.zeros((len(texts), self.buckets), dtype=np.float32)
+        tokens = 0
+        for row, text in enumerate(texts):
+            words = text.lower().split()
+            tokens += len(words)
+            for word in words:
+                counts[row, stable_hash(word) % self.buckets] += 1.0
+        compute(self.seconds_per_token * tokens)
+        vectors = counts @ self.projection
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def embed_documents(self, texts):
+        return self._embed(list(texts)).tolist()
+
+    def embed_query(self, text):
+        return self._embed([text])[0].tolist()
+
+
+class StandInTokenizer:
+    # word-level tokenizer; every word seen gets an id, so decode() gives the text back
+    pad_token_id = 0
+    eos_token_id = 1
+
+    def __init__(self):
+        self.words = {}
+        self.ids = ["<pad>", "</s>"]
+
+    def _encode(self, text, max_length=None, truncation=False):
+        ids = []
+        for word in WORD_PATTERN.findall(text):
+            if word not in self.words:
+                self.words[word] = len(self.ids)
+                self.ids.append(word)
+            ids.append(self.words[word])
+        if truncation and max_length:
+            ids = ids[:max_length]
+        return ids
+
+    def __call__(self, text, max_length=None, truncation=False, padding=False, return_tensors=None, add_special_tokens=True):
+        input_ids = [self._encode(t, max_length, truncation) for t in ([text] if isinstance(text, str) else text)]
+        if return_tensors is None and not padding:
+            return {"input_ids": input_ids[0] if isinstance(text, str) else input_ids}
+        return self.pad({"input_ids": input_ids})
+
+    def pad(self, encoded, padding="longest", return_tensors=None):
+        input_ids = encoded["input_ids"]
+        width = max(len(ids) for ids in input_ids)
+        padded = np.zeros((len(input_ids), width), dtype=np.int64)
+        mask = np.zeros((len(input_ids), width), dtype=np.int64)
+        for row, ids in enumerate(input_ids):
+            padded[row, :len(ids)] = ids
+            mask[row, :len(ids)] = 1
+        return {"input_ids": padded, "attention_mask": mask}
+
+    def decode(self, token_ids, skip_special_tokens=True, **kwargs):
+        token_ids = np.asarray(token_ids).reshape(-1).tolist()
+        return " ".join(self.ids[i] for i in token_ids if not (skip_special_tokens and i < 2))
+
+    def batch_decode(self, sequences, skip_special_tokens=True, **kwargs):
+        return [self.decode(ids, skip_special_tokens=skip_special_tokens) for ids in sequences]
+
+
+class StandInSeq2Seq:
+    # "answers" with the last max_new_tokens tokens of every prompt (the question sits at the end)
+    def __init__(self, seconds_per_token=0.0, answer_tokens=32):
+        self.seconds_per_token = seconds_per_token
+        self.answer_tokens = answer_tokens
+
+    def generate(self, input_ids=None, attention_mask=None, max_new_tokens=32, streamer=None, eos_token_id=1, stopping_criteria=None, **kwargs):
+        input_ids = np.asarray(input_ids)
+        mask = np.ones_like(input_ids) if attention_mask is None else np.asarray(attention_mask)
+        length = min(max_new_tokens, self.answer_tokens)
+        outputs = np.zeros((len(input_ids), length + 2), dtype=np.int64)
+        for row, (ids, row_mask) in enumerate(zip(input_ids, mask)):
+            answer = ids[row_mask.astype(bool)][-length:]
+            outputs[row, 1:len(answer) + 1] = answer
+            outputs[row, len(answer) + 1] = eos_token_id
+
+        # cost of the encoder pass over the padded batch plus one decoder step per new token
+        if streamer is None:
+            compute(self.seconds_per_token * (input_ids.size + outputs.shape[1]))
+            return outputs
+        compute(self.seconds_per_token * input_ids.size)
+        streamer.put(outputs[:, :1])
+        for step in range(1, outputs.shape[1]):
+            # text_streaming.StopOnEvent: the consumer stopped reading
+            if any(getattr(criterion, "event", None) is not None and criterion.event.is_set() for criterion in stopping_criteria or []):
+                break
+            compute(self.seconds_per_token)
+            streamer.put(outputs[:, step])
+        streamer.end()
+        return outputs
+
+
+def register(dim=384, seconds_per_token=None):
+    if seconds_per_token is None:
+        seconds_per_token = float(os.environ.get("STAND_IN_SECONDS_PER_TOKEN", 0))
+    tokenizer = StandInTokenizer()
+    register_model_loaders(
+        embeddings=lambda model_name, **kwargs: HashEmbeddings(dim=dim, seconds_per_token=seconds_per_token),
+        tokenizer=lambda model_name: tokenizer,
+        seq2seq=lambda model_name: StandInSeq2Seq(seconds_per_token=seconds_per_token)
+    )
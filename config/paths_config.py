@@ -4,16 +4,45 @@ import os
 RAW_DIR = "artifacts/raw"
 CONFIG_PATH = "config/config.yaml"
 CONTENT_DATA_TXT = os.path.join(RAW_DIR,"content_data.txt")
+SOURCES_DIR = os.path.join(RAW_DIR,"sources")
+SOURCES_INDEX_PATH = os.path.join(RAW_DIR,"sources.json")
+HTTP_CACHE_PATH = os.path.join(RAW_DIR,"http_cache.json")
 
 ########################  DATA PROCESSING ############################
 PROCESSED_DIR = "artifacts/processed"
 CHUNKS_DF_PATH = os.path.join(PROCESSED_DIR,"chunks.csv")
 VECTORDB_PATH = os.path.join(PROCESSED_DIR,"vector_db")
+INDEX_MANIFEST_PATH = os.path.join(PROCESSED_DIR,"index_manifest.json")
+DEDUP_MAP_PATH = os.path.join(PROCESSED_DIR,"dedup_map.csv")
+MMAP_STORE_DIR = os.path.join(PROCESSED_DIR,"mmap_store")
+LEXICAL_INDEX_DIR = os.path.join(PROCESSED_DIR,"lexical_index")
+SHARDED_INDEX_DIR = os.path.join(PROCESSED_DIR,"sharded_index")
 
 ########################  DATA RETRIEVAL ############################
 RETRIEVAL_DIR = "artifacts/retrieval"
 RETRIEVED_DF_PATH = os.path.join(RETRIEVAL_DIR,"retrived_df.csv")
+RETRIEVAL_STORE_DIR = os.path.join(RETRIEVAL_DIR,"store")
+QUERIES_FILE_PATH = os.path.join(RETRIEVAL_DIR,"queries.txt")
 
 ########################  DATA RETRIEVAL ############################
 GENERATOR_DIR = "artifacts/generator"
-GENERATOR_DF_PATH = os.path.join(GENERATOR_DIR,"generator_df.csv")
\ No newline at end of file
+GENERATOR_DF_PATH = os.path.join(GENERATOR_DIR,"generator_df.csv")
+GENERATOR_STORE_DIR = os.path.join(GENERATOR_DIR,"store")
+
+########################  EVALUATION ############################
+EVALUATION_DIR = "artifacts/evaluation"
+EVALUATION_STORE_DIR = os.path.join(EVALUATION_DIR,"store")
+EVALUATION_SUMMARY_PATH = os.path.join(EVALUATION_DIR,"summary.json")
+
+########################  METRICS ############################
+METRICS_DIR = "artifacts/metrics"
+METRICS_LOG_PATH = os.path.join(METRICS_DIR,"metrics.jsonl")
+METRICS_SNAPSHOT_PATH = os.path.join(METRICS_DIR,"metrics.prom")
+
+########################  MODELS ############################
+MODELS_DIR = "artifacts/models"
+
+########################  CACHES ############################
+CACHE_DIR = "artifacts/cache"
+QUERY_CACHE_DIR = os.path.join(CACHE_DIR,"query_embeddings")
+ANSWER_CACHE_DIR = os.path.join(CACHE_DIR,"answers")
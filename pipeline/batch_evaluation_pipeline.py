@@ -0,0 +1,9 @@
+from utils.common_functions import read_yaml
+from config.paths_config import *
+from src.data_evaluation import Evaluation
+import asyncio
+
+if __name__ == "__main__":
+    # Scores every generated answer that has no scores yet and rewrites the aggregate summary
+    evaluation = Evaluation(read_yaml(CONFIG_PATH), GENERATOR_STORE_DIR, RETRIEVAL_STORE_DIR)
+    asyncio.run(evaluation.run_batch())
@@ -0,0 +1,8 @@
+from utils.common_functions import read_yaml
+from config.paths_config import *
+from src.data_generator import DataGenerator
+
+if __name__ == "__main__":
+    # Answers every retrieval run that has no answer yet, e.g. after batch_retrieval_pipeline.py
+    data_generator = DataGenerator(read_yaml(CONFIG_PATH), RETRIEVAL_STORE_DIR, GENERATOR_DIR, GENERATOR_STORE_DIR)
+    data_generator.run_batch()
@@ -0,0 +1,11 @@
+import sys
+from utils.common_functions import read_yaml
+from config.paths_config import *
+from src.data_retrieval import DataRetriever
+
+if __name__ == "__main__":
+    # python pipeline/batch_retrieval_pipeline.py [queries_file]
+    queries_file = sys.argv[1] if len(sys.argv) > 1 else QUERIES_FILE_PATH
+
+    data_retriever = DataRetriever(read_yaml(CONFIG_PATH),VECTORDB_PATH,RETRIEVAL_STORE_DIR,RETRIEVAL_DIR)
+    data_retriever.run_batch(queries_file)
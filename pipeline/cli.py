@@ -0,0 +1,130 @@
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+from utils.common_functions import read_yaml
+from config.paths_config import *
+
+# One entry point for every stage. Stage modules are imported by the subcommand that runs them,
+# and transformers / ragas / LangChain only when a stage actually loads a model or the pickled
+# vector DB, so `retrieve` gets to the question prompt without paying for generation or evaluation.
+#   python pipeline/cli.py ingest
+#   python pipeline/cli.py retrieve ["question"] [--queries-file artifacts/retrieval/queries.txt]
+#   python pipeline/cli.py generate [--run-id ID | --batch]
+#   python pipeline/cli.py evaluate [--run-id ID | --batch]
+#   python pipeline/cli.py profile-imports [stage ...] [--top 10]
+
+STAGE_MODULES = {
+    "ingest": ["src.data_ingestion", "src.data_processing", "src.pipelined_ingestion"],
+    "retrieve": ["src.data_retrieval"],
+    "generate": ["src.data_generator"],
+    "evaluate": ["src.data_evaluation"],
+}
+
+
+def ingest(args):
+    config = read_yaml(CONFIG_PATH)
+    if args.pipelined or config.get("pipelined_ingestion", {}).get("enabled", False):
+        from src.pipelined_ingestion import PipelinedIngestion
+        PipelinedIngestion(config, PROCESSED_DIR, CHUNKS_DF_PATH, VECTORDB_PATH).run()
+        return
+    from src.data_ingestion import DataIngestion
+    from src.data_processing import DataProcessor
+    if not args.skip_download:
+        DataIngestion(read_yaml(CONFIG_PATH)).run()
+    DataProcessor(read_yaml(CONFIG_PATH), CONTENT_DATA_TXT, PROCESSED_DIR, CHUNKS_DF_PATH, VECTORDB_PATH).run()
+
+
+def retrieve(args):
+    from src.data_retrieval import DataRetriever
+    data_retriever = DataRetriever(read_yaml(CONFIG_PATH), VECTORDB_PATH, RETRIEVAL_STORE_DIR, RETRIEVAL_DIR)
+    if args.queries_file:
+        data_retriever.run_batch(args.queries_file)
+    else:
+        data_retriever.run(question=args.question)
+
+
+def generate(args):
+    from src.data_generator import DataGenerator
+    data_generator = DataGenerator(read_yaml(CONFIG_PATH), RETRIEVAL_STORE_DIR, GENERATOR_DIR, GENERATOR_STORE_DIR)
+    if args.batch:
+        data_generator.run_batch()
+    else:
+        data_generator.run(run_id=args.run_id)
+
+
+def evaluate(args):
+    from src.data_evaluation import Evaluation
+    evaluation = Evaluation(read_yaml(CONFIG_PATH), GENERATOR_STORE_DIR, RETRIEVAL_STORE_DIR)
+    if args.batch:
+        asyncio.run(evaluation.run_batch())
+    else:
+        asyncio.run(evaluation.run(run_id=args.run_id))
+
+
+def import_profile(module):
+    # `python -X importtime` in a fresh interpreter: (total seconds, {top-level package: self seconds})
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env={**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+    )
+    packages = {}
+    total = 0.0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0.0) + int(self_us) / 1e6
+        if name == module:
+            total = int(cumulative_us) / 1e6
+    if result.returncode != 0:
+        print(result.stderr.strip().splitlines()[-1])
+    return total, packages
+
+
+def profile_imports(args):
+    for stage in args.stages or list(STAGE_MODULES):
+        print(f"{stage}:")
+        for module in STAGE_MODULES[stage]:
+            total, packages = import_profile(module)
+            print(f"  {module:<24} {total:7.3f}s")
+            for package, seconds in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+                print(f"      {package:<28} {seconds:7.3f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="RAG pipeline stages")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = commands.add_parser("ingest", help="download the sources, then chunk, embed and index them")
+    ingest_parser.add_argument("--skip-download", action="store_true")
+    ingest_parser.add_argument("--pipelined", action="store_true", help="overlap fetch, clean, chunk, embed and index")
+    ingest_parser.set_defaults(handler=ingest)
+
+    retrieve_parser = commands.add_parser("retrieve", help="top-k chunks for a question (prompted if not given)")
+    retrieve_parser.add_argument("question", nargs="?")
+    retrieve_parser.add_argument("--queries-file")
+    retrieve_parser.set_defaults(handler=retrieve)
+
+    generate_parser = commands.add_parser("generate", help="answer the latest (or --run-id) retrieval, or all pending with --batch")
+    generate_parser.add_argument("--run-id")
+    generate_parser.add_argument("--batch", action="store_true")
+    generate_parser.set_defaults(handler=generate)
+
+    evaluate_parser = commands.add_parser("evaluate", help="score the latest (or --run-id) answer, or all unscored with --batch")
+    evaluate_parser.add_argument("--run-id")
+    evaluate_parser.add_argument("--batch", action="store_true")
+    evaluate_parser.set_defaults(handler=evaluate)
+
+    profile_parser = commands.add_parser("profile-imports", help="import time of every stage module, by package")
+    profile_parser.add_argument("stages", nargs="*", help=", ".join(STAGE_MODULES))
+    profile_parser.add_argument("--top", type=int, default=8)
+    profile_parser.set_defaults(handler=profile_imports)
+
+    args = parser.parse_args()
+    if args.command == "profile-imports" and set(args.stages) - set(STAGE_MODULES):
+        parser.error(f"unknown stage, expected some of {', '.join(STAGE_MODULES)}")
+    args.handler(args)
@@ -6,11 +6,11 @@ from src.data_evaluation import Evaluation
 import asyncio
 
 if __name__ == "__main__":
-    data_retriever = DataRetriever(read_yaml(CONFIG_PATH),VECTORDB_PATH,RETRIEVED_DF_PATH,RETRIEVAL_DIR)
+    data_retriever = DataRetriever(read_yaml(CONFIG_PATH),VECTORDB_PATH,RETRIEVAL_STORE_DIR,RETRIEVAL_DIR)
     data_retriever.run()
 
-    data_generator = DataGenerator(read_yaml(CONFIG_PATH), RETRIEVED_DF_PATH, GENERATOR_DIR, GENERATOR_DF_PATH)
+    data_generator = DataGenerator(read_yaml(CONFIG_PATH), RETRIEVAL_STORE_DIR, GENERATOR_DIR, GENERATOR_STORE_DIR)
     data_generator.run()
     
-    evaluation = Evaluation(read_yaml(CONFIG_PATH),GENERATOR_DF_PATH, RETRIEVED_DF_PATH)
+    evaluation = Evaluation(read_yaml(CONFIG_PATH),GENERATOR_STORE_DIR, RETRIEVAL_STORE_DIR)
     asyncio.run(evaluation.run())
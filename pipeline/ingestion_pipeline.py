@@ -2,12 +2,17 @@ from utils.common_functions import read_yaml
 from config.paths_config import *
 from src.data_ingestion import DataIngestion
 from src.data_processing import DataProcessor
-from src.data_retrieval import DataRetriever
+from src.pipelined_ingestion import PipelinedIngestion
 
 if __name__ == "__main__":
 
-    data_ingestion = DataIngestion(read_yaml(CONFIG_PATH))
-    data_ingestion.run()
+    if read_yaml(CONFIG_PATH).get("pipelined_ingestion", {}).get("enabled", False):
+        # fetch, clean, chunk, embed and index overlap instead of running one after the other
+        pipelined_ingestion = PipelinedIngestion(read_yaml(CONFIG_PATH),PROCESSED_DIR,CHUNKS_DF_PATH,VECTORDB_PATH)
+        pipelined_ingestion.run()
+    else:
+        data_ingestion = DataIngestion(read_yaml(CONFIG_PATH))
+        data_ingestion.run()
 
-    data_processor = DataProcessor(read_yaml(CONFIG_PATH),CONTENT_DATA_TXT,PROCESSED_DIR,CHUNKS_DF_PATH,VECTORDB_PATH)
-    data_processor.run()
+        data_processor = DataProcessor(read_yaml(CONFIG_PATH),CONTENT_DATA_TXT,PROCESSED_DIR,CHUNKS_DF_PATH,VECTORDB_PATH)
+        data_processor.run()
@@ -0,0 +1,53 @@
+import os
+import pandas as pd
+from utils.common_functions import read_yaml
+from config.paths_config import *
+from src.artifact_store import open_store, new_run_id
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+# One-off import of the old single-file CSV artifacts into the append-only stores.
+#   python pipeline/migrate_artifacts.py
+
+
+def migrate_retrieval(config):
+    store = open_store(RETRIEVAL_STORE_DIR, config)
+    if not os.path.exists(RETRIEVED_DF_PATH) or store.run_ids():
+        logger.info("Nothing to migrate for retrieval")
+        return store
+
+    df = pd.read_csv(RETRIEVED_DF_PATH)
+    # every retrieval appended one contiguous block of rows for its question
+    block = (df["query"] != df["query"].shift()).cumsum()
+    run_ids = {b: new_run_id() for b in block.unique()}
+    df.insert(0, "run_id", block.map(run_ids))
+    store.append(df)
+    logger.info(f"Migrated {len(df)} retrieval rows as {len(run_ids)} runs into {RETRIEVAL_STORE_DIR}")
+    return store
+
+
+def migrate_generation(config, retrieval_store):
+    store = open_store(GENERATOR_STORE_DIR, config)
+    if not os.path.exists(GENERATOR_DF_PATH) or store.run_ids():
+        logger.info("Nothing to migrate for generation")
+        return
+
+    df = pd.read_csv(GENERATOR_DF_PATH)
+    # the k-th answer to a question came from the k-th retrieval of that question
+    seen = {}
+    run_ids = []
+    for query in df["query"]:
+        candidates = retrieval_store.run_ids_for_query(query)
+        k = seen.get(query, 0)
+        seen[query] = k + 1
+        run_ids.append(candidates[k] if k < len(candidates) else new_run_id())
+    df.insert(0, "run_id", run_ids)
+    store.append(df)
+    logger.info(f"Migrated {len(df)} generated answers into {GENERATOR_STORE_DIR}")
+
+
+if __name__ == "__main__":
+    config = read_yaml(CONFIG_PATH)
+    retrieval_store = migrate_retrieval(config)
+    migrate_generation(config, retrieval_store)
@@ -0,0 +1,7 @@
+from utils.common_functions import read_yaml
+from config.paths_config import *
+from src.rag_service import RAGService
+
+if __name__ == "__main__":
+    rag_service = RAGService(read_yaml(CONFIG_PATH))
+    rag_service.run()
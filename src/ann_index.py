@@ -0,0 +1,128 @@
+import json
+import math
+import os
+import time
+import faiss
+import numpy as np
+from src.logger import get_logger
+from src.custom_exception import CustomException
+
+logger = get_logger(__name__)
+
+ANN_INDEX_FILE = "ann.faiss"
+ANN_META_FILE = "ann.json"
+
+# The LangChain vector DB (index.faiss + index.pkl) stays an exact flat index: it is what incremental
+# indexing deletes from and adds to, and the ground truth for recall. The approximate index is derived
+# from it after every build and saved next to it as ann.faiss; vector positions are kept, so the
+# docstore mapping of the vector DB is valid for both.
+
+
+def index_spec(index_config, ntotal):
+    # faiss index_factory string for the configured index type, None for the exact flat index
+    index_type = index_config.get("type", "flat")
+    if index_type == "flat":
+        return None
+    if index_type == "hnsw":
+        return f"HNSW{index_config.get('hnsw_m', 32)}"
+
+    # 4*sqrt(N) lists, but never fewer than ~39 training points per list
+    nlist = index_config.get("nlist") or int(4 * math.sqrt(ntotal))
+    nlist = max(1, min(nlist, ntotal // 39))
+    if index_type == "ivf_flat":
+        return f"IVF{nlist},Flat"
+    if index_type == "ivf_pq":
+        return f"IVF{nlist},PQ{index_config.get('pq_m', 16)}x{index_config.get('pq_bits', 8)}"
+    raise ValueError(f"unknown vector_index type '{index_type}', expected flat, hnsw, ivf_flat or ivf_pq")
+
+
+def min_training_vectors(index_config):
+    # PQ trains 2^pq_bits centroids per sub-quantizer
+    if index_config.get("type") == "ivf_pq":
+        return 2 ** index_config.get("pq_bits", 8)
+    return 1
+
+
+def build_ann_index(vectors, index_config, metric=faiss.METRIC_INNER_PRODUCT, seed=0):
+    try:
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        spec = index_spec(index_config, len(vectors))
+
+        start = time.perf_counter()
+        index = faiss.index_factory(vectors.shape[1], spec, metric)
+        if index_config.get("type") == "hnsw":
+            index.hnsw.efConstruction = index_config.get("ef_construction", 200)
+
+        if not index.is_trained:
+            sample = vectors
+            train_sample = index_config.get("train_sample", 100000)
+            if len(vectors) > train_sample:
+                sample = vectors[np.random.default_rng(seed).choice(len(vectors), train_sample, replace=False)]
+            index.train(sample)
+        index.add(vectors)
+        logger.info(f"Built {spec} index over {index.ntotal} vectors in {time.perf_counter() - start:.2f}s")
+        return index
+
+    except Exception as e:
+        logger.error("Failed to build the approximate nearest neighbour index")
+        raise CustomException("Error while building the approximate nearest neighbour index", e)
+
+
+def set_search_params(index, nprobe=None, ef_search=None):
+    # ParameterSpace finds the IVF / HNSW layer whatever wraps it
+    params = faiss.ParameterSpace()
+    if nprobe is not None and faiss.try_extract_index_ivf(index) is not None:
+        params.set_index_parameter(index, "nprobe", nprobe)
+    if ef_search is not None and hasattr(index, "hnsw"):
+        params.set_index_parameter(index, "efSearch", ef_search)
+
+
+def index_memory_bytes(index):
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def read_ann_meta(vectordb_path):
+    path = os.path.join(vectordb_path, ANN_META_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def ann_index_current(vectordb_path, index_config, ntotal):
+    meta = read_ann_meta(vectordb_path)
+    return (
+        meta is not None
+        and meta["index_config"] == index_config
+        and meta["ntotal"] == ntotal
+        and os.path.exists(os.path.join(vectordb_path, ANN_INDEX_FILE))
+    )
+
+
+def save_ann_index(index, vectordb_path, index_config):
+    faiss.write_index(index, os.path.join(vectordb_path, ANN_INDEX_FILE))
+    with open(os.path.join(vectordb_path, ANN_META_FILE), "w", encoding="utf-8") as file:
+        json.dump({"index_config": index_config, "ntotal": int(index.ntotal)}, file)
+
+
+def remove_ann_index(vectordb_path):
+    for name in (ANN_INDEX_FILE, ANN_META_FILE):
+        path = os.path.join(vectordb_path, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def use_ann_index(vector_db, vectordb_path, index_config, nprobe=None, ef_search=None):
+    # Swap the vector DB's flat index for the approximate one when it matches the config and the DB
+    if index_config.get("type", "flat") == "flat":
+        return vector_db
+    if not ann_index_current(vectordb_path, index_config, vector_db.index.ntotal):
+        logger.warning(f"No up to date {index_config['type']} index in {vectordb_path}, using exact search; re-run data processing")
+        return vector_db
+
+    # read only, with flat vector storage memory-mapped rather than read into memory
+    index = faiss.read_index(os.path.join(vectordb_path, ANN_INDEX_FILE), faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+    set_search_params(index, nprobe=nprobe, ef_search=ef_search)
+    vector_db.index = index
+    logger.info(f"Using {index_config['type']} index with nprobe={nprobe} efSearch={ef_search}")
+    return vector_db
@@ -0,0 +1,355 @@
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+import faiss
+import numpy as np
+from src.logger import get_logger
+from src.custom_exception import CustomException
+from src.metrics import increment
+from src.embedding_cache import normalize_query, file_inode
+from src.retrieval_engine import normalize_rows
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = get_logger(__name__)
+
+_shared_caches = {}
+_shared_lock = threading.Lock()
+
+
+def open_answer_cache(cache_dir, config):
+    # one instance per cache directory and embedding model in a process (the app's streamed and
+    # micro-batched paths, the service's generator); None when the answer cache is disabled
+    cache_config = config.get("answer_cache", {})
+    if not cache_config.get("enabled", False):
+        return None
+    key = (os.path.abspath(cache_dir), config["embedding_model"])
+    with _shared_lock:
+        if key not in _shared_caches:
+            _shared_caches[key] = AnswerCache(
+                cache_dir,
+                config["embedding_model"],
+                similarity_threshold=cache_config.get("similarity_threshold", 0.95),
+                ttl_seconds=cache_config.get("ttl_seconds", 7 * 24 * 3600),
+                max_entries=cache_config.get("max_entries", 10000),
+                min_chunk_overlap=cache_config.get("min_chunk_overlap", 0.5)
+            )
+        return _shared_caches[key]
+
+
+def settings_key(settings):
+    # generator model + decoding params; answers are only reused under identical settings
+    return hashlib.sha1(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+# Cache of generated answers in front of the seq2seq model.
+#   exact hit    - same settings, same normalized question and the same retrieved chunk ids
+#   semantic hit - same settings and a cached question whose embedding has cosine similarity
+#                  >= similarity_threshold, found through a small inner product index of cached questions,
+#                  answered from at least min_chunk_overlap of the chunks retrieved now (chunk ids are
+#                  content hashes, so after re-ingestion changed chunks stop matching the old answers)
+# Entries expire after ttl_seconds and the least recently used go once there are more than max_entries.
+# Persistence is an append-only log (answers.log, one JSON line per put or delete) replayed on start;
+# meta.json records the embedding model, a different model wipes the cache. Processes sharing the
+# directory hold an exclusive flock on `lock` for every lookup, put and compaction, and first replay
+# what the others appended, so a compaction rewrites the log with every process's entries. A line cut
+# short by a crash is skipped on replay and cut off before the next append.
+class AnswerCache:
+    def __init__(self, cache_dir, embedding_model, similarity_threshold=0.95, ttl_seconds=604800, max_entries=10000, min_chunk_overlap=0.5):
+        self.cache_dir = cache_dir
+        self.embedding_model = embedding_model
+        self.similarity_threshold = similarity_threshold
+        self.min_chunk_overlap = min_chunk_overlap
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        self.meta_path = os.path.join(cache_dir, "meta.json")
+        self.log_path = os.path.join(cache_dir, "answers.log")
+        self.lock_path = os.path.join(cache_dir, "lock")
+
+        self.entries = OrderedDict()
+        self.ids = {}
+        self.next_id = 0
+        self.log_lines = 0
+        self.log_offset = 0
+        self.log_inode = None
+        self.index = None
+        self.detached = False
+        self.lock_file = None
+        self.lock = threading.Lock()
+
+        self.counters = {
+            "lookups": 0,
+            "exact_hits": 0,
+            "semantic_hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "evictions": 0,
+            "latency_saved_seconds": 0.0,
+        }
+
+        self._open()
+
+    def _open(self):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self.lock_file = open(self.lock_path, "a+")
+            with self.lock, self._file_lock():
+                meta = self._read_meta()
+                if meta and meta["embedding_model"] != self.embedding_model:
+                    logger.info(f"Embedding model changed ({meta['embedding_model']} -> {self.embedding_model}), clearing answer cache")
+                    self._clear()
+                elif meta is None:
+                    self._write_meta()
+                self._sync()
+
+                # entries that expired while the process was down
+                now = time.time()
+                for key in [key for key, entry in self.entries.items() if now - entry["created"] > self.ttl_seconds]:
+                    self._remove(key)
+            logger.info(f"Answer cache opened with {len(self.entries)} answers")
+
+        except Exception as e:
+            logger.error("Failed to open answer cache")
+            raise CustomException("Error while opening answer cache", e)
+
+    @contextmanager
+    def _file_lock(self):
+        # no fcntl (Windows): one process per cache directory
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+
+    def _read_meta(self):
+        if not os.path.exists(self.meta_path):
+            return None
+        with open(self.meta_path, "r", encoding="utf-8") as file:
+            return json.load(file)
+
+    def _write_meta(self):
+        with open(self.meta_path, "w", encoding="utf-8") as file:
+            json.dump({"embedding_model": self.embedding_model}, file)
+
+    def _clear(self):
+        # every file but the lock, which other processes may be holding
+        for path in (self.log_path, self.meta_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self._reset_entries()
+        self.detached = False
+        self._write_meta()
+
+    def _reset_entries(self):
+        self.entries.clear()
+        self.ids.clear()
+        self.index = None
+        self.log_lines = 0
+        self.log_offset = 0
+        self.log_inode = None
+
+    def _sync(self):
+        # replay the log lines written since the last sync, by this or any other process;
+        # a log that was compacted (new inode) or wiped is replayed from the start
+        if self.detached:
+            return
+        stat = os.stat(self.log_path) if os.path.exists(self.log_path) else None
+        inode = stat.st_ino if stat is not None else None
+        if inode != self.log_inode or (stat is not None and stat.st_size < self.log_offset):
+            self._reset_entries()
+            self.log_inode = inode
+            # a process opened with another embedding model wiped the directory: its answers are not ours
+            meta = self._read_meta()
+            if meta and meta["embedding_model"] != self.embedding_model:
+                logger.warning(f"Answer cache {self.cache_dir} was taken over by {meta['embedding_model']}, keeping answers in memory only")
+                self.detached = True
+                return
+
+        if stat is not None and stat.st_size > self.log_offset:
+            with open(self.log_path, "rb") as file:
+                file.seek(self.log_offset)
+                data = file.read(stat.st_size - self.log_offset)
+            # only whole lines; a line cut short by a crash is left for _log to cut off
+            complete = data[:data.rfind(b"\n") + 1]
+            for line in complete.decode("utf-8").splitlines():
+                self._replay(line)
+            self.log_offset += len(complete)
+
+    def _replay(self, line):
+        try:
+            record = json.loads(line)
+        except ValueError:
+            logger.warning(f"Skipping an unreadable line of {self.log_path}")
+            return
+        self.log_lines += 1
+        if "delete" in record:
+            self._remove(record["delete"])
+        else:
+            record["vector"] = np.frombuffer(base64.b64decode(record["vector"]), dtype=np.float32)
+            self._insert(record)
+
+    def key(self, query, chunk_ids, settings):
+        text = "\0".join([settings_key(settings), normalize_query(query), *chunk_ids])
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def _insert(self, entry):
+        if entry["key"] in self.entries:
+            self._remove(entry["key"])
+        if self.index is None:
+            self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(entry["vector"].shape[0]))
+
+        entry_id = self.next_id
+        self.next_id += 1
+        self.index.add_with_ids(entry["vector"][None, :], np.array([entry_id], dtype=np.int64))
+        self.ids[entry_id] = entry["key"]
+        entry["id"] = entry_id
+        self.entries[entry["key"]] = entry
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.index.remove_ids(np.array([entry["id"]], dtype=np.int64))
+            del self.ids[entry["id"]]
+
+    def _log(self, record):
+        if self.detached:
+            return
+        # called under the file lock, right after _sync: bytes past log_offset are a crashed writer's partial line
+        if self.log_inode is not None and os.path.getsize(self.log_path) > self.log_offset:
+            os.truncate(self.log_path, self.log_offset)
+        data = (json.dumps(record) + "\n").encode("utf-8")
+        with open(self.log_path, "ab") as file:
+            file.write(data)
+        if self.log_inode is None:
+            self.log_inode = file_inode(self.log_path)
+        self.log_offset += len(data)
+        self.log_lines += 1
+
+    def _delete(self, key):
+        self._remove(key)
+        self._log({"delete": key})
+
+    def _expired(self, entry):
+        return time.time() - entry["created"] > self.ttl_seconds
+
+    def chunk_overlap(self, entry, chunk_ids):
+        # share of the chunks retrieved now that the cached answer was generated from;
+        # entries written before chunk ids were stored never match
+        cached = entry.get("chunk_ids")
+        if cached is None:
+            return 0.0
+        if not chunk_ids:
+            return 1.0 if not cached else 0.0
+        return len(set(cached) & set(chunk_ids)) / len(set(chunk_ids))
+
+    def _hit(self, entry, kind):
+        self.entries.move_to_end(entry["key"])
+        self.counters[kind] += 1
+        increment(f"answer_cache_{kind}")
+        self.counters["latency_saved_seconds"] += entry["generation_seconds"]
+        return entry["answer"]
+
+    def lookup(self, query, query_vector, chunk_ids, settings):
+        with self.lock, self._file_lock():
+            self._sync()
+            self.counters["lookups"] += 1
+
+            entry = self.entries.get(self.key(query, chunk_ids, settings))
+            if entry is not None and self._expired(entry):
+                self.counters["expired"] += 1
+                self._delete(entry["key"])
+            elif entry is not None:
+                return self._hit(entry, "exact_hits")
+
+            if self.index is not None and self.index.ntotal and query_vector is not None:
+                wanted = settings_key(settings)
+                scores, ids = self.index.search(normalize_rows(query_vector), min(8, self.index.ntotal))
+                for score, entry_id in zip(scores[0], ids[0]):
+                    if score < self.similarity_threshold:
+                        break
+                    entry = self.entries[self.ids[int(entry_id)]]
+                    if entry["settings"] != wanted or self.chunk_overlap(entry, chunk_ids) < self.min_chunk_overlap:
+                        continue
+                    if self._expired(entry):
+                        self.counters["expired"] += 1
+                        self._delete(entry["key"])
+                        continue
+                    return self._hit(entry, "semantic_hits")
+
+            self.counters["misses"] += 1
+            increment("answer_cache_misses")
+            return None
+
+    def put(self, query, query_vector, chunk_ids, settings, answer, generation_seconds):
+        try:
+            with self.lock, self._file_lock():
+                self._sync()
+                entry = {
+                    "key": self.key(query, chunk_ids, settings),
+                    "settings": settings_key(settings),
+                    "query": query,
+                    "chunk_ids": list(chunk_ids),
+                    "answer": answer,
+                    "created": time.time(),
+                    "generation_seconds": generation_seconds,
+                    "vector": normalize_rows(query_vector)[0]
+                }
+                self._insert(entry)
+                self._log({**{k: v for k, v in entry.items() if k != "id"},
+                           "vector": base64.b64encode(entry["vector"].tobytes()).decode("ascii")})
+
+                while len(self.entries) > self.max_entries:
+                    self.counters["evictions"] += 1
+                    self._delete(next(iter(self.entries)))
+
+                if self.log_lines > 2 * self.max_entries and not self.detached:
+                    self._compact_log()
+
+        except Exception as e:
+            logger.error("Failed to store answer in answer cache")
+            raise CustomException("Error while storing answer in answer cache", e)
+
+    def _compact_log(self):
+        # rewrite the log with only the live entries, oldest first so LRU order survives a restart;
+        # written aside and swapped in, other processes see the new inode and replay it whole
+        tmp_path = self.log_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            for entry in self.entries.values():
+                record = {k: v for k, v in entry.items() if k != "id"}
+                record["vector"] = base64.b64encode(entry["vector"].tobytes()).decode("ascii")
+                file.write(json.dumps(record) + "\n")
+        os.replace(tmp_path, self.log_path)
+        stat = os.stat(self.log_path)
+        self.log_inode = stat.st_ino
+        self.log_offset = stat.st_size
+        self.log_lines = len(self.entries)
+
+    def get_or_generate(self, query, query_vector, chunk_ids, settings, generate):
+        answer = self.lookup(query, query_vector, chunk_ids, settings)
+        if answer is None:
+            start = time.perf_counter()
+            answer = generate()
+            self.put(query, query_vector, chunk_ids, settings, answer, time.perf_counter() - start)
+        return answer
+
+    def stats(self):
+        with self.lock:
+            hits = self.counters["exact_hits"] + self.counters["semantic_hits"]
+            return {
+                **self.counters,
+                "latency_saved_seconds": round(self.counters["latency_saved_seconds"], 3),
+                "hit_rate": round(hits / self.counters["lookups"], 4) if self.counters["lookups"] else 0.0,
+                "entries": len(self.entries),
+            }
@@ -0,0 +1,242 @@
+import json
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+import pandas as pd
+from src.logger import get_logger
+from src.custom_exception import CustomException
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = get_logger(__name__)
+
+
+def new_run_id():
+    return uuid.uuid4().hex
+
+
+def open_store(root_dir, config):
+    store_config = config.get("artifact_store", {})
+    return ArtifactStore(
+        root_dir,
+        compact_threshold=store_config.get("compact_threshold", 64),
+        compact_segment_rows=store_config.get("compact_segment_rows", 50000)
+    )
+
+
+# Append-only store of Parquet segments for pipeline artifacts (retrieval / generation rows).
+#   segment-<seq>.parquet  - one file per append, never rewritten except by compaction
+#   index.jsonl            - one line per run: {"run_id", "query", "segment", "rows"}
+# Every row carries a run_id column; appends cost O(rows appended), not O(history).
+# Small segments are merged once there are more than `compact_threshold` of them.
+# Appending a run_id that is already stored replaces that run: its old rows are skipped on read
+# and dropped by the next compaction. Several processes can write one store: appends and compaction
+# hold an exclusive flock on `lock`, reads a shared one, and each first replays the index lines the
+# others wrote; segment names are claimed with O_EXCL, so two writers never pick the same file.
+class ArtifactStore:
+    def __init__(self, root_dir, compact_threshold=64, compact_segment_rows=50000):
+        self.root_dir = root_dir
+        self.index_path = os.path.join(root_dir, "index.jsonl")
+        self.lock_path = os.path.join(root_dir, "lock")
+        self.compact_threshold = compact_threshold
+        self.compact_segment_rows = compact_segment_rows
+        self.lock = threading.RLock()
+
+        self.runs = {}
+        self.run_order = []
+        self.runs_by_query = {}
+        self.segment_rows = {}
+        self.index_offset = 0
+        self.index_inode = None
+
+        os.makedirs(root_dir, exist_ok=True)
+        self.lock_file = open(self.lock_path, "a+")
+        with self._file_lock(exclusive=False):
+            self._sync()
+
+    @contextmanager
+    def _file_lock(self, exclusive):
+        # no fcntl (Windows): one writing process per store
+        with self.lock:
+            if fcntl is None:
+                yield
+                return
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+
+    def _reset(self):
+        self.runs.clear()
+        self.run_order.clear()
+        self.runs_by_query.clear()
+        self.segment_rows.clear()
+        self.index_offset = 0
+        self.index_inode = None
+
+    def _sync(self):
+        # replay the index lines written since the last sync, by this or any other process;
+        # a compacted index (new inode) is replayed from the start
+        if not os.path.exists(self.index_path):
+            if self.index_inode is not None:
+                self._reset()
+            return
+        stat = os.stat(self.index_path)
+        if stat.st_ino != self.index_inode or stat.st_size < self.index_offset:
+            self._reset()
+            self.index_inode = stat.st_ino
+        if stat.st_size > self.index_offset:
+            with open(self.index_path, "rb") as file:
+                file.seek(self.index_offset)
+                data = file.read(stat.st_size - self.index_offset)
+            # only whole lines; a line cut short by a crash is cut off by the next append
+            complete = data[:data.rfind(b"\n") + 1]
+            for line in complete.decode("utf-8").splitlines():
+                if line.strip():
+                    self._register(json.loads(line))
+            self.index_offset += len(complete)
+
+    def _register(self, entry):
+        # a segment whose write crashed before its index line is never registered, so it is ignored
+        old = self.runs.get(entry["run_id"])
+        if old is not None:
+            self.segment_rows[old["segment"]] -= old["rows"]
+            self.run_order.remove(entry["run_id"])
+            self.runs_by_query[old["query"]].remove(entry["run_id"])
+        self.run_order.append(entry["run_id"])
+        self.runs_by_query.setdefault(entry["query"], []).append(entry["run_id"])
+        self.runs[entry["run_id"]] = entry
+        self.segment_rows[entry["segment"]] = self.segment_rows.get(entry["segment"], 0) + entry["rows"]
+
+    def _claim_segment(self):
+        seq = 0
+        for name in os.listdir(self.root_dir):
+            if name.startswith("segment-") and name.endswith(".parquet"):
+                seq = max(seq, int(name[8:-8]) + 1)
+        while True:
+            segment = f"segment-{seq:08d}.parquet"
+            try:
+                os.close(os.open(os.path.join(self.root_dir, segment), os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return segment
+            except FileExistsError:
+                seq += 1
+
+    def _append_index(self, entries):
+        data = "".join(json.dumps(entry) + "\n" for entry in entries).encode("utf-8")
+        # called right after _sync under the exclusive lock: bytes past the offset are a crashed writer's partial line
+        if self.index_inode is not None and os.path.getsize(self.index_path) > self.index_offset:
+            os.truncate(self.index_path, self.index_offset)
+        with open(self.index_path, "ab") as file:
+            file.write(data)
+        if self.index_inode is None:
+            self.index_inode = os.stat(self.index_path).st_ino
+        self.index_offset += len(data)
+        for entry in entries:
+            self._register(entry)
+
+    def append(self, df):
+        # nothing to record (e.g. a retrieval that found no chunks); a segment without index lines would be orphaned
+        if df.empty:
+            logger.info(f"Nothing to append to artifact store {self.root_dir}")
+            return
+        try:
+            with self._file_lock(exclusive=True):
+                self._sync()
+                segment = self._claim_segment()
+                df.to_parquet(os.path.join(self.root_dir, segment), index=False)
+
+                self._append_index([
+                    {"run_id": run_id, "query": str(group["query"].iloc[0]), "segment": segment, "rows": len(group)}
+                    for run_id, group in df.groupby("run_id", sort=False)
+                ])
+
+                small = [s for s, rows in self.segment_rows.items() if rows < self.compact_segment_rows]
+                if len(small) > self.compact_threshold:
+                    self._compact(small)
+
+        except Exception as e:
+            logger.error(f"Failed to append to artifact store {self.root_dir}")
+            raise CustomException("Error while appending to artifact store", e)
+
+    def _live_runs(self):
+        # segment -> run_ids whose current rows are in it
+        live = {}
+        for run_id, entry in self.runs.items():
+            live.setdefault(entry["segment"], set()).add(run_id)
+        return live
+
+    def _read_segment(self, segment, live):
+        df = pd.read_parquet(os.path.join(self.root_dir, segment))
+        return df[df["run_id"].isin(live.get(segment, set()))]
+
+    def _compact(self, segments):
+        # called under the exclusive lock right after _sync, so every writer's runs are in self.runs
+        logger.info(f"Compacting {len(segments)} segments in {self.root_dir}")
+        segments = sorted(segments)
+        merged = self._claim_segment()
+        live = self._live_runs()
+        pd.concat(
+            [self._read_segment(s, live) for s in segments], ignore_index=True
+        ).to_parquet(os.path.join(self.root_dir, merged), index=False)
+
+        merged_set = set(segments)
+        for entry in self.runs.values():
+            if entry["segment"] in merged_set:
+                entry["segment"] = merged
+        self.segment_rows[merged] = sum(self.segment_rows.pop(s) for s in segments)
+
+        # new index is swapped in atomically before the old segments go away
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            for run_id in self.run_order:
+                file.write(json.dumps(self.runs[run_id]) + "\n")
+        os.replace(tmp_path, self.index_path)
+        stat = os.stat(self.index_path)
+        self.index_inode = stat.st_ino
+        self.index_offset = stat.st_size
+        for s in segments:
+            os.remove(os.path.join(self.root_dir, s))
+
+    def latest_run_id(self):
+        with self._file_lock(exclusive=False):
+            self._sync()
+            return self.run_order[-1] if self.run_order else None
+
+    def run_ids(self):
+        with self._file_lock(exclusive=False):
+            self._sync()
+            return list(self.run_order)
+
+    def run_ids_for_query(self, query):
+        with self._file_lock(exclusive=False):
+            self._sync()
+            return list(self.runs_by_query.get(query, []))
+
+    def read_run(self, run_id):
+        try:
+            with self._file_lock(exclusive=False):
+                self._sync()
+                entry = self.runs[run_id]
+                return pd.read_parquet(os.path.join(self.root_dir, entry["segment"]), filters=[("run_id", "==", run_id)])
+
+        except Exception as e:
+            logger.error(f"Failed to read run {run_id} from artifact store {self.root_dir}")
+            raise CustomException("Error while reading run from artifact store", e)
+
+    def read_all(self):
+        with self._file_lock(exclusive=False):
+            self._sync()
+            live = self._live_runs()
+            segments = sorted(live)
+            if not segments:
+                return pd.DataFrame()
+            df = pd.concat([self._read_segment(s, live) for s in segments], ignore_index=True)
+
+            # compaction can merge segments around a large one, so restore the append order explicitly
+            order = {run_id: i for i, run_id in enumerate(self.run_order)}
+            return df.iloc[df["run_id"].map(order).argsort(kind="stable")].reset_index(drop=True)
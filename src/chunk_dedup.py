@@ -0,0 +1,102 @@
+import hashlib
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from src.logger import get_logger
+from src.custom_exception import CustomException
+
+logger = get_logger(__name__)
+
+
+class ChunkDeduplicator:
+    # Drops exact duplicates by content hash and near duplicates by MinHash + LSH banding.
+    # Stateful: every call to filter() also checks against the chunks kept by earlier calls,
+    # so it can sit inside the streaming path batch by batch.
+    def __init__(self, config):
+        self.threshold = config.get("similarity_threshold", 0.9)
+        self.num_perm = config.get("num_perm", 64)
+        self.bands = config.get("bands", 16)
+        self.shingle_size = config.get("shingle_size", 5)
+        self.rows = self.num_perm // self.bands
+
+        rng = np.random.default_rng(config.get("seed", 1))
+        # multiply-shift hash family; uint64 arithmetic wraps on purpose
+        self.a = rng.integers(1, 2**63, self.num_perm, dtype=np.uint64) | np.uint64(1)
+        self.b = rng.integers(0, 2**63, self.num_perm, dtype=np.uint64)
+        self.powers = np.uint64(257) ** np.arange(self.shingle_size, dtype=np.uint64)
+
+        self.exact = {}
+        self.buckets = [{} for _ in range(self.bands)]
+        self.signatures = {}
+        self.mapping = []
+        self.counts = {"chunks": 0, "kept": 0, "exact_duplicates": 0, "near_duplicates": 0}
+
+    def signature(self, text):
+        data = np.frombuffer(text.encode("utf-8"), dtype=np.uint8)
+        if len(data) < self.shingle_size:
+            data = np.pad(data, (0, self.shingle_size - len(data)))
+        shingles = np.unique((sliding_window_view(data, self.shingle_size).astype(np.uint64) * self.powers).sum(axis=1))
+        return ((self.a[:, None] * shingles[None, :] + self.b[:, None]) >> np.uint64(32)).min(axis=1)
+
+    def band_keys(self, signature):
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def filter(self, texts, keys):
+        # returns the positions (into texts) of the chunks to keep
+        try:
+            kept = []
+            for position, (text, key) in enumerate(zip(texts, keys)):
+                self.counts["chunks"] += 1
+
+                digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+                if digest in self.exact:
+                    self.counts["exact_duplicates"] += 1
+                    self.mapping.append((key, self.exact[digest], "exact", 1.0))
+                    continue
+
+                signature = self.signature(text)
+                band_keys = self.band_keys(signature)
+                best_key, best_similarity = None, 0.0
+                candidates = {c for band, band_key in enumerate(band_keys) for c in self.buckets[band].get(band_key, ())}
+                for candidate in candidates:
+                    similarity = float(np.mean(self.signatures[candidate] == signature))
+                    if similarity > best_similarity:
+                        best_key, best_similarity = candidate, similarity
+
+                if best_key is not None and best_similarity >= self.threshold:
+                    self.counts["near_duplicates"] += 1
+                    self.mapping.append((key, best_key, "near", round(best_similarity, 4)))
+                    continue
+
+                self.keep(digest, key, signature, band_keys)
+                self.counts["kept"] += 1
+                kept.append(position)
+            return kept
+
+        except Exception as e:
+            logger.error("Failed to deduplicate chunks")
+            raise CustomException("Error while deduplicating chunks", e)
+
+    def keep(self, digest, key, signature, band_keys):
+        self.exact[digest] = key
+        self.signatures[key] = signature
+        for band, band_key in enumerate(band_keys):
+            self.buckets[band].setdefault(band_key, []).append(key)
+
+    def seed(self, texts, keys):
+        # chunks kept by an earlier run: later filter() calls dedup against them, they are not counted
+        for text, key in zip(texts, keys):
+            signature = self.signature(text)
+            self.keep(hashlib.sha1(text.encode("utf-8")).hexdigest(), key, signature, self.band_keys(signature))
+
+    def report(self):
+        dropped = self.counts["exact_duplicates"] + self.counts["near_duplicates"]
+        shrink = dropped / self.counts["chunks"] if self.counts["chunks"] else 0.0
+        return {**self.counts, "index_shrink_pct": round(100 * shrink, 2)}
+
+    def mapping_df(self):
+        return pd.DataFrame(self.mapping, columns=["dropped_chunk", "kept_chunk", "kind", "similarity"])
+
+    def save_mapping(self, path):
+        self.mapping_df().to_csv(path, index=False)
+        logger.info(f"Dedup: {self.report()}, mapping saved to {path}")
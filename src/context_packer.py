@@ -0,0 +1,120 @@
+from src.logger import get_logger
+from src.custom_exception import CustomException
+
+logger = get_logger(__name__)
+
+
+def overlap_length(head, tail, min_overlap):
+    # length of the longest suffix of `head` that is also a prefix of `tail` (0 if below min_overlap)
+    if min(len(head), len(tail)) < min_overlap:
+        return 0
+    probe = tail[:min_overlap]
+    position = head.find(probe, max(0, len(head) - len(tail)))
+    while position != -1:
+        if tail.startswith(head[position:]):
+            return len(head) - position
+        position = head.find(probe, position + 1)
+    return 0
+
+
+class ContextPacker:
+    # Turns the top-k retrieved chunks into the context of one prompt:
+    #   1. chunks contained in another retrieved chunk are dropped
+    #   2. chunks that overlap (chunking uses a sliding window) are stitched back into continuous spans
+    #   3. spans are added by score until the token budget is used; the last one may be cut to fit
+    # The budget never eats into the tokens reserved for the rest of the prompt (template + question).
+    def __init__(self, tokenizer, config, max_input_length):
+        self.tokenizer = tokenizer
+        self.token_budget = config.get("context_token_budget", 1536)
+        self.min_overlap = config.get("min_merge_overlap", 50)
+        self.min_fill_tokens = config.get("min_fill_tokens", 64)
+        self.max_input_length = max_input_length
+        self.last_stats = None
+        # packed spans are joined with a blank line (build_prompt), which costs tokens as well
+        self.separator_tokens = len(tokenizer("\n\n", add_special_tokens=False)["input_ids"])
+
+    def merge_spans(self, chunks, scores):
+        # -> [(text, score)] ordered by score, a span scores as its best chunk
+        kept = []
+        for i in sorted(range(len(chunks)), key=lambda i: (-len(chunks[i]), i)):
+            container = next((k for k in kept if chunks[i] in chunks[k]), None)
+            if container is None:
+                kept.append(i)
+            else:
+                scores[container] = max(scores[container], scores[i])
+        alive = sorted(kept)
+
+        # each chunk keeps its best successor; chains of successors are the spans
+        successor = {}
+        predecessor = {}
+        for i in alive:
+            best_j, best_overlap = None, 0
+            for j in alive:
+                if i == j or j in predecessor:
+                    continue
+                overlap = overlap_length(chunks[i], chunks[j], self.min_overlap)
+                if overlap > best_overlap:
+                    best_j, best_overlap = j, overlap
+            if best_j is not None and not self._reaches(successor, best_j, i):
+                successor[i] = (best_j, best_overlap)
+                predecessor[best_j] = i
+
+        spans = []
+        for start in alive:
+            if start in predecessor:
+                continue
+            text, score, node = chunks[start], scores[start], start
+            while node in successor:
+                node, overlap = successor[node]
+                text += chunks[node][overlap:]
+                score = max(score, scores[node])
+            spans.append((text, score))
+        return sorted(spans, key=lambda span: -span[1])
+
+    def _reaches(self, successor, start, target):
+        # would linking into `start` close a cycle back to `target`
+        node = start
+        while node in successor:
+            node = successor[node][0]
+            if node == target:
+                return True
+        return node == target
+
+    def pack(self, chunks, scores=None, reserved_tokens=0):
+        try:
+            if not chunks:
+                return []
+            # retrieval returns chunks best first, so rank stands in for a missing score
+            scores = list(scores) if scores is not None else [-rank for rank in range(len(chunks))]
+            spans = self.merge_spans(list(chunks), scores)
+
+            budget = min(self.token_budget, self.max_input_length - reserved_tokens)
+            token_ids = self.tokenizer([text for text, _ in spans], add_special_tokens=False)["input_ids"]
+
+            packed = []
+            used = 0
+            for (text, _), ids in zip(spans, token_ids):
+                separator = self.separator_tokens if packed else 0
+                remaining = budget - used - separator
+                if len(ids) <= remaining:
+                    packed.append(text)
+                    used += separator + len(ids)
+                elif remaining >= self.min_fill_tokens:
+                    packed.append(self.tokenizer.decode(ids[:remaining], skip_special_tokens=True))
+                    used = budget
+
+            # from the token counts taken while packing, nothing is tokenized again for the log line
+            self.last_stats = {
+                "chunks": len(chunks),
+                "spans": len(spans),
+                "packed_spans": len(packed),
+                "span_tokens": sum(len(ids) for ids in token_ids),
+                "context_tokens": used,
+                "budget": budget
+            }
+            logger.info(f"Context packing: {self.last_stats}")
+            return packed
+
+        except Exception as e:
+            logger.error("Failed to pack retrieved chunks into the context")
+            raise CustomException("Error while packing retrieved chunks into the context", e)
@@ -1,63 +1,169 @@
+import json
 import os
+import time
+import numpy as np
 import pandas as pd
 from src.logger import get_logger
 from src.custom_exception import CustomException
 from config.paths_config import *
-from ragas.dataset_schema import SingleTurnSample
-from ragas.metrics import NonLLMContextRecall
-from ragas.metrics import NonLLMContextPrecisionWithReference
 from utils.common_functions import read_yaml
+from src.artifact_store import open_store
+from src.metrics import configure_metrics, timed, span, increment
 import asyncio  # Required for running async code
 
 logger = get_logger(__name__)
 
+METRIC_NAMES = ["context_recall", "context_precision"]
+
 class Evaluation:
-    def __init__(self, config, generator_df_path, retrieved_df_path):
+    def __init__(self, config, generator_store_dir, retrieval_store_dir, evaluation_store_dir=EVALUATION_STORE_DIR, summary_path=EVALUATION_SUMMARY_PATH):
         self.config = config
-        self.generator_df_path = generator_df_path
-        self.retrieved_df_path = retrieved_df_path
+        self.eval_config = config.get("evaluation", {})
+        self.concurrency = self.eval_config.get("concurrency", 16)
+        self.checkpoint_size = self.eval_config.get("checkpoint_size", 500)
+        self.generator_store_dir = generator_store_dir
+        self.retrieval_store_dir = retrieval_store_dir
+        self.evaluation_store_dir = evaluation_store_dir
+        self.summary_path = summary_path
+        self.generator_store = open_store(generator_store_dir, config)
+        self.retrieval_store = open_store(retrieval_store_dir, config)
+        self.evaluation_store = None
+        configure_metrics(config)
+
+        # ragas is imported here rather than at module import, it is the slowest import of the repo;
+        # its metric objects are stateless, one of each serves every sample
+        from ragas.metrics import NonLLMContextRecall, NonLLMContextPrecisionWithReference
+        self.context_recall = NonLLMContextRecall()
+        self.context_precision = NonLLMContextPrecisionWithReference()
 
-        self.question = None
+        self.run_id = None
+        self.query = None
         self.context_chunks = None
         self.generated_text = None
         logger.info("Initialized Evaluation: starting Evaluation")
 
-    def load_generation(self):
+    def load_generation(self, run_id=None):
         try:
-            logger.info(f"Loading retrieved data from file: {self.retrieved_df_path}")
-            retrieved_df = pd.read_csv(self.retrieved_df_path)
+            # Defaults to the most recent generated answer and the retrieval run it used
+            self.run_id = run_id or self.generator_store.latest_run_id()
+            logger.info(f"Loading run {self.run_id} from stores: {self.generator_store_dir}, {self.retrieval_store_dir}")
+
+            retrieved_df = self.retrieval_store.read_run(self.run_id)
             logger.info(f"Retrieved data loaded with {len(retrieved_df)} rows.")
 
-            self.query = retrieved_df['query'][retrieved_df.shape[0] - 1]
+            self.query = retrieved_df['query'].iloc[0]
             logger.info(f"Extracted query for processing: '{self.query}'")
 
-            self.context_chunks = retrieved_df[retrieved_df['query'] == self.query]['document'].tolist()
+            self.context_chunks = retrieved_df['document'].tolist()
             logger.info(f"Loaded {len(self.context_chunks)} context chunks for answering.")
 
-            generator_df = pd.read_csv(self.generator_df_path)
-            self.generated_text = generator_df[generator_df['query'] == self.query]['answer'].tolist()
+            generator_df = self.generator_store.read_run(self.run_id)
+            self.generated_text = generator_df['answer'].tolist()
         except Exception as e:
-            logger.error("Failed to load retrieved data from CSV.")
+            logger.error("Failed to load retrieved data from the artifact stores.")
             raise CustomException("Failed to load retrieved data", e)
 
     async def metrics(self):
+        from ragas.dataset_schema import SingleTurnSample
         sample = SingleTurnSample(
             retrieved_contexts=self.generated_text,
             reference_contexts=self.context_chunks
         )
 
-        context_recall = NonLLMContextRecall()
-        recall = await context_recall.single_turn_ascore(sample)
+        recall, precision = await asyncio.gather(
+            self.context_recall.single_turn_ascore(sample),
+            self.context_precision.single_turn_ascore(sample)
+        )
+        logger.info(f"Run {self.run_id}: context_recall {recall}, context_precision {precision}")
+
+    @timed("evaluation.load_pending_records")
+    def load_pending_records(self):
+        try:
+            # one scan of each store instead of a filtered Parquet read per run
+            self.evaluation_store = open_store(self.evaluation_store_dir, self.config)
+            generator_df = self.generator_store.read_all()
+            retrieval_df = self.retrieval_store.read_all()
+            if generator_df.empty or retrieval_df.empty:
+                return []
+
+            contexts = retrieval_df.groupby("run_id", sort=False)["document"].agg(list)
+            answers = generator_df.groupby("run_id", sort=False).agg(query=("query", "first"), answer=("answer", list))
 
-        context_precision = NonLLMContextPrecisionWithReference()
-        precision = await context_precision.single_turn_ascore(sample)
-        print(recall,precision)
+            # resume: runs that already have a score are skipped
+            records = [
+                (run_id, row["query"], contexts[run_id], row["answer"])
+                for run_id, row in answers.iterrows()
+                if run_id in contexts.index and run_id not in self.evaluation_store.runs
+            ]
+            logger.info(f"{len(records)} of {len(answers)} generated answers still need scores")
+            return records
 
+        except Exception as e:
+            logger.error("Failed to load the generation history for evaluation")
+            raise CustomException("Failed to load the generation history for evaluation", e)
 
-    async def run(self):
+    async def score_record(self, semaphore, record):
+        from ragas.dataset_schema import SingleTurnSample
+        run_id, query, context_chunks, answers = record
+        sample = SingleTurnSample(retrieved_contexts=answers, reference_contexts=context_chunks)
+        try:
+            # every metric call takes its own slot, so at most `concurrency` calls run at once
+            recall, precision = await asyncio.gather(
+                self.limited(semaphore, self.context_recall.single_turn_ascore(sample)),
+                self.limited(semaphore, self.context_precision.single_turn_ascore(sample))
+            )
+            return {"run_id": run_id, "query": query, "context_recall": float(recall), "context_precision": float(precision), "error": None}
+        except Exception as e:
+            # one bad record is stored with its error instead of failing the whole batch
+            logger.error(f"Failed to score run {run_id}: {e}")
+            return {"run_id": run_id, "query": query, "context_recall": np.nan, "context_precision": np.nan, "error": str(e)}
+
+    async def limited(self, semaphore, coroutine):
+        async with semaphore:
+            return await coroutine
+
+    async def evaluate_batch(self, records):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        start = time.perf_counter()
+        # scores are appended after every checkpoint, so an interrupted run loses at most one
+        for offset in range(0, len(records), self.checkpoint_size):
+            batch = records[offset:offset + self.checkpoint_size]
+            with span("evaluation.score_checkpoint"):
+                rows = await asyncio.gather(*(self.score_record(semaphore, record) for record in batch))
+            self.evaluation_store.append(pd.DataFrame(rows))
+            increment("records_evaluated", len(rows))
+            done = offset + len(batch)
+            logger.info(f"Scored {done}/{len(records)} records ({done / (time.perf_counter() - start):.1f} records/sec)")
+
+    @timed("evaluation.write_summary")
+    def write_summary(self):
+        try:
+            scores_df = self.evaluation_store.read_all()
+            scored = scores_df[scores_df["error"].isna()] if not scores_df.empty else scores_df
+            summary = {"records": len(scores_df), "failed": len(scores_df) - len(scored)}
+            for name in METRIC_NAMES:
+                values = scored[name] if not scored.empty else pd.Series(dtype=float)
+                summary[name] = {
+                    "mean": float(values.mean()) if len(values) else None,
+                    "p50": float(values.median()) if len(values) else None,
+                    "min": float(values.min()) if len(values) else None
+                }
+
+            os.makedirs(os.path.dirname(self.summary_path), exist_ok=True)
+            with open(self.summary_path, "w", encoding="utf-8") as file:
+                json.dump(summary, file, indent=2)
+            logger.info(f"Evaluation summary written to {self.summary_path}: {summary}")
+            return summary
+
+        except Exception as e:
+            logger.error("Failed to write the evaluation summary")
+            raise CustomException("Failed to write the evaluation summary", e)
+
+
+    async def run(self, run_id=None):
         try:
             logger.info("Starting full data evaluation workflow")
-            self.load_generation()
+            self.load_generation(run_id)
             await self.metrics()
             logger.info("Completed data evaluation workflow successfully")
         except CustomException as e:
@@ -65,7 +171,22 @@ class Evaluation:
         finally:
             logger.info("Data evaluation process finished")
 
+    async def run_batch(self):
+        try:
+            logger.info("Starting batch data evaluation workflow")
+            records = self.load_pending_records()
+            if records:
+                await self.evaluate_batch(records)
+            else:
+                logger.info("Every generated answer already has scores.")
+            self.write_summary()
+            logger.info("Completed batch data evaluation workflow successfully")
+        except CustomException as e:
+            logger.error(f"Batch data evaluation encountered an error: {str(e)}")
+        finally:
+            logger.info("Batch data evaluation process finished")
+
 
 if __name__ == "__main__":
-    evaluation = Evaluation(read_yaml(CONFIG_PATH),GENERATOR_DF_PATH, RETRIEVED_DF_PATH)
+    evaluation = Evaluation(read_yaml(CONFIG_PATH),GENERATOR_STORE_DIR, RETRIEVAL_STORE_DIR)
     asyncio.run(evaluation.run())
@@ -1,134 +1,386 @@
+import time
+import threading
+import numpy as np
 import pandas as pd
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
 import os
 from src.logger import get_logger
 from src.custom_exception import CustomException
 from utils.common_functions import read_yaml
 from config.paths_config import *
+from src.artifact_store import open_store
+from src.answer_cache import open_answer_cache
+from src.embedding_cache import open_query_cache
+from src.text_streaming import stream_generate, StreamTimer
+from src.context_packer import ContextPacker
+from src.model_loader import load_embeddings, load_tokenizer, load_seq2seq_model, inference_backends, onnx_export_dir, embedding_model_key, embedding_tokenizer_lowercases
+from src.metrics import configure_metrics, timed, span, increment
+from utils.helpers import content_hash
 
 logger = get_logger(__name__)
 
 class DataGenerator:
-    def __init__(self, config, retrieved_df_path,output_dir, generator_df_path):
+    def __init__(self, config, retrieval_store_dir, output_dir, generator_store_dir):
         # Load relevant configuration for data generation and model name
         self.llm_generator = config["text_to_text_model"]
         self.config = config["data_generator"]
+        self.max_input_length = self.config.get("max_input_length", 2048)
+        self.max_new_tokens = self.config.get("max_new_tokens", 512)
+        self.batch_size = self.config.get("generation_batch_size", 8)
+        self.length_buckets = sorted(self.config.get("length_buckets", [self.max_input_length]))
+        self.stream = self.config.get("stream", False)
+        self.embedding_model = config["embedding_model"]
+        self.query_cache_config = config.get("query_cache", {})
+        self.embedding_backend, self.generator_backend = inference_backends(config)
+        configure_metrics(config)
         
         # Initialize tokenizer and model once at class instantiation
-        logger.info(f"Loading tokenizer and model from '{self.llm_generator}'...")
-        self.tokenizer = AutoTokenizer.from_pretrained(self.llm_generator)
-        self.model = AutoModelForSeq2SeqLM.from_pretrained(self.llm_generator)
+        logger.info(f"Loading tokenizer and model from '{self.llm_generator}' on the {self.generator_backend} backend...")
+        with span("generator.load_model"):
+            self.tokenizer = load_tokenizer(self.llm_generator)
+            self.model = load_seq2seq_model(
+                self.llm_generator,
+                backend=self.generator_backend,
+                onnx_dir=onnx_export_dir(MODELS_DIR, self.llm_generator)
+            )
         logger.info("Tokenizer and model loaded successfully.")
+        # HF fast tokenizers are not thread safe ("Already borrowed"), and service workers and
+        # micro-batcher threads share this one: tokenizer and model calls are serialized on the lock
+        self.model_lock = threading.RLock()
+
+        self.packer = None
+        if self.config.get("context_packing", False):
+            self.packer = ContextPacker(self.tokenizer, self.config, self.max_input_length)
 
-        self.retrieved_df_path = retrieved_df_path
-        self.generator_df_path = generator_df_path
+        self.retrieval_store_dir = retrieval_store_dir
+        self.generator_store_dir = generator_store_dir
+        self.retrieval_store = open_store(retrieval_store_dir, config)
+        self.generator_store = open_store(generator_store_dir, config)
         self.output_dir = output_dir
+        self.answer_cache = open_answer_cache(ANSWER_CACHE_DIR, config)
+        self.embed_query = None
+        self.model_embedding = None
+        self.embedding_lock = threading.Lock()
+        self.run_id = None
         self.query = None
         self.context_chunks = None
         self.answer = None
+        self.timing = None
 
         os.makedirs(self.output_dir, exist_ok=True)
 
         logger.info("DataGenerator instance created and ready.")
 
-    def load_retrieval(self):
+    @timed("generator.load_retrieval")
+    def load_retrieval(self, run_id=None):
         try:
-            logger.info(f"Loading retrieved data from file: {self.retrieved_df_path}")
-            retrieved_df = pd.read_csv(self.retrieved_df_path)
+            # Defaults to the most recent retrieval run
+            self.run_id = run_id or self.retrieval_store.latest_run_id()
+            logger.info(f"Loading retrieval run {self.run_id} from store: {self.retrieval_store_dir}")
+            retrieved_df = self.retrieval_store.read_run(self.run_id)
             logger.info(f"Retrieved data loaded with {len(retrieved_df)} rows.")
 
-            # Extract the query text (assumed first row)
-            
-            self.query = retrieved_df['query'][retrieved_df.shape[0]-1]
+            self.query = retrieved_df['query'].iloc[0]
             logger.info(f"Extracted query for processing: '{self.query}'")
 
             # Extract context documents as a list of text chunks
-            self.context_chunks = retrieved_df[retrieved_df['query']==self.query]['document'].tolist()
+            self.context_chunks = retrieved_df['document'].tolist()
             logger.info(f"Loaded {len(self.context_chunks)} context chunks for answering.")
 
         except Exception as e:
-            logger.error("Failed to load retrieved data from CSV.")
+            logger.error("Failed to load retrieved data from the retrieval store.")
             raise CustomException("Failed to load retrieved data", e)
 
-    def generate_answer(self):
-        try:
-            # Combine all context chunks into one string separated by blank lines
-            total_context = "\n\n".join(self.context_chunks)
-            logger.info("Prepared prompt by combining question and context chunks.")
+    def format_prompt(self, query, total_context):
+        # Format prompt input for model consumption
+        return f"<|user|> Relevant information: {total_context} Provide answer to question with relevant information provided above: {query}<|end|> <|assistant|>"
+
+    @timed("generator.build_prompt")
+    def build_prompt(self, query, context_chunks):
+        # Chunks arrive best first; the packer merges overlapping ones and keeps the context within
+        # the token budget, leaving room for the template and the question
+        if self.packer is not None:
+            with self.model_lock:
+                reserved_tokens = len(self.tokenizer(self.format_prompt(query, ""))["input_ids"])
+                context_chunks = self.packer.pack(context_chunks, reserved_tokens=reserved_tokens)
+
+        # Combine all context chunks into one string separated by blank lines
+        total_context = "\n\n".join(context_chunks)
+        return self.format_prompt(query, total_context), total_context
 
-            # Format prompt input for model consumption
-            prompt = f"<|user|> Relevant information: {total_context} Provide answer to question with relevant information provided above: {self.query}<|end|> <|assistant|>"
+    def generation_kwargs(self):
+        return dict(
+            max_new_tokens=self.max_new_tokens,
+            do_sample=True,
+            temperature=0.75,
+            top_p=0.9,
+            eos_token_id=self.tokenizer.eos_token_id,
+            pad_token_id=self.tokenizer.pad_token_id or self.tokenizer.eos_token_id
+        )
 
-            # Tokenize prompt with padding and truncation
+    @timed("generator.tokenize_prompt")
+    def tokenize_prompt(self, prompt):
+        # Tokenize prompt with truncation only: the encoder runs over the prompt's own length,
+        # not over max_input_length positions of padding
+        with self.model_lock:
             inputs = self.tokenizer(
                 prompt,
                 return_tensors="pt",
-                max_length=2048,
+                max_length=self.max_input_length,
                 truncation=True,
-                padding="max_length"
+                padding="longest"
             )
-            logger.info("Tokenized prompt ready for model generation.")
+        logger.info("Tokenized prompt ready for model generation.")
+        return inputs
+
+    @timed("generator.generate_text")
+    def generate_text(self, prompt):
+        with self.model_lock:
+            inputs = self.tokenize_prompt(prompt)
 
             # Generate output tokens
-            outputs = self.model.generate(
-                **inputs,
-                max_new_tokens=512,
-                do_sample=True,
-                temperature=0.75,
-                top_p=0.9,
-                eos_token_id=self.tokenizer.eos_token_id,
-                pad_token_id=self.tokenizer.pad_token_id or self.tokenizer.eos_token_id
-            )
+            with span("generator.model_generate"):
+                outputs = self.model.generate(**inputs, **self.generation_kwargs())
+            increment("tokens_generated", len(outputs[0]))
             logger.info("Model generation completed. Decoding output tokens...")
 
             # Decode output tokens into human-readable string
-            self.answer = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
+            with span("generator.decode"):
+                return self.tokenizer.decode(outputs[0], skip_special_tokens=True)
+
+    def stream_text(self, prompt):
+        # Iterator of decoded text deltas while generate() runs on a background thread
+        return stream_generate(self.model, self.tokenizer, self.tokenize_prompt(prompt), self.generation_kwargs(), lock=self.model_lock)
+
+    def cache_settings(self):
+        # everything besides the question and chunks that changes the answer
+        settings = {k: v for k, v in self.generation_kwargs().items() if not k.endswith("token_id")}
+        packing = self.packer.token_budget if self.packer is not None else None
+        return {"model": self.llm_generator, "backend": self.generator_backend, "max_input_length": self.max_input_length, "context_token_budget": packing, **settings}
+
+    def set_query_embedder(self, embed_query):
+        # long-lived callers (RAG service) hand over the retriever's embedder and query cache
+        self.embed_query = embed_query
+
+    def encode_query(self, query):
+        # the generator's own embedding model, only loaded on a query cache miss
+        with self.embedding_lock:
+            if self.model_embedding is None:
+                self.model_embedding = load_embeddings(self.embedding_model, backend=self.embedding_backend)
+            return self.model_embedding.embed_query(query)
+
+    def query_vector(self, query):
+        if self.embed_query is None:
+            self.embed_query = self.encode_query
+            # the retriever embedded this question moments ago, so it is normally a cache hit
+            if self.query_cache_config.get("enabled", False):
+                query_cache = open_query_cache(
+                    QUERY_CACHE_DIR,
+                    embedding_model_key(self.embedding_model, self.embedding_backend),
+                    memory_size=self.query_cache_config["memory_size"],
+                    disk_size=self.query_cache_config["disk_size"],
+                    lowercase=embedding_tokenizer_lowercases(self.embedding_model)
+                )
+                self.embed_query = lambda text: query_cache.get_or_compute(text, self.encode_query)
+        return self.embed_query(query)
+
+    def cached_answer(self, query, context_chunks, generate):
+        # answer cache in front of generate(); a no-op when answer_cache is disabled
+        if self.answer_cache is None:
+            return generate()
+        chunk_ids = [content_hash(chunk) for chunk in context_chunks]
+        return self.answer_cache.get_or_generate(query, self.query_vector(query), chunk_ids, self.cache_settings(), generate)
+
+    def make_generation_batches(self, prompts):
+        # Sort prompts by token length and cut batches that never cross a length bucket,
+        # so each batch pads only up to its own longest member
+        with self.model_lock:
+            input_ids = self.tokenizer(prompts, max_length=self.max_input_length, truncation=True)["input_ids"]
+        lengths = np.array([len(ids) for ids in input_ids])
+        buckets = np.searchsorted(self.length_buckets, lengths)
+        order = np.lexsort((lengths, buckets))
+
+        batches = []
+        current = []
+        for position in order:
+            if current and (len(current) == self.batch_size or buckets[current[-1]] != buckets[position]):
+                batches.append(current)
+                current = []
+            current.append(position)
+        if current:
+            batches.append(current)
+        return input_ids, batches
+
+    def build_prompts(self, pairs):
+        # (prompts, packed contexts) of many (query, context_chunks) pairs
+        built = [self.build_prompt(query, context_chunks) for query, context_chunks in pairs]
+        return [prompt for prompt, _ in built], [context for _, context in built]
+
+    @timed("generator.generate_batch")
+    def generate_batch(self, pairs, prompts=None):
+        # Many (query, context_chunks) pairs -> answers in the same order, one generate() per batch
+        try:
+            if prompts is None:
+                prompts = self.build_prompts(pairs)[0]
+            input_ids, batches = self.make_generation_batches(prompts)
+            logger.info(f"Generating {len(prompts)} answers in {len(batches)} batches")
+
+            answers = [None] * len(prompts)
+            for batch in batches:
+                with self.model_lock:
+                    inputs = self.tokenizer.pad(
+                        {"input_ids": [input_ids[i] for i in batch]},
+                        padding="longest",
+                        return_tensors="pt"
+                    )
+                    with span("generator.model_generate"):
+                        outputs = self.model.generate(**inputs, **self.generation_kwargs())
+                    increment("tokens_generated", int((outputs != self.tokenizer.pad_token_id).sum()))
+                    with span("generator.decode"):
+                        decoded = self.tokenizer.batch_decode(outputs, skip_special_tokens=True)
+                for position, answer in zip(batch, decoded):
+                    answers[position] = answer
+            return answers
+
+        except Exception as e:
+            logger.error("Failed to generate a batch of answers")
+            raise CustomException("Error while generating a batch of answers", e)
+
+    def cached_batch(self, pairs, query_vectors=None, prompts=None):
+        # only the answer cache misses go through generate_batch; callers that already embedded
+        # the questions (the micro-batched service) or built the prompts pass them along
+        if self.answer_cache is None:
+            return self.generate_batch(pairs, prompts)
+
+        settings = self.cache_settings()
+        if query_vectors is None:
+            query_vectors = [self.query_vector(query) for query, _ in pairs]
+        lookups = [
+            (query_vector, [content_hash(chunk) for chunk in context_chunks])
+            for (_, context_chunks), query_vector in zip(pairs, query_vectors)
+        ]
+        answers = [
+            self.answer_cache.lookup(query, query_vector, chunk_ids, settings)
+            for (query, _), (query_vector, chunk_ids) in zip(pairs, lookups)
+        ]
+        missing = [i for i, answer in enumerate(answers) if answer is None]
+        logger.info(f"Answer cache: {len(pairs) - len(missing)} of {len(pairs)} answers cached")
 
-            # Print the final question and generated answer
+        if missing:
+            start = time.perf_counter()
+            generated = self.generate_batch([pairs[i] for i in missing], [prompts[i] for i in missing] if prompts is not None else None)
+            seconds_per_answer = (time.perf_counter() - start) / len(missing)
+            for i, answer in zip(missing, generated):
+                query_vector, chunk_ids = lookups[i]
+                self.answer_cache.put(pairs[i][0], query_vector, chunk_ids, settings, answer, seconds_per_answer)
+                answers[i] = answer
+        return answers
+
+    def stream_answer(self, query, context_chunks):
+        # Streaming counterpart of answer_question: a cached answer arrives as a single delta
+        prompt, _ = self.build_prompt(query, context_chunks)
+        if self.answer_cache is None:
+            yield from self.stream_text(prompt)
+            return
+
+        query_vector = self.query_vector(query)
+        chunk_ids = [content_hash(chunk) for chunk in context_chunks]
+        settings = self.cache_settings()
+        answer = self.answer_cache.lookup(query, query_vector, chunk_ids, settings)
+        if answer is not None:
+            yield answer
+            return
+
+        start = time.perf_counter()
+        parts = []
+        for delta in self.stream_text(prompt):
+            parts.append(delta)
+            yield delta
+        self.answer_cache.put(query, query_vector, chunk_ids, settings, "".join(parts), time.perf_counter() - start)
+
+    @timed("generator.answer_question")
+    def answer_question(self, query, context_chunks):
+        # Stateless question -> answer, callable from several threads at once; their tokenizer and
+        # model calls take turns on model_lock
+        prompt, _ = self.build_prompt(query, context_chunks)
+        return self.cached_answer(query, context_chunks, lambda: self.generate_text(prompt))
+
+    @timed("generator.generate_answer")
+    def generate_answer(self):
+        try:
+            prompt, total_context = self.build_prompt(self.query, self.context_chunks)
+            logger.info("Prepared prompt by combining question and context chunks.")
+
+            timer = StreamTimer()
+            if self.stream:
+                deltas = self.stream_answer(self.query, self.context_chunks)
+            else:
+                deltas = iter([self.cached_answer(self.query, self.context_chunks, lambda: self.generate_text(prompt))])
+
+            # Print the question, then the answer as it is generated
             print(f'Question: {self.query}\n')
-            print(f'Answer: {self.answer}\n')
+            print('Answer: ', end='', flush=True)
+            parts = []
+            for delta in timer.wrap(deltas):
+                parts.append(delta)
+                print(delta, end='', flush=True)
+            print('\n')
+            self.answer = "".join(parts)
+            self.timing = timer.as_dict()
+            logger.info(f"Answer timing: time to first token {self.timing['ttft_ms']} ms, total {self.timing['total_ms']} ms")
 
             # Prepare new data row
             new_data = {
+                "run_id": self.run_id,
                 "query": self.query,
                 "context": total_context,
-                "answer": self.answer
+                "answer": self.answer,
+                **self.timing
             }
 
-            # Ensure output directory exists
-            os.makedirs(os.path.dirname(self.generator_df_path), exist_ok=True)
-            new_row = pd.DataFrame([new_data])
-
-            # Append if file exists, else create
-            if os.path.exists(self.generator_df_path):
-                try:
-                    existing_df = pd.read_csv(self.generator_df_path)
-                    if set(existing_df.columns) == set(new_row.columns):
-                        updated_df = pd.concat([existing_df, new_row], ignore_index=True)
-                    else:
-                        logger.warning("⚠️ Column mismatch detected. Overwriting existing file.")
-                        updated_df = new_row
-                except Exception as e:
-                    logger.warning(f"⚠️ Failed to read existing file. Overwriting. Reason: {e}")
-                    updated_df = new_row
-            else:
-                updated_df = new_row
-
-            # Save to CSV
-            updated_df.to_csv(self.generator_df_path, index=False)
-            logger.info(f"Saved generated output to: {self.generator_df_path}")
+            # O(1) append of one segment, keyed by the retrieval run it answers
+            self.generator_store.append(pd.DataFrame([new_data]))
+            logger.info(f"Saved generated output to: {self.generator_store_dir}")
             logger.info("Answer generated and output successfully.")
 
         except Exception as e:
             logger.error("An error occurred during answer generation.")
             raise CustomException("Failed to generate answer from context", e)
 
+    def pending_run_ids(self):
+        # retrieval runs that do not have a generated answer yet
+        return [run_id for run_id in self.retrieval_store.run_ids() if run_id not in self.generator_store.runs]
 
-    def run(self):
+    @timed("generator.generate_batch_answers")
+    def generate_batch_answers(self, run_ids):
+        try:
+            runs = [self.retrieval_store.read_run(run_id) for run_id in run_ids]
+            pairs = [(run_df['query'].iloc[0], run_df['document'].tolist()) for run_df in runs]
+            prompts, contexts = self.build_prompts(pairs)
+            answers = self.cached_batch(pairs, prompts=prompts)
+
+            # every answer goes out in one segment, each keyed by the retrieval run it answers; same
+            # columns as generate_answer, batched answers have no per answer timings
+            self.generator_store.append(pd.DataFrame({
+                "run_id": run_ids,
+                "query": [query for query, _ in pairs],
+                "context": contexts,
+                "answer": answers,
+                "ttft_ms": np.nan,
+                "total_ms": np.nan
+            }))
+            logger.info(f"Saved {len(answers)} generated answers to: {self.generator_store_dir}")
+
+        except Exception as e:
+            logger.error("An error occurred during batch answer generation.")
+            raise CustomException("Failed to generate batch answers", e)
+
+    def run(self, run_id=None):
         try:
             logger.info("Starting full data generation workflow...")
-            self.load_retrieval()
+            self.load_retrieval(run_id)
             self.generate_answer()
+            if self.answer_cache is not None:
+                logger.info(f"Answer cache stats: {self.answer_cache.stats()}")
             logger.info("Data generation workflow completed successfully.")
 
         except CustomException as e:
@@ -137,7 +389,25 @@ class DataGenerator:
         finally:
             logger.info("Data generation process finished (success or failure).")
 
+    def run_batch(self, run_ids=None):
+        try:
+            logger.info("Starting batch data generation workflow...")
+            run_ids = run_ids or self.pending_run_ids()
+            if run_ids:
+                self.generate_batch_answers(run_ids)
+                if self.answer_cache is not None:
+                    logger.info(f"Answer cache stats: {self.answer_cache.stats()}")
+            else:
+                logger.info("No retrieval runs waiting for an answer.")
+            logger.info("Batch data generation workflow completed successfully.")
+
+        except CustomException as e:
+            logger.error(f"CustomException caught during batch data generation: {str(e)}")
+
+        finally:
+            logger.info("Batch data generation process finished (success or failure).")
+
 
 if __name__ == "__main__":
-    data_generator = DataGenerator(read_yaml(CONFIG_PATH), RETRIEVED_DF_PATH, GENERATOR_DIR, GENERATOR_DF_PATH)
+    data_generator = DataGenerator(read_yaml(CONFIG_PATH), RETRIEVAL_STORE_DIR, GENERATOR_DIR, GENERATOR_STORE_DIR)
     data_generator.run()
@@ -1,13 +1,12 @@
-import requests
-from bs4 import BeautifulSoup
-import re
 import os
+import json
 from src.logger import get_logger
 from src.custom_exception import CustomException
 from config.paths_config import *
 from utils.common_functions import read_yaml
-from utils.helpers import fetch_and_clean
 from utils.helpers import clean_text_nltk
+from utils.helpers import source_file_name
+from src.metrics import configure_metrics, timed, increment
 
 logger = get_logger(__name__)
 
@@ -17,26 +16,61 @@ class DataIngestion:
         self.urls = self.config['urls']
         self.bucket_name = self.config['bucket_name']
         self.file_name = self.config['content_file_name']
+        self.refresh = self.config.get('refresh', False)
+        configure_metrics(config)
 
         os.makedirs(RAW_DIR,exist_ok =True)
 
         logger.info("Data Ingestion Started")
 
+    @timed("ingestion.download_data_from_urls")
     def download_data_from_urls(self):
         try:
-            if os.path.isfile(os.path.join(RAW_DIR,self.file_name)):
-                logger.info("Content file already exists")
-            else:
-                logger.info("Content file Doesn't exists")
-                with open(os.path.join(RAW_DIR,self.file_name),'w', encoding='utf-8') as file:
-                    for url in self.urls:
-
-                        clean_article_text = fetch_and_clean(url)
-                        if len(clean_article_text) >100:
-                            print("Processing article" + '----' +url)
-
-                        clean_article_text = clean_text_nltk(clean_article_text)
-                        file.write(clean_article_text + '\n')
+            os.makedirs(SOURCES_DIR, exist_ok=True)
+            sources = []
+
+            # Each URL gets its own source file, so a new URL in config.yaml is fetched
+            # even when the other articles are already on disk.
+            source_files = {url: os.path.join(SOURCES_DIR, source_file_name(url)) for url in self.urls}
+            to_fetch = [url for url in self.urls if self.refresh or not os.path.isfile(source_files[url])]
+            logger.info(f"{len(self.urls) - len(to_fetch)} sources already downloaded, fetching {len(to_fetch)}")
+
+            results = {}
+            if to_fetch:
+                # requests is only imported when something has to be downloaded
+                from src.url_fetcher import ConcurrentFetcher
+                fetcher = ConcurrentFetcher(self.config, HTTP_CACHE_PATH)
+                results = fetcher.fetch_all(to_fetch, has_local_copy=lambda url: os.path.isfile(source_files[url]))
+                increment("pages_fetched", sum(status == "fetched" for status, _ in results.values()))
+                print(f"Fetched {len(to_fetch)} urls at {fetcher.stats['pages_per_sec']} pages/sec, "
+                      f"{fetcher.stats['not_modified']} not modified, {fetcher.stats['bytes_saved']} bytes saved by the HTTP cache")
+
+            for url in self.urls:
+                source_file = source_files[url]
+                status, clean_article_text = results.get(url, ("cached", None))
+
+                if status == "fetched":
+                    if len(clean_article_text) >100:
+                        print("Processing article" + '----' +url)
+
+                    clean_article_text = clean_text_nltk(clean_article_text)
+                    with open(source_file, 'w', encoding='utf-8') as file:
+                        file.write(clean_article_text)
+                elif not os.path.isfile(source_file):
+                    logger.warning(f"No content fetched from {url}, skipping it")
+                    continue
+
+                sources.append({"url": url, "file": source_file})
+
+            # sources.json lists the current sources in config order; anything missing from it was removed
+            with open(SOURCES_INDEX_PATH, 'w', encoding='utf-8') as file:
+                json.dump(sources, file, indent=2)
+
+            # content file keeps one article per line for the full (non incremental) processing path
+            with open(os.path.join(RAW_DIR,self.file_name),'w', encoding='utf-8') as file:
+                for source in sources:
+                    with open(source["file"], 'r', encoding='utf-8') as source_file:
+                        file.write(source_file.read() + '\n')
 
             logger.info("Data from Urls is written into content file")
 
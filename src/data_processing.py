@@ -1,20 +1,43 @@
 import os
+import json
+import faiss
 import pandas as pd
 from src.logger import get_logger
 from src.custom_exception import CustomException
 from config.paths_config import *
 from utils.common_functions import read_yaml
-from langchain_huggingface  import HuggingFaceEmbeddings
+from utils.helpers import content_hash, source_file_name
 from langchain_community.vectorstores import FAISS
+from src.retrieval_engine import vector_db_kwargs
+from src.embedding_engine import EmbeddingEngine
+from src.model_loader import load_embeddings, inference_backends
+from src.metrics import configure_metrics, timed
+from src.chunk_dedup import ChunkDeduplicator
+from src.ann_index import build_ann_index, save_ann_index, remove_ann_index, ann_index_current, min_training_vectors
+from src.mmap_store import export_vector_db, read_store_meta, vector_db_stamp
+from src.lexical_index import build_lexical_index, read_lexical_meta
+from src.sharded_index import export_sharded_index, read_shards_meta
 
 logger = get_logger(__name__)
 
 class DataProcessor:
     def __init__(self,config,input_file,output_dir,chunks_df_path,vectordb_path):
         self.embedding_model = config["embedding_model"]
+        self.embedding_backend = inference_backends(config)[0]
         self.config = config["data_processing"]
         self.chunk_size = self.config["chunk_size"]
         self.overlap_chunk_size = self.config['overlap_chunk_size']
+        self.normalize_embeddings = self.config.get('normalize_embeddings', False)
+        self.incremental = self.config.get('incremental', False)
+        self.streaming = self.config.get('streaming', False)
+        self.stream_batch_size = self.config.get('stream_batch_size', 1024)
+        self.dedup_config = self.config.get('dedup', {})
+        self.read_block_size = self.config.get('read_block_size', 1048576)
+        self.index_config = config.get('vector_index', {"type": "flat"})
+        self.mmap_config = config.get('mmap_store', {})
+        self.lexical_config = config.get('lexical_index', {})
+        self.shard_config = config.get('sharded_index', {})
+        configure_metrics(config)
         
         self.input_file = input_file
         self.output_dir = output_dir
@@ -24,12 +47,16 @@ class DataProcessor:
         self.content_data = None
         self.chunked_data = None 
         self.model_embedding = None
+        self.embedding_engine = None
         self.vector_db =  None
+        self.manifest = None
+        self.index_changed = False
 
         os.makedirs(self.output_dir,exist_ok =True)
 
         logger.info("Data Processing Started")
 
+    @timed("processing.load_data")
     def load_data(self):
         try:
             with open(self.input_file,'r',encoding='utf-8') as file:
@@ -41,12 +68,28 @@ class DataProcessor:
             logger.error("Error while loading data for data procesing from input file")
             raise CustomException("failed to load data for data procesing from input file", e)
 
+    def chunk_text(self, text):
+        CHUNK_SIZE = self.chunk_size
+        return [text[i:i+CHUNK_SIZE] for i in range(0,len(text), CHUNK_SIZE-self.overlap_chunk_size)]
+
+    @timed("processing.load_embedding_model")
+    def load_embedding_model(self):
+        if self.model_embedding is None:
+            logger.info("starting the Loading of the Embedding Model")
+            self.model_embedding = load_embeddings(
+                self.embedding_model,
+                backend=self.embedding_backend,
+                encode_kwargs = {"batch_size": self.config.get("embedding_batch_size", 64)}
+            )
+            self.embedding_engine = EmbeddingEngine(self.model_embedding, self.embedding_model, self.config, backend=self.embedding_backend)
+            logger.info("Successful in Loading the Embedding Model")
+
+    @timed("processing.chunking_data")
     def chunking_data(self):
         try:
             logger.info("Chunking the data based on the chunk size with overlapping chunks")
 
-            CHUNK_SIZE = self.chunk_size
-            self.chunked_data = [self.content_data[i:i+CHUNK_SIZE] for i in range(0,len(self.content_data), CHUNK_SIZE-self.overlap_chunk_size)]
+            self.chunked_data = self.chunk_text(self.content_data)
             
             # Convert to DataFrame
             df_chunks = pd.DataFrame(self.chunked_data , columns=["chunks_text"])
@@ -59,18 +102,40 @@ class DataProcessor:
             logger.error(f"Error while Chunking data during data procesing from input file: {e}")
             raise CustomException("failed to chunk data during data procesing from input file", e)
 
+    def make_deduplicator(self):
+        if not self.dedup_config.get("enabled", False):
+            return None
+        return ChunkDeduplicator(self.dedup_config)
+
+    @timed("processing.deduplicate_chunks")
+    def deduplicate_chunks(self):
+        try:
+            deduplicator = self.make_deduplicator()
+            if deduplicator is None:
+                return
+
+            # mapping keys are row numbers in chunks.csv, which keeps every chunk
+            kept = deduplicator.filter(self.chunked_data, list(range(len(self.chunked_data))))
+            self.chunked_data = [self.chunked_data[i] for i in kept]
+            deduplicator.save_mapping(DEDUP_MAP_PATH)
+
+        except Exception as e:
+            logger.error(f"Error while deduplicating chunks: {e}")
+            raise CustomException("failed to deduplicate chunks", e)
+
+    @timed("processing.chunk_to_embedding_model")
     def chunk_to_embedding_model(self):
         try:
-            logger.info("starting the Loading of the Embedding Model")
             chunked_texts = [t.replace('\n'," ") for t in self.chunked_data]
-            # print(len(texts[0]),len(texts[1]),len(texts[2]),len(texts[3]))
-            # print(texts[0])
-            self.model_embedding = HuggingFaceEmbeddings(model_name = self.embedding_model)
-            logger.info("Successful in Loading the Embedding Model")
-            # embeddings = self.embedding_model.embed_documents(texts)
+            if not chunked_texts:
+                raise ValueError("input file produced no chunks")
+            self.load_embedding_model()
+
+            embeddings = self.embedding_engine.embed(chunked_texts)
 
             logger.info("Started Loading the embeddings into Faiss vector DB")
-            self.vector_db = FAISS.from_texts(chunked_texts, self.model_embedding)
+            # normalized vectors in an inner product index let retrieval use the index's own k-NN search
+            self.vector_db = FAISS.from_embeddings(zip(chunked_texts, embeddings), self.model_embedding, **vector_db_kwargs(self.normalize_embeddings))
             logger.info("Successful in Loading the embeddings into Faiss vector DB")
 
             logger.info("DONE with converting chunks into Embeddings")
@@ -78,6 +143,79 @@ class DataProcessor:
             logger.error(f"Error while Converting chunks into Embeddings: {e}")
             raise CustomException("failed to  Convert chunks into Embeddings", e)
         
+    def iter_chunks(self):
+        # Same chunks as chunk_text over the whole file, but only one read block
+        # plus one partial chunk is held in memory at a time.
+        CHUNK_SIZE = self.chunk_size
+        step = CHUNK_SIZE - self.overlap_chunk_size
+        buffer = ""
+        with open(self.input_file,'r',encoding='utf-8') as file:
+            while True:
+                block = file.read(self.read_block_size)
+                buffer += block
+                pos = 0
+                if block:
+                    # only emit windows that are complete; the tail waits for the next block
+                    while len(buffer) - pos >= CHUNK_SIZE:
+                        yield buffer[pos:pos+CHUNK_SIZE]
+                        pos += step
+                    buffer = buffer[pos:]
+                else:
+                    while pos < len(buffer):
+                        yield buffer[pos:pos+CHUNK_SIZE]
+                        pos += step
+                    return
+
+    def iter_batches(self):
+        batch = []
+        for chunk in self.iter_chunks():
+            batch.append(chunk)
+            if len(batch) == self.stream_batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    @timed("processing.stream_chunks_to_vector_db")
+    def stream_chunks_to_vector_db(self):
+        try:
+            logger.info(f"Streaming chunks from input file in batches of {self.stream_batch_size}")
+            self.load_embedding_model()
+            deduplicator = self.make_deduplicator()
+            self.vector_db = None
+            total_chunks = 0
+
+            pd.DataFrame(columns=["chunks_text"]).to_csv(self.chunks_df_path, index = False)
+            for batch in self.iter_batches():
+                # chunk store and index both grow one batch at a time
+                pd.DataFrame(batch, columns=["chunks_text"]).to_csv(self.chunks_df_path, mode='a', header=False, index = False)
+
+                first_chunk = total_chunks
+                total_chunks += len(batch)
+                if deduplicator is not None:
+                    batch = [batch[i] for i in deduplicator.filter(batch, list(range(first_chunk, total_chunks)))]
+                    if not batch:
+                        continue
+
+                texts = [t.replace('\n'," ") for t in batch]
+                text_embeddings = zip(texts, self.embedding_engine.embed(texts))
+                if self.vector_db is None:
+                    self.vector_db = FAISS.from_embeddings(text_embeddings, self.model_embedding, **vector_db_kwargs(self.normalize_embeddings))
+                else:
+                    self.vector_db.add_embeddings(text_embeddings)
+                logger.info(f"Processed {total_chunks} chunks so far, {self.vector_db.index.ntotal} indexed")
+
+            if self.vector_db is None:
+                raise ValueError("input file produced no chunks")
+            if deduplicator is not None:
+                deduplicator.save_mapping(DEDUP_MAP_PATH)
+            logger.info(f"DONE streaming {total_chunks} chunks into the Faiss vector DB")
+
+        except Exception as e:
+            logger.error(f"Error while streaming chunks into Embeddings: {e}")
+            raise CustomException("failed to stream chunks into Embeddings", e)
+
+    @timed("processing.save_vector_db")
     def save_vector_db(self):
         try:
             logger.info("start Saving the VectorDb file to Disk")
@@ -88,19 +226,327 @@ class DataProcessor:
             raise CustomException("failed to Save the vectorDb file to Disk", e)
 
 
+    @timed("processing.update_ann_index")
+    def update_ann_index(self):
+        try:
+            index_type = self.index_config.get("type", "flat")
+            if index_type == "flat":
+                remove_ann_index(self.vectordb_path)
+                return
+            if not self.normalize_embeddings:
+                logger.warning(f"vector_index type {index_type} needs normalize_embeddings, keeping exact search")
+                remove_ann_index(self.vectordb_path)
+                return
+
+            # an incremental run without changes did not load the vector DB, the flat index is enough
+            flat_index = self.vector_db.index if self.vector_db is not None else faiss.read_index(os.path.join(self.vectordb_path, "index.faiss"))
+            if self.vector_db is None and ann_index_current(self.vectordb_path, self.index_config, flat_index.ntotal):
+                logger.info(f"{index_type} index is up to date")
+                return
+            if flat_index.ntotal < min_training_vectors(self.index_config):
+                logger.warning(f"{index_type} needs at least {min_training_vectors(self.index_config)} chunks to train, keeping exact search")
+                remove_ann_index(self.vectordb_path)
+                return
+
+            # trained on and filled with the exact vectors, in the same positions as the flat index
+            logger.info(f"Building the {index_type} index from {flat_index.ntotal} vectors")
+            index = build_ann_index(flat_index.reconstruct_n(0, flat_index.ntotal), self.index_config, flat_index.metric_type)
+            save_ann_index(index, self.vectordb_path, self.index_config)
+            logger.info(f"Saved the {index_type} index to {self.vectordb_path}")
+
+        except Exception as e:
+            logger.error(f"Error while building the approximate nearest neighbour index: {e}")
+            raise CustomException("failed to build the approximate nearest neighbour index", e)
+
+    @timed("processing.update_mmap_store")
+    def update_mmap_store(self):
+        try:
+            if not self.mmap_config.get("enabled", False):
+                return
+            stamp = vector_db_stamp(self.vectordb_path)
+            meta = read_store_meta(MMAP_STORE_DIR)
+            if meta is not None and meta["stamp"] == stamp:
+                logger.info("Memory-mapped store is up to date")
+                return
+
+            # first export of a vector DB that this run did not touch
+            self.load_saved_vector_db()
+            export_vector_db(self.vector_db, MMAP_STORE_DIR, stamp=stamp)
+
+        except Exception as e:
+            logger.error(f"Error while exporting the memory-mapped store: {e}")
+            raise CustomException("failed to export the memory-mapped store", e)
+
+    @timed("processing.update_sharded_index")
+    def update_sharded_index(self):
+        try:
+            if not self.shard_config.get("enabled", False):
+                return
+            # shards get the configured index type too, exact search on un-normalized vectors as for ann.faiss
+            index_config = self.index_config if self.normalize_embeddings else {"type": "flat"}
+            num_shards = self.shard_config.get("num_shards", 4)
+            stamp = vector_db_stamp(self.vectordb_path)
+            meta = read_shards_meta(SHARDED_INDEX_DIR)
+            if (meta is not None and meta["stamp"] == stamp and meta["index_config"] == index_config
+                    and meta["num_shards"] == min(num_shards, meta["ntotal"])):
+                logger.info("Sharded index is up to date")
+                return
+
+            self.load_saved_vector_db()
+            export_sharded_index(
+                self.vector_db,
+                SHARDED_INDEX_DIR,
+                num_shards,
+                index_config=index_config,
+                build_workers=self.shard_config.get("build_workers", 4),
+                stamp=stamp
+            )
+
+        except Exception as e:
+            logger.error(f"Error while building the sharded index: {e}")
+            raise CustomException("failed to build the sharded index", e)
+
+    def load_saved_vector_db(self):
+        # an incremental run without changes never loaded the vector DB
+        if self.vector_db is None:
+            self.load_embedding_model()
+            self.vector_db = FAISS.load_local(
+                self.vectordb_path,
+                self.model_embedding,
+                allow_dangerous_deserialization=True,
+                **vector_db_kwargs(self.normalize_embeddings)
+            )
+
+    @timed("processing.update_lexical_index")
+    def update_lexical_index(self):
+        try:
+            if not self.lexical_config.get("enabled", False):
+                return
+            stamp = vector_db_stamp(self.vectordb_path)
+            meta = read_lexical_meta(LEXICAL_INDEX_DIR)
+            if meta is not None and meta["stamp"] == stamp:
+                logger.info("Lexical index is up to date")
+                return
+
+            # texts in index position order, so lexical and dense results name the same chunks
+            self.load_saved_vector_db()
+            texts = [
+                self.vector_db.docstore.search(self.vector_db.index_to_docstore_id[i]).page_content
+                for i in range(self.vector_db.index.ntotal)
+            ]
+            build_lexical_index(
+                texts,
+                LEXICAL_INDEX_DIR,
+                k1=self.lexical_config.get("k1", 1.2),
+                b=self.lexical_config.get("b", 0.75),
+                stamp=stamp
+            )
+
+        except Exception as e:
+            logger.error(f"Error while building the lexical index: {e}")
+            raise CustomException("failed to build the lexical index", e)
+
+    def index_settings(self):
+        # any change here invalidates every chunk id in the manifest
+        settings = {
+            "embedding_model": self.embedding_model,
+            "chunk_size": self.chunk_size,
+            "overlap_chunk_size": self.overlap_chunk_size,
+            "normalize_embeddings": self.normalize_embeddings,
+            "dedup": self.dedup_config if self.dedup_config.get("enabled", False) else None
+        }
+        # only recorded off the default backend, so manifests written before it existed stay valid
+        if self.embedding_backend != "torch":
+            settings["embedding_backend"] = self.embedding_backend
+        return settings
+
+    def load_manifest(self):
+        if not os.path.exists(INDEX_MANIFEST_PATH):
+            return None
+        with open(INDEX_MANIFEST_PATH, 'r', encoding='utf-8') as file:
+            return json.load(file)
+
+    def source_chunks(self, url, text, digest):
+        # chunk ids carry the content hash, so a changed source never reuses old ids
+        chunks = [t.replace('\n'," ") for t in self.chunk_text(text)]
+        prefix = f"{source_file_name(url)[:-4]}-{digest[:12]}"
+        return chunks, [f"{prefix}-{i}" for i in range(len(chunks))]
+
+    def dedup_source(self, deduplicator, digest, chunks, ids):
+        # kept chunks and ids of one source, and its manifest entry with the duplicates it dropped
+        dropped = {}
+        if deduplicator is not None:
+            first_mapping = len(deduplicator.mapping)
+            kept = deduplicator.filter(chunks, ids)
+            dropped = {d: [k, kind, similarity] for d, k, kind, similarity in deduplicator.mapping[first_mapping:]}
+            chunks = [chunks[i] for i in kept]
+            ids = [ids[i] for i in kept]
+        return chunks, ids, {"hash": digest, "chunk_ids": ids, "dropped": dropped}
+
+    @timed("processing.seed_deduplicator")
+    def seed_deduplicator(self, deduplicator, sources, current):
+        # the kept chunks of unchanged sources go into the deduplicator first, so new chunks are
+        # deduped against the whole index as in a full rebuild. Unlike a rebuild, an already indexed
+        # chunk always wins over a new copy of it, even when the new source comes first in sources.json
+        for source in sources:
+            entry = current.get(source["url"])
+            if entry is None or not entry["chunk_ids"]:
+                continue
+            with open(source["file"], 'r', encoding='utf-8') as file:
+                chunks, ids = self.source_chunks(source["url"], file.read(), entry["hash"])
+            kept_ids = set(entry["chunk_ids"])
+            kept = [i for i, chunk_id in enumerate(ids) if chunk_id in kept_ids]
+            deduplicator.seed([chunks[i] for i in kept], [ids[i] for i in kept])
+
+    @timed("processing.incremental_index")
+    def incremental_index(self):
+        try:
+            logger.info("Starting incremental indexing from per source files")
+            with open(SOURCES_INDEX_PATH, 'r', encoding='utf-8') as file:
+                sources = json.load(file)
+
+            manifest = self.load_manifest()
+            rebuild = (
+                manifest is None
+                or manifest["settings"] != self.index_settings()
+                or not os.path.exists(os.path.join(self.vectordb_path, "index.faiss"))
+            )
+            if rebuild:
+                logger.info("No usable manifest for the current settings, rebuilding the whole index")
+            previous = {} if rebuild else manifest["sources"]
+
+            digests = {}
+            for source in sources:
+                with open(source["file"], 'r', encoding='utf-8') as file:
+                    digests[source["url"]] = content_hash(file.read())
+
+            # new, changed and deleted sources
+            stale_sources = {url for url in previous if previous[url]["hash"] != digests.get(url)}
+            stale_sources |= {url for url in digests if url not in previous}
+
+            # a source whose dropped duplicates point at chunks that are going away has to be redone as well
+            while True:
+                stale_ids = [chunk_id for url in stale_sources if url in previous for chunk_id in previous[url]["chunk_ids"]]
+                removed = set(stale_ids)
+                dependents = {
+                    url for url, entry in previous.items()
+                    if url not in stale_sources and any(kept in removed for kept, _, _ in entry.get("dropped", {}).values())
+                }
+                if not dependents:
+                    break
+                stale_sources |= dependents
+
+            # Only new or changed sources are chunked and embedded
+            current = {url: previous[url] for url in digests if url not in stale_sources}
+            deduplicator = self.make_deduplicator()
+            if deduplicator is not None and stale_sources:
+                self.seed_deduplicator(deduplicator, sources, current)
+            new_texts, new_ids, new_metadatas = [], [], []
+            for source in sources:
+                url = source["url"]
+                if url not in stale_sources:
+                    continue
+                with open(source["file"], 'r', encoding='utf-8') as file:
+                    text = file.read()
+                chunks, ids = self.source_chunks(url, text, digests[url])
+                chunks, ids, current[url] = self.dedup_source(deduplicator, digests[url], chunks, ids)
+
+                new_texts.extend(chunks)
+                new_ids.extend(ids)
+                new_metadatas.extend({"source": url} for _ in chunks)
+
+            if deduplicator is not None:
+                # the mapping file covers every source, not only the ones redone in this run
+                deduplicator.mapping = [
+                    (dropped_id, kept, kind, similarity)
+                    for entry in current.values()
+                    for dropped_id, (kept, kind, similarity) in entry.get("dropped", {}).items()
+                ]
+                deduplicator.save_mapping(DEDUP_MAP_PATH)
+
+            logger.info(f"Incremental indexing: {len(new_texts)} chunks to embed, {len(stale_ids)} chunks to remove")
+
+            self.manifest = {"settings": self.index_settings(), "sources": current}
+            self.index_changed = rebuild or bool(new_texts) or bool(stale_ids)
+            if not self.index_changed:
+                # a new source whose chunks were all duplicates still has to be recorded
+                if self.manifest != manifest:
+                    self.save_manifest()
+                logger.info("Vector DB is already up to date")
+                return
+
+            # every source removed, or all of their chunks deduped away: an empty index can not be built,
+            # the saved vector DB and manifest stay as they are
+            if not any(entry["chunk_ids"] for entry in current.values()):
+                raise ValueError("no source produced any chunks, nothing to index; check sources.json and the dedup settings")
+
+            self.load_embedding_model()
+            new_embeddings = self.embedding_engine.embed(new_texts) if new_texts else []
+            if rebuild:
+                self.vector_db = FAISS.from_embeddings(zip(new_texts, new_embeddings), self.model_embedding, metadatas=new_metadatas, ids=new_ids, **vector_db_kwargs(self.normalize_embeddings))
+            else:
+                self.vector_db = FAISS.load_local(
+                    self.vectordb_path,
+                    self.model_embedding,
+                    allow_dangerous_deserialization=True,
+                    **vector_db_kwargs(self.normalize_embeddings)
+                )
+                if stale_ids:
+                    self.vector_db.delete(stale_ids)
+                if new_texts:
+                    self.vector_db.add_embeddings(zip(new_texts, new_embeddings), metadatas=new_metadatas, ids=new_ids)
+
+            logger.info(f"Incremental indexing done, vector DB holds {self.vector_db.index.ntotal} chunks")
+
+        except Exception as e:
+            logger.error(f"Error while incrementally indexing the sources: {e}")
+            raise CustomException("failed to incrementally index the sources", e)
+
+    def save_manifest(self):
+        try:
+            with open(INDEX_MANIFEST_PATH, 'w', encoding='utf-8') as file:
+                json.dump(self.manifest, file)
+            logger.info("Saved the index manifest")
+        except Exception as e:
+            logger.error(f"Error while saving the index manifest: {e}")
+            raise CustomException("failed to save the index manifest", e)
+
+    @timed("processing.run")
     def run(self):
         try:
             logger.info("starting Data Processing Process")
-            self.load_data()
-            self.chunking_data()
-            self.chunk_to_embedding_model()
-            self.save_vector_db()
+            if self.incremental:
+                self.incremental_index()
+                if self.index_changed:
+                    self.save_vector_db()
+                    self.save_manifest()
+            else:
+                if self.streaming:
+                    self.stream_chunks_to_vector_db()
+                else:
+                    self.load_data()
+                    self.chunking_data()
+                    self.deduplicate_chunks()
+                    self.chunk_to_embedding_model()
+                self.save_vector_db()
+
+                # a full rebuild does not keep per source chunk ids, so the manifest is stale now
+                if os.path.exists(INDEX_MANIFEST_PATH):
+                    os.remove(INDEX_MANIFEST_PATH)
+            self.update_ann_index()
+            self.update_mmap_store()
+            self.update_sharded_index()
+            self.update_lexical_index()
+            if self.embedding_engine is not None:
+                logger.info(f"Embedding throughput: {self.embedding_engine.throughput()}")
             logger.info("Data Processing Completed.......")
 
         except CustomException as e:
             logger.error(f"CustomException : {str(e)}")
         
         finally:
+            if self.embedding_engine is not None:
+                self.embedding_engine.close()
             logger.info("Data Processing DONE...")
 
 if __name__ == "__main__":
@@ -1,31 +1,65 @@
 import os
+import threading
 import numpy as np
 import pandas as pd
 from src.logger import get_logger
 from src.custom_exception import CustomException
 from config.paths_config import *
 from utils.common_functions import read_yaml
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
-from sklearn.metrics.pairwise import cosine_similarity
+from src.retrieval_engine import RetrievalEngine, vector_db_kwargs, reciprocal_rank_fusion
+from src.embedding_cache import open_query_cache
+from src.model_loader import load_embeddings, inference_backends, embedding_model_key, embedding_lowercases
+from src.artifact_store import open_store, new_run_id
+from src.ann_index import use_ann_index
+from src.mmap_store import MmapVectorStore, read_store_meta, vector_db_stamp
+from src.sharded_index import ShardedVectorStore
+from src.lexical_index import LexicalIndex
+from src.metrics import configure_metrics, timed, increment, set_gauge
 
 logger = get_logger(__name__)
 
 class DataRetriever:
-    def __init__(self, config, vectordb_path, retrieved_df_path, output_dir):
+    def __init__(self, config, vectordb_path, retrieval_store_dir, output_dir):
         # Load config parameters relevant to data retrieval
         self.embedding_model = config["embedding_model"]
+        self.embedding_backend = inference_backends(config)[0]
         self.config = config["data_retriever"]
         self.top_k = self.config["top_k"]
+        self.batch_size = self.config.get("batch_size", 64)
+        self.nprobe = self.config.get("nprobe")
+        self.ef_search = self.config.get("ef_search")
+        self.retrieval_mode = self.config.get("retrieval_mode", "dense")
+        self.hybrid_candidates = self.config.get("hybrid_candidates", 50)
+        self.rrf_k = self.config.get("rrf_k", 60)
+        self.lexical_config = config.get("lexical_index", {})
+        configure_metrics(config)
+        self.index_config = config.get("vector_index", {"type": "flat"})
+        self.mmap_store = config.get("mmap_store", {}).get("enabled", False)
+        self.shard_config = config.get("sharded_index", {})
+        self.sharded = self.shard_config.get("enabled", False)
+        self.cache_config = config.get("query_cache", {})
+        self.normalize_embeddings = config["data_processing"].get("normalize_embeddings", False)
         self.output_dir = output_dir
 
         self.vectordb_path = vectordb_path
-        self.retrieved_df_path = retrieved_df_path
+        self.retrieval_store_dir = retrieval_store_dir
+        self.retrieval_store = open_store(retrieval_store_dir, config)
 
         self.question = None
+        self.run_id = None
+        self.questions = None
         self.model_embedding = None
+        # HF fast tokenizers are not thread safe ("Already borrowed"); service workers, micro-batcher
+        # threads and app sessions share this model, so every call to it goes through the lock
+        self.model_lock = threading.Lock()
+        self.query_cache = None
         self.vector_db = None
-        self.similarities = None
+        self.engine = None
+        self.lexical_index = None
+        self.top_k_scores = None
+        self.top_k_indices = None
+        self.batch_scores = None
+        self.batch_indices = None
 
         # Ensure output directory exists
         os.makedirs(self.output_dir, exist_ok=True)
@@ -42,98 +76,224 @@ class DataRetriever:
             logger.error("Failed to load input query question")
             raise CustomException("Error while loading input query question", e)
 
+    @timed("retrieval.load_vectordb")
     def load_vectordb(self):
         try:
             # Initialize embedding model and load vector database from local storage
-            self.model_embedding = HuggingFaceEmbeddings(model_name=self.embedding_model)
-            self.vector_db = FAISS.load_local(
-                self.vectordb_path,
-                self.model_embedding,
-                allow_dangerous_deserialization=True
-            )
+            self.model_embedding = load_embeddings(self.embedding_model, backend=self.embedding_backend)
+            if self.sharded:
+                # every query fans out over the shards; each shard carries its own index type
+                self.vector_db = ShardedVectorStore(
+                    SHARDED_INDEX_DIR,
+                    search_workers=self.shard_config.get("search_workers", 0),
+                    nprobe=self.nprobe,
+                    ef_search=self.ef_search
+                )
+                if os.path.exists(self.vectordb_path) and self.vector_db.meta["stamp"] != vector_db_stamp(self.vectordb_path):
+                    logger.warning("Sharded index is older than the vector DB, re-run data processing")
+            elif self.mmap_store:
+                # maps the index and chunk texts instead of unpickling the docstore
+                self.vector_db = MmapVectorStore(MMAP_STORE_DIR)
+                meta = read_store_meta(MMAP_STORE_DIR)
+                if os.path.exists(self.vectordb_path) and meta["stamp"] != vector_db_stamp(self.vectordb_path):
+                    logger.warning("Memory-mapped store is older than the vector DB, re-run data processing")
+            else:
+                # LangChain is only needed for the pickled docstore
+                from langchain_community.vectorstores import FAISS
+                self.vector_db = FAISS.load_local(
+                    self.vectordb_path,
+                    self.model_embedding,
+                    allow_dangerous_deserialization=True,
+                    **vector_db_kwargs(self.normalize_embeddings)
+                )
+            if not self.sharded:
+                use_ann_index(self.vector_db, self.vectordb_path, self.index_config, nprobe=self.nprobe, ef_search=self.ef_search)
+            self.engine = RetrievalEngine(self.vector_db.index)
+            set_gauge("vector_index_chunks", self.vector_db.index.ntotal)
+            if self.retrieval_mode == "hybrid":
+                self.load_lexical_index()
+
+            if self.cache_config.get("enabled", False):
+                self.query_cache = open_query_cache(
+                    QUERY_CACHE_DIR,
+                    embedding_model_key(self.embedding_model, self.embedding_backend),
+                    memory_size=self.cache_config["memory_size"],
+                    disk_size=self.cache_config["disk_size"],
+                    lowercase=embedding_lowercases(self.model_embedding)
+                )
             logger.info("Successfully loaded embedding model and vector database")
 
         except Exception as e:
             logger.error("Failed to load embedding model and vector database")
             raise CustomException("Error while loading embedding model and vector database", e)
 
+    def load_lexical_index(self):
+        self.lexical_index = LexicalIndex(LEXICAL_INDEX_DIR, max_df=self.lexical_config.get("max_df", 0.5))
+        # positions only line up when both were built from the same vector DB
+        if self.lexical_index.ntotal != self.vector_db.index.ntotal:
+            logger.warning("Lexical index does not match the vector DB, using dense retrieval; re-run data processing")
+            self.lexical_index = None
+
+    @timed("retrieval.search")
+    def search(self, questions, query_embeddings):
+        # dense top-k, or dense and BM25 candidates fused by reciprocal rank in hybrid mode
+        increment("queries_retrieved", len(questions))
+        if self.lexical_index is None:
+            return self.engine.search(np.array(query_embeddings), self.top_k)
+        depth = max(self.hybrid_candidates, self.top_k)
+        _, dense_indices = self.engine.search(np.array(query_embeddings), depth)
+        fused = [
+            reciprocal_rank_fusion([dense, self.lexical_index.search(question, depth)[1]], self.top_k, self.rrf_k)
+            for question, dense in zip(questions, dense_indices)
+        ]
+        return [scores for scores, _ in fused], [indices for _, indices in fused]
+
+    def encode_query(self, question):
+        with self.model_lock:
+            return self.model_embedding.embed_query(question)
+
+    def encode_queries(self, questions):
+        with self.model_lock:
+            return self.model_embedding.embed_documents(questions)
+
+    @timed("retrieval.embed_query")
+    def embed_query(self, question):
+        if self.query_cache is None:
+            return self.encode_query(question)
+        return self.query_cache.get_or_compute(question, self.encode_query)
+
+    @timed("retrieval.embed_queries")
+    def embed_queries(self, questions):
+        if self.query_cache is None:
+            return self.encode_queries(questions)
+        return self.query_cache.get_or_compute_many(questions, self.encode_queries)
+
+    @timed("retrieval.get_cosine_similarity")
     def get_cosine_similarity(self):
         try:
             logger.info("Computing embedding for input question")
-            query_embedding = self.model_embedding.embed_query(self.question)
-
-            # Reconstruct all stored chunk embeddings from FAISS index
-            chunks_embedding = self.vector_db.index.reconstruct_batch(
-                list(range(self.vector_db.index.ntotal))
-            )
+            query_embedding = self.embed_query(self.question)
 
-            logger.info("Converting question and chunk embeddings into numpy arrays")
-            query_vector = np.array(query_embedding).reshape(1, -1)
-            chunks_vectors = np.array(chunks_embedding)
-
-            logger.info("Calculating cosine similarity between question and chunk embeddings")
-            self.similarities = cosine_similarity(query_vector, chunks_vectors)[0]
+            logger.info(f"Searching the index for the top {self.top_k} chunks ({self.retrieval_mode})")
+            top_k_scores, top_k_indices = self.search([self.question], [query_embedding])
+            self.top_k_scores = top_k_scores[0]
+            self.top_k_indices = top_k_indices[0]
 
         except Exception as e:
             logger.error("Failed to calculate cosine similarity between question and chunks")
             raise CustomException("Error while calculating similarity between question and chunks", e)
 
+    def chunk_text(self, position):
+        if self.sharded or self.mmap_store:
+            return self.vector_db.text(position)
+        doc_id = self.vector_db.index_to_docstore_id.get(position)
+        if doc_id and doc_id in self.vector_db.docstore._dict:
+            return self.vector_db.docstore._dict[doc_id].page_content
+        return None
+
+    def _build_rows(self, question, top_k_indices, top_k_scores, run_id=None):
+        # use the top-k index's to getback the chunks from vectorDB.
+        run_id = run_id or new_run_id()
+        rows = []
+        for i, score in zip(top_k_indices, top_k_scores):
+            document = self.chunk_text(int(i))
+            if document is not None:
+                rows.append({
+                    "run_id": run_id,
+                    "query": question,
+                    "score": float(score),
+                    "document": document
+                })
+        return rows
+
+    @timed("retrieval.save_retrieved_chunks")
     def save_retrieved_chunks(self):
         try:
             logger.info(f"Selecting top {self.top_k} chunks most similar to the question")
-            # gives u the index ascending order
-            top_k_indices = self.similarities.argsort()[-self.top_k:][::-1]
-            # extract the scores from the index's
-            top_k_scores = self.similarities[top_k_indices]
-
-            # use the top-k index's to getback the chunks from vectorDB.
-            top_k_chunks = []
-            for i in top_k_indices:
-                doc_id = self.vector_db.index_to_docstore_id.get(i)
-                if doc_id and doc_id in self.vector_db.docstore._dict:
-                    top_k_chunks.append(self.vector_db.docstore._dict[doc_id])
+            self.run_id = new_run_id()
+            new_data = self._build_rows(self.question, self.top_k_indices, self.top_k_scores, self.run_id)
 
             logger.info("Compiling top chunks and similarity scores into dataframe for downstream processing")
+            self.retrieval_store.append(pd.DataFrame(new_data))
+            logger.info(f"Retrieved chunks saved to: {self.retrieval_store_dir}")
 
-            new_data = [{
-                "query": self.question,
-                "score": score,
-                "document": doc.page_content
-            } for doc, score in zip(top_k_chunks, top_k_scores)]
+        except Exception as e:
+            logger.error("Failed to save retrieved chunks into dataframe")
+            raise CustomException("Error while saving retrieved chunks into dataframe", e)
 
-            new_df = pd.DataFrame(new_data)
+    @timed("retrieval.retrieve")
+    def retrieve(self, question, query_embedding=None):
+        # Stateless question -> top-k rows, used by long-lived callers such as the RAG service
+        if query_embedding is None:
+            query_embedding = self.embed_query(question)
+        top_k_scores, top_k_indices = self.search([question], [query_embedding])
+        return self._build_rows(question, top_k_indices[0], top_k_scores[0])
 
-            os.makedirs(os.path.dirname(self.retrieved_df_path), exist_ok=True)
+    @timed("retrieval.retrieve_batch")
+    def retrieve_batch(self, questions, query_embeddings=None):
+        # retrieve() for many questions at once: one embedding call and one index search
+        if query_embeddings is None:
+            query_embeddings = self.embed_queries(questions)
+        batch_scores, batch_indices = self.search(questions, query_embeddings)
+        return [
+            self._build_rows(question, top_k_indices, top_k_scores)
+            for question, top_k_indices, top_k_scores in zip(questions, batch_indices, batch_scores)
+        ]
 
-            if os.path.exists(self.retrieved_df_path):
-                try:
-                    existing_df = pd.read_csv(self.retrieved_df_path)
+    def load_query_file(self, queries_file):
+        try:
+            # One question per line, blank lines are ignored
+            with open(queries_file, 'r', encoding='utf-8') as file:
+                self.questions = [line.strip() for line in file if line.strip()]
+            logger.info(f"Loaded {len(self.questions)} questions from {queries_file}")
 
-                    if set(existing_df.columns) == set(new_df.columns):
-                        combined_df = pd.concat([existing_df, new_df], ignore_index=True)
-                    else:
-                        logger.warning("⚠️ Column mismatch. Overwriting retrieval file.")
-                        combined_df = new_df
-                except Exception as e:
-                    logger.warning(f"⚠️ Failed to read existing file. Overwriting. Reason: {e}")
-                    combined_df = new_df
-            else:
-                combined_df = new_df
+        except Exception as e:
+            logger.error("Failed to load query file")
+            raise CustomException("Error while loading query file", e)
 
-            combined_df.to_csv(self.retrieved_df_path, index=False)
-            logger.info(f"Retrieved chunks saved to: {self.retrieved_df_path}")
+    @timed("retrieval.get_batch_similarity")
+    def get_batch_similarity(self):
+        try:
+            logger.info(f"Embedding {len(self.questions)} questions in batches of {self.batch_size}")
+            query_embeddings = []
+            for start in range(0, len(self.questions), self.batch_size):
+                query_embeddings.extend(self.embed_queries(self.questions[start:start + self.batch_size]))
+
+            # Score every question against the index in a single matrix search
+            logger.info(f"Searching the index for the top {self.top_k} chunks of every question")
+            self.batch_scores, self.batch_indices = self.search(self.questions, query_embeddings)
 
         except Exception as e:
-            logger.error("Failed to save retrieved chunks into dataframe")
-            raise CustomException("Error while saving retrieved chunks into dataframe", e)
+            logger.error("Failed to calculate batch similarity between questions and chunks")
+            raise CustomException("Error while calculating batch similarity between questions and chunks", e)
+
+    @timed("retrieval.save_batch_retrieved_chunks")
+    def save_batch_retrieved_chunks(self):
+        try:
+            new_data = []
+            for question, top_k_indices, top_k_scores in zip(self.questions, self.batch_indices, self.batch_scores):
+                new_data.extend(self._build_rows(question, top_k_indices, top_k_scores))
+
+            # all questions' rows go out in one segment
+            self.retrieval_store.append(pd.DataFrame(new_data))
+            logger.info(f"Retrieved chunks of {len(self.questions)} questions saved to: {self.retrieval_store_dir}")
+
+        except Exception as e:
+            logger.error("Failed to save batch retrieved chunks into dataframe")
+            raise CustomException("Error while saving batch retrieved chunks into dataframe", e)
 
-    def run(self):
+    def run(self, question=None):
         try:
             logger.info("Starting full data retrieval workflow")
-            self.load_query_question()
+            if question is None:
+                self.load_query_question()
+            else:
+                self.question = question
             self.load_vectordb()
             self.get_cosine_similarity()
             self.save_retrieved_chunks()
+            if self.query_cache is not None:
+                logger.info(f"Query embedding cache stats: {self.query_cache.stats()}")
             logger.info("Completed data retrieval workflow successfully")
 
         except CustomException as e:
@@ -142,6 +302,23 @@ class DataRetriever:
         finally:
             logger.info("Data retrieval process finished")
 
+    def run_batch(self, queries_file):
+        try:
+            logger.info("Starting batch data retrieval workflow")
+            self.load_query_file(queries_file)
+            self.load_vectordb()
+            self.get_batch_similarity()
+            self.save_batch_retrieved_chunks()
+            if self.query_cache is not None:
+                logger.info(f"Query embedding cache stats: {self.query_cache.stats()}")
+            logger.info("Completed batch data retrieval workflow successfully")
+
+        except CustomException as e:
+            logger.error(f"Batch data retrieval encountered an error: {str(e)}")
+
+        finally:
+            logger.info("Batch data retrieval process finished")
+
 if __name__ == "__main__":
-    data_retriever = DataRetriever(read_yaml(CONFIG_PATH), VECTORDB_PATH, RETRIEVED_DF_PATH, RETRIEVAL_DIR)
+    data_retriever = DataRetriever(read_yaml(CONFIG_PATH), VECTORDB_PATH, RETRIEVAL_STORE_DIR, RETRIEVAL_DIR)
     data_retriever.run()
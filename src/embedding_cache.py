@@ -0,0 +1,345 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+import numpy as np
+from src.logger import get_logger
+from src.custom_exception import CustomException
+from src.metrics import increment
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = get_logger(__name__)
+
+_shared_caches = {}
+_shared_lock = threading.Lock()
+
+
+def normalize_query(text, lowercase=False):
+    # spacing never changes the embedding; case only when the model's tokenizer lowercases its input
+    # (uncased models such as all-MiniLM-L6-v2), a cased model embeds "US" and "us" differently
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.casefold() if lowercase else text
+
+
+def file_inode(path):
+    try:
+        return os.stat(path).st_ino
+    except FileNotFoundError:
+        return None
+
+
+def open_query_cache(cache_dir, model_name, memory_size=1024, disk_size=100000, lowercase=False):
+    # one instance per cache directory and model in a process: two instances would each keep their
+    # own ring position and key map, and overwrite each other's slots
+    key = (os.path.abspath(cache_dir), model_name, lowercase)
+    with _shared_lock:
+        if key not in _shared_caches:
+            _shared_caches[key] = QueryEmbeddingCache(cache_dir, model_name, memory_size=memory_size, disk_size=disk_size, lowercase=lowercase)
+        return _shared_caches[key]
+
+
+# Two-tier cache of query embeddings:
+#   tier 1 - in-memory LRU of `memory_size` vectors
+#   tier 2 - survives restarts: a memory-mapped float32 matrix of `disk_size` slots (vectors.f32)
+#            used as a ring buffer, plus an append-only key log (keys.log, one "slot key" per line,
+#            "slot -" frees a slot before it is overwritten)
+# meta.json records the embedding model; opening the cache with another model wipes the disk tier.
+# The app, the service and the CLI can share one cache directory: writers take an exclusive flock on
+# `lock`, readers a shared one, and both first replay whatever other processes appended to the key
+# log, so the ring position and slot owners are always the ones on disk. Within a process, callers
+# share one instance through open_query_cache.
+class QueryEmbeddingCache:
+    def __init__(self, cache_dir, model_name, memory_size=1024, disk_size=100000, lowercase=False):
+        self.cache_dir = cache_dir
+        self.model_name = model_name
+        self.lowercase = lowercase
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+
+        self.meta_path = os.path.join(cache_dir, "meta.json")
+        self.vectors_path = os.path.join(cache_dir, "vectors.f32")
+        self.keys_path = os.path.join(cache_dir, "keys.log")
+        self.lock_path = os.path.join(cache_dir, "lock")
+
+        self.memory = OrderedDict()
+        self.key_to_slot = {}
+        self.slot_to_key = {}
+        self.next_slot = 0
+        self.log_lines = 0
+        self.log_offset = 0
+        self.log_inode = None
+        self.dim = None
+        self.vectors = None
+        self.vectors_inode = None
+        self.detached = False
+        self.lock_file = None
+        self.lock = threading.Lock()
+
+        self.counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+            "invalidations": 0,
+        }
+
+        self._open()
+
+    def _open(self):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self.lock_file = open(self.lock_path, "a+")
+            with self._file_lock(exclusive=True):
+                meta = self._read_meta()
+                if meta and (meta["model_name"] != self.model_name or meta["disk_size"] != self.disk_size):
+                    logger.info(f"Embedding model or cache size changed ({meta['model_name']} -> {self.model_name}), invalidating query cache")
+                    self._clear()
+                    self.counters["invalidations"] += 1
+                elif meta is None:
+                    self._write_meta()
+                self._sync()
+            logger.info(f"Query embedding cache opened with {len(self.key_to_slot)} vectors on disk")
+
+        except Exception as e:
+            logger.error("Failed to open query embedding cache")
+            raise CustomException("Error while opening query embedding cache", e)
+
+    @contextmanager
+    def _file_lock(self, exclusive):
+        # no fcntl (Windows): one process per cache directory
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self.lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+
+    def invalidate(self):
+        with self.lock, self._file_lock(exclusive=True):
+            self._clear()
+            self.counters["invalidations"] += 1
+
+    def _clear(self):
+        # every file but the lock, which other processes may be holding
+        for path in (self.vectors_path, self.keys_path, self.meta_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self.memory.clear()
+        self._reset_slots()
+        self.dim = None
+        self.vectors = None
+        self.vectors_inode = None
+        self.detached = False
+        self._write_meta()
+
+    def _reset_slots(self):
+        self.key_to_slot.clear()
+        self.slot_to_key.clear()
+        self.next_slot = 0
+        self.log_lines = 0
+        self.log_offset = 0
+        self.log_inode = None
+
+    def _read_meta(self):
+        if not os.path.exists(self.meta_path):
+            return None
+        with open(self.meta_path, "r", encoding="utf-8") as file:
+            return json.load(file)
+
+    def _write_meta(self):
+        with open(self.meta_path, "w", encoding="utf-8") as file:
+            json.dump({"model_name": self.model_name, "disk_size": self.disk_size, "dim": self.dim}, file)
+
+    def _sync(self):
+        # replay the key log lines written since the last sync, by this or any other process;
+        # a log that was compacted (new inode) or wiped is replayed from the start
+        try:
+            stat = os.stat(self.keys_path)
+        except FileNotFoundError:
+            if self.log_inode is not None:
+                self._reset_slots()
+            stat = None
+
+        if stat is not None:
+            if stat.st_ino != self.log_inode or stat.st_size < self.log_offset:
+                self._reset_slots()
+                self.log_inode = stat.st_ino
+            if stat.st_size > self.log_offset:
+                with open(self.keys_path, "rb") as file:
+                    file.seek(self.log_offset)
+                    data = file.read(stat.st_size - self.log_offset)
+                # only whole lines; a line cut short by a crash is skipped below
+                complete = data[:data.rfind(b"\n") + 1]
+                for line in complete.decode("utf-8").splitlines():
+                    self._replay(line)
+                self.log_offset += len(complete)
+
+        # a process opened with another model or size wiped the directory: its disk tier is not ours
+        if self.vectors is not None and file_inode(self.vectors_path) != self.vectors_inode:
+            self.vectors = None
+        if self.vectors is None:
+            meta = self._read_meta()
+            if meta and (meta["model_name"] != self.model_name or meta["disk_size"] != self.disk_size):
+                if not self.detached:
+                    logger.warning(f"Query cache {self.cache_dir} was taken over by {meta['model_name']}, using the memory tier only")
+                self.detached = True
+            elif meta and meta.get("dim") and os.path.exists(self.vectors_path):
+                self.dim = meta["dim"]
+                self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(self.disk_size, self.dim))
+                self.vectors_inode = file_inode(self.vectors_path)
+
+    def _replay(self, line):
+        parts = line.split()
+        if len(parts) != 2 or not parts[0].isdigit() or int(parts[0]) >= self.disk_size:
+            return
+        slot = int(parts[0])
+        if parts[1] == "-":
+            self._release(slot)
+        else:
+            self._assign(slot, parts[1])
+        self.log_lines += 1
+
+    def _release(self, slot):
+        old_key = self.slot_to_key.pop(slot, None)
+        if old_key is not None and self.key_to_slot.get(old_key) == slot:
+            del self.key_to_slot[old_key]
+
+    def _assign(self, slot, key):
+        self._release(slot)
+        if key in self.key_to_slot:
+            self.slot_to_key.pop(self.key_to_slot[key], None)
+        self.slot_to_key[slot] = key
+        self.key_to_slot[key] = slot
+        # the ring continues after the most recently written slot
+        self.next_slot = (slot + 1) % self.disk_size
+
+    def _append_log(self, line):
+        data = line.encode("utf-8")
+        with open(self.keys_path, "ab") as file:
+            file.write(data)
+        if self.log_inode is None:
+            self.log_inode = os.stat(self.keys_path).st_ino
+        self.log_offset += len(data)
+        self.log_lines += 1
+
+    def key(self, text):
+        return hashlib.sha1(f"{self.model_name}\0{normalize_query(text, self.lowercase)}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key, vector):
+        self.memory[key] = vector
+        self.memory.move_to_end(key)
+        if len(self.memory) > self.memory_size:
+            self.memory.popitem(last=False)
+            self.counters["memory_evictions"] += 1
+
+    def get(self, text):
+        key = self.key(text)
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                increment("query_cache_hits")
+                return self.memory[key]
+
+            vector = None
+            with self._file_lock(exclusive=False):
+                self._sync()
+                slot = self.key_to_slot.get(key)
+                if slot is not None and not self.detached:
+                    vector = np.array(self.vectors[slot])
+            if vector is not None:
+                self._remember(key, vector)
+                self.counters["disk_hits"] += 1
+                increment("query_cache_hits")
+                return vector
+
+            self.counters["misses"] += 1
+            increment("query_cache_misses")
+            return None
+
+    def put(self, text, vector):
+        key = self.key(text)
+        vector = np.asarray(vector, dtype=np.float32)
+        with self.lock:
+            self._remember(key, vector)
+            with self._file_lock(exclusive=True):
+                # another process may have cached it, or moved the ring on, since our last sync
+                self._sync()
+                if key in self.key_to_slot or self.detached:
+                    return
+
+                if self.vectors is None:
+                    self.dim = vector.shape[0]
+                    self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="w+", shape=(self.disk_size, self.dim))
+                    self.vectors_inode = file_inode(self.vectors_path)
+                    self._write_meta()
+
+                # ring buffer: once full, the oldest slot is overwritten. Its key is released in the
+                # log first, so a crash mid-overwrite never leaves the old key on the new vector
+                slot = self.next_slot
+                if slot in self.slot_to_key:
+                    self.counters["disk_evictions"] += 1
+                    self._append_log(f"{slot} -\n")
+                    self._release(slot)
+                self.vectors[slot] = vector
+                self.vectors.flush()
+
+                # and the vector is flushed before its key is logged, so a crash never leaves a dangling key
+                self._append_log(f"{slot} {key}\n")
+                self._assign(slot, key)
+
+                if self.log_lines > 4 * self.disk_size:
+                    self._compact_log()
+
+    def _compact_log(self):
+        # oldest slot first, so replaying the compacted log puts the ring back where it was;
+        # written aside and swapped in, other processes see the new inode and replay it whole
+        tmp_path = self.keys_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            for offset in range(self.disk_size):
+                slot = (self.next_slot + offset) % self.disk_size
+                if slot in self.slot_to_key:
+                    file.write(f"{slot} {self.slot_to_key[slot]}\n")
+        os.replace(tmp_path, self.keys_path)
+        stat = os.stat(self.keys_path)
+        self.log_inode = stat.st_ino
+        self.log_offset = stat.st_size
+        self.log_lines = len(self.slot_to_key)
+
+    def get_or_compute(self, text, embed_query):
+        vector = self.get(text)
+        if vector is None:
+            vector = embed_query(text)
+            self.put(text, vector)
+        return vector
+
+    def get_or_compute_many(self, texts, embed_documents):
+        vectors = [self.get(text) for text in texts]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            computed = embed_documents([texts[i] for i in missing])
+            for i, vector in zip(missing, computed):
+                self.put(texts[i], vector)
+                vectors[i] = np.asarray(vector, dtype=np.float32)
+        return vectors
+
+    def stats(self):
+        with self.lock:
+            lookups = self.counters["memory_hits"] + self.counters["disk_hits"] + self.counters["misses"]
+            hits = self.counters["memory_hits"] + self.counters["disk_hits"]
+            return {
+                **self.counters,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self.memory),
+                "disk_entries": len(self.key_to_slot),
+            }
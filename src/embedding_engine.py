@@ -0,0 +1,133 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import numpy as np
+from src.logger import get_logger
+from src.custom_exception import CustomException
+from src.metrics import increment
+from src.retrieval_engine import normalize_rows
+
+logger = get_logger(__name__)
+
+# Per worker process embedding model, created once by the pool initializer
+_worker_embedding = None
+
+
+def _init_worker(model_name, batch_size, torch_threads, backend):
+    global _worker_embedding
+    import torch
+    from src.model_loader import load_embeddings
+
+    # split the cores between workers instead of every worker grabbing all of them
+    torch.set_num_threads(torch_threads)
+    _worker_embedding = load_embeddings(model_name, backend=backend, encode_kwargs={"batch_size": batch_size})
+
+
+def sentence_transformer(model_embedding):
+    # HuggingFaceEmbeddings keeps the SentenceTransformer as `_client` (newer) or `client` (older)
+    return getattr(model_embedding, "_client", None) or getattr(model_embedding, "client", None)
+
+
+def count_tokens(model_embedding, texts):
+    client = sentence_transformer(model_embedding)
+    tokenizer = getattr(client, "tokenizer", None)
+    if tokenizer is None:
+        return 0
+    max_length = getattr(client, "max_seq_length", None)
+    encoded = tokenizer(texts, truncation=max_length is not None, max_length=max_length)
+    return sum(len(ids) for ids in encoded["input_ids"])
+
+
+def embed_batch(model_embedding, batch):
+    # (vectors, tokens) of one batch; the tokens are counted where the batch is embedded, so with a
+    # worker pool the counting is spread over the workers instead of a serial pass in the parent
+    return np.asarray(model_embedding.embed_documents(batch), dtype=np.float32), count_tokens(model_embedding, batch)
+
+
+def _embed_in_worker(batch):
+    return embed_batch(_worker_embedding, batch)
+
+
+class EmbeddingEngine:
+    def __init__(self, model_embedding, model_name, config, backend="torch"):
+        self.model_embedding = model_embedding
+        self.model_name = model_name
+        self.backend = backend
+        self.batch_size = config.get("embedding_batch_size", 64)
+        self.length_sorted = config.get("length_sorted_batches", True)
+        # unit vectors for the inner product (cosine) index; the vector store does not normalize again
+        self.normalize = config.get("normalize_embeddings", False)
+        workers = config.get("embedding_workers", 0)
+        self.num_workers = os.cpu_count() if workers == -1 else workers
+
+        self.pool = None
+        self.stats = {"chunks": 0, "tokens": 0, "seconds": 0.0}
+
+    def start_pool(self):
+        if self.num_workers > 1 and self.pool is None:
+            torch_threads = max(1, (os.cpu_count() or 1) // self.num_workers)
+            logger.info(f"Starting {self.num_workers} embedding worker processes with {torch_threads} threads each")
+            self.pool = ProcessPoolExecutor(
+                max_workers=self.num_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.model_name, self.batch_size, torch_threads, self.backend)
+            )
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def make_batches(self, texts):
+        # Sorting by length puts similar sized texts together so each batch pads very little
+        order = np.arange(len(texts))
+        if self.length_sorted:
+            order = np.argsort([-len(t) for t in texts], kind="stable")
+        return order, [[texts[i] for i in order[start:start + self.batch_size]] for start in range(0, len(texts), self.batch_size)]
+
+    def embed(self, texts):
+        try:
+            if not texts:
+                return np.zeros((0, 0), dtype=np.float32)
+
+            start = time.perf_counter()
+            order, batches = self.make_batches(texts)
+
+            self.start_pool()
+            if self.pool is not None:
+                results = list(self.pool.map(_embed_in_worker, batches))
+            else:
+                results = [embed_batch(self.model_embedding, batch) for batch in batches]
+
+            # put the vectors back into the caller's order
+            vectors = np.empty((len(texts), results[0][0].shape[1]), dtype=np.float32)
+            vectors[order] = np.concatenate([batch_vectors for batch_vectors, _ in results])
+            if self.normalize:
+                vectors = normalize_rows(vectors)
+
+            elapsed = time.perf_counter() - start
+            tokens = sum(batch_tokens for _, batch_tokens in results)
+            self.stats["chunks"] += len(texts)
+            self.stats["tokens"] += tokens
+            self.stats["seconds"] += elapsed
+            increment("chunks_embedded", len(texts))
+            increment("embedding_tokens", tokens)
+            logger.info(
+                f"Embedded {len(texts)} chunks in {elapsed:.2f}s: "
+                f"{len(texts) / elapsed:.1f} chunks/sec, {tokens / elapsed:.1f} tokens/sec"
+            )
+            return vectors
+
+        except Exception as e:
+            logger.error("Failed to embed chunks")
+            raise CustomException("Error while embedding chunks", e)
+
+    def throughput(self):
+        seconds = self.stats["seconds"] or float("nan")
+        return {
+            **self.stats,
+            "chunks_per_sec": round(self.stats["chunks"] / seconds, 2),
+            "tokens_per_sec": round(self.stats["tokens"] / seconds, 2)
+        }
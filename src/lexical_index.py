@@ -0,0 +1,138 @@
+import json
+import os
+import re
+import shutil
+import time
+from collections import Counter
+import numpy as np
+from src.logger import get_logger
+from src.custom_exception import CustomException
+from src.retrieval_engine import top_k_from_scores
+
+logger = get_logger(__name__)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    # names, dates and unit designations ("101st", "1944") survive as whole tokens
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+# BM25 over the chunks, in the same positions as the vector index.
+#   vocab.json       - term -> term id
+#   indptr.npy       - CSR row pointers: postings of term t are [indptr[t], indptr[t+1])
+#   doc_ids.npy      - int32 chunk position of every posting, sorted within a term
+#   impacts.npy      - float32 BM25 weight of every posting (idf and length normalisation folded in)
+#   meta.json        - ntotal, k1, b, avgdl and the stamp of the vector DB it was built from
+# Query scoring is a scatter-add of the query terms' impacts, no per-document work.
+def build_lexical_index(texts, index_dir, k1=1.2, b=0.75, stamp=None):
+    try:
+        start = time.perf_counter()
+        vocab = {}
+        term_ids, doc_ids, term_freqs = [], [], []
+        lengths = np.zeros(len(texts), dtype=np.float32)
+        for position, text in enumerate(texts):
+            tokens = tokenize(text)
+            lengths[position] = len(tokens)
+            for term, count in Counter(tokens).items():
+                term_ids.append(vocab.setdefault(term, len(vocab)))
+                doc_ids.append(position)
+                term_freqs.append(count)
+
+        term_ids = np.array(term_ids, dtype=np.int64)
+        doc_ids = np.array(doc_ids, dtype=np.int32)
+        term_freqs = np.array(term_freqs, dtype=np.float32)
+
+        order = np.lexsort((doc_ids, term_ids))
+        term_ids, doc_ids, term_freqs = term_ids[order], doc_ids[order], term_freqs[order]
+        document_freqs = np.bincount(term_ids, minlength=len(vocab))
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(document_freqs, out=indptr[1:])
+
+        ntotal = len(texts)
+        avgdl = float(lengths.mean()) if ntotal else 0.0
+        idf = np.log(1.0 + (ntotal - document_freqs + 0.5) / (document_freqs + 0.5)).astype(np.float32)
+        norm = k1 * (1.0 - b + b * lengths[doc_ids] / max(avgdl, 1e-9))
+        impacts = (idf[term_ids] * term_freqs * (k1 + 1.0) / (term_freqs + norm)).astype(np.float32)
+
+        tmp_dir = index_dir + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        np.save(os.path.join(tmp_dir, "indptr.npy"), indptr)
+        np.save(os.path.join(tmp_dir, "doc_ids.npy"), doc_ids)
+        np.save(os.path.join(tmp_dir, "impacts.npy"), impacts)
+        with open(os.path.join(tmp_dir, "vocab.json"), "w", encoding="utf-8") as file:
+            json.dump(vocab, file)
+        with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as file:
+            json.dump({"ntotal": ntotal, "k1": k1, "b": b, "avgdl": avgdl, "stamp": stamp}, file)
+        shutil.rmtree(index_dir, ignore_errors=True)
+        os.replace(tmp_dir, index_dir)
+
+        logger.info(f"Built BM25 index over {ntotal} chunks, {len(vocab)} terms, {len(doc_ids)} postings in {time.perf_counter() - start:.2f}s")
+
+    except Exception as e:
+        logger.error("Failed to build the lexical index")
+        raise CustomException("Error while building the lexical index", e)
+
+
+def read_lexical_meta(index_dir):
+    path = os.path.join(index_dir, "meta.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+class LexicalIndex:
+    def __init__(self, index_dir, max_df=0.5):
+        try:
+            self.meta = read_lexical_meta(index_dir)
+            if self.meta is None:
+                raise FileNotFoundError(f"no lexical index in {index_dir}, run data processing first")
+            with open(os.path.join(index_dir, "vocab.json"), "r", encoding="utf-8") as file:
+                self.vocab = json.load(file)
+            self.indptr = np.load(os.path.join(index_dir, "indptr.npy"), mmap_mode="r")
+            self.doc_ids = np.load(os.path.join(index_dir, "doc_ids.npy"), mmap_mode="r")
+            self.impacts = np.load(os.path.join(index_dir, "impacts.npy"), mmap_mode="r")
+            self.ntotal = self.meta["ntotal"]
+            # terms in more than max_df of the chunks add next to nothing to BM25 but cost the most
+            self.max_postings = max(1, int(max_df * self.ntotal))
+            logger.info(f"Lexical index loaded: {self.ntotal} chunks, {len(self.vocab)} terms")
+
+        except Exception as e:
+            logger.error("Failed to load the lexical index")
+            raise CustomException("Error while loading the lexical index", e)
+
+    def postings(self, query):
+        spans = []
+        for term in set(tokenize(query)):
+            term_id = self.vocab.get(term)
+            if term_id is not None:
+                start, end = int(self.indptr[term_id]), int(self.indptr[term_id + 1])
+                if end - start <= self.max_postings:
+                    spans.append((start, end))
+        if not spans:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+        return (
+            np.concatenate([self.doc_ids[start:end] for start, end in spans]),
+            np.concatenate([self.impacts[start:end] for start, end in spans])
+        )
+
+    def search(self, query, top_k):
+        # -> (scores, positions) of the best top_k chunks; fewer when fewer chunks match
+        doc_ids, impacts = self.postings(query)
+        if len(doc_ids) == 0:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+
+        # short postings lists: accumulate over the matching chunks only, not the whole corpus
+        if len(doc_ids) * 8 < self.ntotal:
+            candidates, inverse = np.unique(doc_ids, return_inverse=True)
+            scores = np.bincount(inverse, weights=impacts)
+        else:
+            candidates = None
+            scores = np.bincount(doc_ids, weights=impacts, minlength=self.ntotal)
+
+        top_scores, top_positions = top_k_from_scores(scores[None, :], min(top_k, np.count_nonzero(scores)))
+        top_positions = top_positions[0] if candidates is None else candidates[top_positions[0]]
+        return top_scores[0], top_positions
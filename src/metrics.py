@@ -0,0 +1,221 @@
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Spans (timers), counters and gauges for the pipeline stages.
+#   @timed("retrieval.search")            - times every call of a stage method
+#   with span("generator.decode"): ...    - times a block inside one
+#   increment("chunks_embedded", n)       - counters; set_gauge(...) for gauges
+#   observe("scheduler.queue_wait", s)    - a duration measured elsewhere, into the same histograms
+# Every finished span is one JSON line in the metrics log (with its parent span and the process
+# RSS), and write_snapshot() renders everything in the Prometheus text format.
+# Disabled (the default until configure_metrics sees metrics.enabled), every call returns after a
+# single attribute check, so the instrumentation can stay in hot paths.
+
+SPAN_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0, float("inf"))
+PREFIX = "rag_"
+
+
+def rss_bytes():
+    if os.path.exists("/proc/self/statm"):
+        with open("/proc/self/statm", "r") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.counters = {}
+        self.gauges = {}
+        self.spans = {}
+        self.log_file = None
+        self.snapshot_path = None
+        self.rss = 0
+        self.rss_read_at = 0.0
+
+    def configure(self, enabled, log_path=None, snapshot_path=None):
+        with self.lock:
+            self.enabled = enabled
+            self.snapshot_path = snapshot_path
+            if enabled and log_path and self.log_file is None:
+                os.makedirs(os.path.dirname(log_path), exist_ok=True)
+                self.log_file = open(log_path, "a", encoding="utf-8", buffering=1)
+
+    def stack(self):
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+        return self.local.stack
+
+    def memory(self, now):
+        # reading /proc costs more than the rest of a span, so RSS is sampled every 100 ms at most
+        if now - self.rss_read_at > 0.1:
+            self.rss = rss_bytes()
+            self.rss_read_at = now
+        return self.rss
+
+    def _record(self, name, seconds, error=False):
+        # [bucket counts..., sum, count, errors]; caller holds the lock
+        entry = self.spans.setdefault(name, [0] * len(SPAN_BUCKETS) + [0.0, 0, 0])
+        for i, bound in enumerate(SPAN_BUCKETS):
+            if seconds <= bound:
+                entry[i] += 1
+        entry[-3] += seconds
+        entry[-2] += 1
+        entry[-1] += error
+
+    def observe(self, name, seconds):
+        # a duration measured by the caller (e.g. time spent queued), histogram only, no log line
+        with self.lock:
+            self._record(name, seconds)
+
+    def finish_span(self, name, seconds, status, now):
+        rss = self.memory(now)
+        with self.lock:
+            self._record(name, seconds, status == "error")
+            self.gauges["process_resident_memory_bytes"] = rss
+            self.gauges["process_peak_resident_memory_bytes"] = max(rss, self.gauges.get("process_peak_resident_memory_bytes", 0))
+            if self.log_file is not None:
+                stack = self.stack()
+                self.log_file.write(json.dumps({
+                    "ts": round(time.time(), 6), "type": "span", "name": name, "ms": round(1000 * seconds, 3),
+                    "status": status, "parent": stack[-1] if stack else None, "rss_mb": round(rss / (1024 * 1024), 1),
+                    "thread": threading.current_thread().name
+                }) + "\n")
+
+    def increment(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+
+    def prometheus_text(self):
+        lines = []
+        with self.lock:
+            for name in sorted(self.counters):
+                lines += [f"# TYPE {PREFIX}{name}_total counter", f"{PREFIX}{name}_total {self.counters[name]}"]
+            for name in sorted(self.gauges):
+                lines += [f"# TYPE {PREFIX}{name} gauge", f"{PREFIX}{name} {self.gauges[name]}"]
+            if self.spans:
+                lines.append(f"# TYPE {PREFIX}span_seconds histogram")
+            for name in sorted(self.spans):
+                entry = self.spans[name]
+                for bound, count in zip(SPAN_BUCKETS, entry):
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{PREFIX}span_seconds_bucket{{span="{name}",le="{le}"}} {count}')
+                lines.append(f'{PREFIX}span_seconds_sum{{span="{name}"}} {round(entry[-3], 6)}')
+                lines.append(f'{PREFIX}span_seconds_count{{span="{name}"}} {entry[-2]}')
+            for name in sorted(self.spans):
+                lines.append(f'{PREFIX}span_errors_total{{span="{name}"}} {self.spans[name][-1]}')
+        return "\n".join(lines) + "\n"
+
+    def write_snapshot(self, path=None):
+        path = path or self.snapshot_path
+        if not self.enabled or not path:
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            file.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+
+_registry = MetricsRegistry()
+
+
+class Span:
+    def __init__(self, name):
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        _registry.stack().append(self.name)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        now = time.perf_counter()
+        _registry.stack().pop()
+        _registry.finish_span(self.name, now - self.start, "error" if exc_type else "ok", now)
+        return False
+
+
+class NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = NoopSpan()
+
+
+def configure_metrics(config):
+    # called by every stage constructor; the first call with metrics enabled opens the log
+    metrics_config = config.get("metrics", {})
+    if metrics_config.get("enabled", False) and not _registry.enabled:
+        from config.paths_config import METRICS_LOG_PATH, METRICS_SNAPSHOT_PATH
+        _registry.configure(
+            True,
+            log_path=METRICS_LOG_PATH if metrics_config.get("json_log", True) else None,
+            snapshot_path=METRICS_SNAPSHOT_PATH
+        )
+        # the snapshot of a CLI run is written when it exits; the service also serves it live
+        atexit.register(_registry.write_snapshot)
+        logger.info("Metrics enabled")
+
+
+def metrics_enabled():
+    return _registry.enabled
+
+
+def span(name):
+    return Span(name) if _registry.enabled else NOOP_SPAN
+
+
+def timed(name):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _registry.enabled:
+                return function(*args, **kwargs)
+            with Span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def increment(name, value=1):
+    if _registry.enabled:
+        _registry.increment(name, value)
+
+
+def set_gauge(name, value):
+    if _registry.enabled:
+        _registry.set_gauge(name, value)
+
+
+def observe(name, seconds):
+    if _registry.enabled:
+        _registry.observe(name, seconds)
+
+
+def prometheus_text():
+    return _registry.prometheus_text()
+
+
+def write_snapshot(path=None):
+    _registry.write_snapshot(path)
@@ -0,0 +1,130 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+from src.logger import get_logger
+from src.metrics import increment, set_gauge, observe
+
+logger = get_logger(__name__)
+
+# Collects requests from many threads (service requests, app sessions) and runs them as one batch:
+# a batch closes max_wait_ms after its first request arrived, or as soon as it holds max_batch_size.
+# handler(items) gets the whole batch and returns one result per item, in order; every caller
+# waits on its own Future.
+#   batcher = MicroBatcher("answer", answer_batch, max_batch_size=16, max_wait_ms=10)
+#   answer = batcher.submit(question).result()     - or asyncio.wrap_future(...) on an event loop
+# Metrics: <name>_queue_depth and <name>_batch_size gauges, <name>_batches and <name>_batched_requests
+# counters, and the time every request spent queued in the scheduler.<name>.queue_wait histogram.
+
+
+class MicroBatcher:
+    def __init__(self, name, handler, max_batch_size=16, max_wait_ms=10):
+        self.name = name
+        self.handler = handler
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.counters = {"batches": 0, "requests": 0, "wait_s": 0.0, "largest_batch": 0}
+        self.running = True
+        self.thread = threading.Thread(target=self.loop, name=f"micro-batch-{name}", daemon=True)
+        self.thread.start()
+        logger.info(f"Micro-batching {name} requests: up to {max_batch_size} per batch, {max_wait_ms} ms window")
+
+    def submit(self, item):
+        future = Future()
+        if not self.running:
+            future.set_exception(RuntimeError(f"{self.name} micro-batcher is closed"))
+            return future
+        self.queue.put((item, future, time.perf_counter()))
+        set_gauge(f"{self.name}_queue_depth", self.queue.qsize())
+        return future
+
+    def __call__(self, item):
+        return self.submit(item).result()
+
+    def collect(self):
+        # blocks for the first request, then fills the batch until the window or the size runs out
+        try:
+            batch = [self.queue.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        deadline = batch[0][2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def loop(self):
+        # nothing a batch does may end this thread, or every later caller would wait forever
+        while self.running:
+            batch = self.collect()
+            if not batch:
+                continue
+            try:
+                self.run_batch(batch)
+            except BaseException as e:
+                logger.error(f"{self.name} batch of {len(batch)} failed: {e!r}")
+                for _, future, _ in batch:
+                    self.settle(future, exception=e)
+
+    def run_batch(self, batch):
+        started = time.perf_counter()
+        waits = [started - enqueued for _, _, enqueued in batch]
+        for wait in waits:
+            observe(f"scheduler.{self.name}.queue_wait", wait)
+        set_gauge(f"{self.name}_queue_depth", self.queue.qsize())
+        set_gauge(f"{self.name}_batch_size", len(batch))
+        increment(f"{self.name}_batches")
+        increment(f"{self.name}_batched_requests", len(batch))
+        with self.lock:
+            self.counters["batches"] += 1
+            self.counters["requests"] += len(batch)
+            self.counters["wait_s"] += sum(waits)
+            self.counters["largest_batch"] = max(self.counters["largest_batch"], len(batch))
+
+        # one failure fails the whole batch; every caller sees the exception
+        results = list(self.handler([item for item, _, _ in batch]))
+        if len(results) != len(batch):
+            raise ValueError(f"{self.name} handler returned {len(results)} results for a batch of {len(batch)}")
+        for (_, future, _), result in zip(batch, results):
+            self.settle(future, result=result)
+
+    def settle(self, future, result=None, exception=None):
+        # a future the caller already cancelled (or one settled before a later failure) is left alone
+        if future.done():
+            return
+        try:
+            if exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(result)
+        except InvalidStateError:
+            pass
+
+    def stats(self):
+        with self.lock:
+            batches, requests = self.counters["batches"], self.counters["requests"]
+            return {
+                "batches": batches,
+                "requests": requests,
+                "mean_batch_size": round(requests / batches, 2) if batches else 0.0,
+                "largest_batch": self.counters["largest_batch"],
+                "mean_wait_ms": round(1000 * self.counters["wait_s"] / requests, 3) if requests else 0.0,
+                "queue_depth": self.queue.qsize()
+            }
+
+    def close(self):
+        # requests still queued once the loop has stopped would never be answered: fail them
+        self.running = False
+        self.thread.join()
+        error = RuntimeError(f"{self.name} micro-batcher was closed before the request ran")
+        while True:
+            try:
+                _, future, _ = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            self.settle(future, exception=error)
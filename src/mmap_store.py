@@ -0,0 +1,140 @@
+import json
+import os
+import shutil
+import time
+import faiss
+import numpy as np
+from src.logger import get_logger
+from src.custom_exception import CustomException
+
+logger = get_logger(__name__)
+
+# Read-only, memory-mapped copy of the vector DB for the processes that only search it.
+#   <root>/CURRENT            - name of the live version directory, swapped atomically on export
+#   <root>/<version>/index.faiss                 - flat faiss index, opened with IO_FLAG_MMAP_IFC
+#   <root>/<version>/texts.bin + texts.offsets.npy    - utf-8 chunk texts back to back + int64 offsets
+#   <root>/<version>/ids.bin + ids.offsets.npy        - docstore id of every index position
+#   <root>/<version>/metadata.bin + metadata.offsets.npy - JSON metadata of every index position
+#   <root>/<version>/store.json                       - ntotal, dim, metric and the source stamp
+# Opening it maps files instead of reading them, so it costs the same for any corpus size and
+# every process serving the same store shares the pages through the OS page cache.
+
+INDEX_FILE = "index.faiss"
+MMAP_FLAGS = faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
+
+
+def vector_db_stamp(vectordb_path):
+    # identifies the saved LangChain vector DB an export was made from
+    stat = os.stat(os.path.join(vectordb_path, INDEX_FILE))
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+def write_strings(path_prefix, strings):
+    offsets = np.zeros(len(strings) + 1, dtype=np.int64)
+    with open(path_prefix + ".bin", "wb") as file:
+        for i, text in enumerate(strings):
+            data = text.encode("utf-8")
+            file.write(data)
+            offsets[i + 1] = offsets[i] + len(data)
+    np.save(path_prefix + ".offsets.npy", offsets)
+
+
+class MmapStrings:
+    # strings decoded on demand from a memory-mapped blob
+    def __init__(self, path_prefix):
+        self.offsets = np.load(path_prefix + ".offsets.npy", mmap_mode="r")
+        size = int(self.offsets[-1])
+        self.blob = np.memmap(path_prefix + ".bin", dtype=np.uint8, mode="r") if size else np.zeros(0, dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, position):
+        if not 0 <= position < len(self):
+            return None
+        return self.blob[int(self.offsets[position]):int(self.offsets[position + 1])].tobytes().decode("utf-8")
+
+
+def current_version_dir(root_dir):
+    pointer = os.path.join(root_dir, "CURRENT")
+    if not os.path.exists(pointer):
+        return None
+    with open(pointer, "r", encoding="utf-8") as file:
+        return os.path.join(root_dir, file.read().strip())
+
+
+def read_store_meta(root_dir):
+    version_dir = current_version_dir(root_dir)
+    if version_dir is None or not os.path.exists(os.path.join(version_dir, "store.json")):
+        return None
+    with open(os.path.join(version_dir, "store.json"), "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def export_vector_db(vector_db, root_dir, stamp=None):
+    try:
+        start = time.perf_counter()
+        os.makedirs(root_dir, exist_ok=True)
+        version = f"v{time.time_ns()}"
+        version_dir = os.path.join(root_dir, version)
+        os.makedirs(version_dir)
+
+        ntotal = vector_db.index.ntotal
+        ids = [vector_db.index_to_docstore_id[i] for i in range(ntotal)]
+        documents = [vector_db.docstore.search(doc_id) for doc_id in ids]
+
+        # always a flat index here, the approximate index (if any) lives next to the vector DB
+        flat = faiss.IndexFlat(vector_db.index.d, vector_db.index.metric_type)
+        flat.add(vector_db.index.reconstruct_n(0, ntotal))
+        faiss.write_index(flat, os.path.join(version_dir, INDEX_FILE))
+
+        write_strings(os.path.join(version_dir, "texts"), [document.page_content for document in documents])
+        write_strings(os.path.join(version_dir, "ids"), ids)
+        write_strings(os.path.join(version_dir, "metadata"), [json.dumps(document.metadata) for document in documents])
+        with open(os.path.join(version_dir, "store.json"), "w", encoding="utf-8") as file:
+            json.dump({"ntotal": ntotal, "dim": flat.d, "metric": int(flat.metric_type), "stamp": stamp}, file)
+
+        # switch readers to the new version, then drop the old ones; processes that still map
+        # the old files keep them alive until they close them
+        tmp_pointer = os.path.join(root_dir, "CURRENT.tmp")
+        with open(tmp_pointer, "w", encoding="utf-8") as file:
+            file.write(version)
+        os.replace(tmp_pointer, os.path.join(root_dir, "CURRENT"))
+        for name in os.listdir(root_dir):
+            if name.startswith("v") and name != version:
+                shutil.rmtree(os.path.join(root_dir, name), ignore_errors=True)
+
+        logger.info(f"Exported {ntotal} chunks to the memory-mapped store {version_dir} in {time.perf_counter() - start:.2f}s")
+
+    except Exception as e:
+        logger.error("Failed to export the vector DB to the memory-mapped store")
+        raise CustomException("Error while exporting the vector DB to the memory-mapped store", e)
+
+
+class MmapVectorStore:
+    def __init__(self, root_dir):
+        try:
+            start = time.perf_counter()
+            self.version_dir = current_version_dir(root_dir)
+            if self.version_dir is None:
+                raise FileNotFoundError(f"no memory-mapped store in {root_dir}, run data processing first")
+
+            self.index = faiss.read_index(os.path.join(self.version_dir, INDEX_FILE), MMAP_FLAGS)
+            self.texts = MmapStrings(os.path.join(self.version_dir, "texts"))
+            self.ids = MmapStrings(os.path.join(self.version_dir, "ids"))
+            self.metadatas = MmapStrings(os.path.join(self.version_dir, "metadata"))
+            logger.info(f"Opened memory-mapped store with {self.index.ntotal} chunks in {1000 * (time.perf_counter() - start):.1f} ms")
+
+        except Exception as e:
+            logger.error("Failed to open the memory-mapped store")
+            raise CustomException("Error while opening the memory-mapped store", e)
+
+    def text(self, position):
+        return self.texts[position]
+
+    def doc_id(self, position):
+        return self.ids[position]
+
+    def metadata(self, position):
+        metadata = self.metadatas[position]
+        return json.loads(metadata) if metadata is not None else None
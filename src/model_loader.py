@@ -0,0 +1,153 @@
+import importlib
+import os
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Every stage gets its models from here rather than from HuggingFace directly, so a benchmark
+# (or any other caller) can swap in its own loaders without touching the stages.
+# Loaders registered in-process cover the common case; MODEL_LOADER_MODULE names a module whose
+# register() is called on first use, which also reaches spawned worker processes.
+_loaders = {}
+_env_checked = False
+
+
+def register_model_loaders(embeddings=None, tokenizer=None, seq2seq=None):
+    # each loader takes the model name (and, for embeddings, HuggingFaceEmbeddings' kwargs)
+    for kind, loader in (("embeddings", embeddings), ("tokenizer", tokenizer), ("seq2seq", seq2seq)):
+        if loader is not None:
+            _loaders[kind] = loader
+
+
+def reset_model_loaders():
+    _loaders.clear()
+
+
+def _loader(kind):
+    global _env_checked
+    if not _env_checked:
+        _env_checked = True
+        module_name = os.environ.get("MODEL_LOADER_MODULE")
+        # loaders registered in-process win over the environment
+        if module_name and not _loaders:
+            importlib.import_module(module_name).register()
+            logger.info(f"Model loaders registered by {module_name}")
+    return _loaders.get(kind)
+
+
+EMBEDDING_BACKENDS = ("torch", "torch_int8", "onnx")
+GENERATOR_BACKENDS = ("torch", "torch_int8", "onnx")
+
+
+def inference_backends(config):
+    # (embedding backend, generator backend) from the inference section of config.yaml
+    inference = config.get("inference", {})
+    embedding_backend = inference.get("embedding_backend", "torch")
+    generator_backend = inference.get("generator_backend", "torch")
+    if embedding_backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"unknown inference.embedding_backend '{embedding_backend}', expected one of {EMBEDDING_BACKENDS}")
+    if generator_backend not in GENERATOR_BACKENDS:
+        raise ValueError(f"unknown inference.generator_backend '{generator_backend}', expected one of {GENERATOR_BACKENDS}")
+    return embedding_backend, generator_backend
+
+
+def quantize_dynamic_int8(model):
+    # int8 weights for every nn.Linear, activations quantized on the fly; CPU only
+    import torch
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_embeddings(model_name, backend="torch", **kwargs):
+    loader = _loader("embeddings")
+    if loader is not None:
+        return loader(model_name, **kwargs)
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    if backend == "onnx":
+        # sentence-transformers exports the ONNX graph on first load (needs optimum[onnxruntime])
+        model_kwargs = {**kwargs.pop("model_kwargs", {}), "backend": "onnx"}
+        logger.info(f"Loading {model_name} on ONNX Runtime")
+        return HuggingFaceEmbeddings(model_name=model_name, model_kwargs=model_kwargs, **kwargs)
+
+    model_embedding = HuggingFaceEmbeddings(model_name=model_name, **kwargs)
+    if backend == "torch_int8":
+        # the first module of a SentenceTransformer wraps the HF encoder as auto_model
+        client = getattr(model_embedding, "_client", None) or getattr(model_embedding, "client", None)
+        client[0].auto_model = quantize_dynamic_int8(client[0].auto_model)
+        logger.info(f"Quantized {model_name} to dynamic int8")
+    return model_embedding
+
+
+def embedding_lowercases(model_embedding):
+    # True when the embedding model lowercases its input itself (uncased tokenizer or do_lower_case module)
+    client = getattr(model_embedding, "_client", None) or getattr(model_embedding, "client", None)
+    if client is None:
+        return False
+    tokenizer = getattr(client, "tokenizer", None)
+    first_module = client[0] if hasattr(client, "__getitem__") else None
+    return bool(getattr(tokenizer, "do_lower_case", False) or getattr(first_module, "do_lower_case", False))
+
+
+def embedding_hub_name(model_name):
+    # sentence-transformers looks a bare name such as all-MiniLM-L6-v2 up under its own hub namespace
+    if os.path.exists(model_name) or "/" in model_name:
+        return model_name
+    return f"sentence-transformers/{model_name}"
+
+
+_lowercases_by_name = {}
+
+
+def embedding_tokenizer_lowercases(model_name):
+    # embedding_lowercases for callers that have not loaded the model: only its tokenizer is read, once
+    # per process. An unresolvable name counts as cased, which only costs query cache hits
+    if model_name not in _lowercases_by_name:
+        try:
+            tokenizer = load_tokenizer(embedding_hub_name(model_name))
+            _lowercases_by_name[model_name] = bool(getattr(tokenizer, "do_lower_case", False))
+        except OSError as e:
+            logger.warning(f"Could not read the tokenizer of {model_name}, query cache keys keep their case: {e}")
+            _lowercases_by_name[model_name] = False
+    return _lowercases_by_name[model_name]
+
+
+def load_tokenizer(model_name):
+    loader = _loader("tokenizer")
+    if loader is not None:
+        return loader(model_name)
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(model_name)
+
+
+def load_seq2seq_model(model_name, backend="torch", onnx_dir=None):
+    loader = _loader("seq2seq")
+    if loader is not None:
+        return loader(model_name)
+
+    if backend == "onnx":
+        # exported once with optimum, then loaded from onnx_dir (needs optimum[onnxruntime])
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+        if onnx_dir and os.path.exists(os.path.join(onnx_dir, "config.json")):
+            logger.info(f"Loading the ONNX export of {model_name} from {onnx_dir}")
+            return ORTModelForSeq2SeqLM.from_pretrained(onnx_dir)
+        logger.info(f"Exporting {model_name} to ONNX, first run only")
+        model = ORTModelForSeq2SeqLM.from_pretrained(model_name, export=True)
+        if onnx_dir:
+            model.save_pretrained(onnx_dir)
+        return model
+
+    from transformers import AutoModelForSeq2SeqLM
+    model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
+    if backend == "torch_int8":
+        model = quantize_dynamic_int8(model)
+        logger.info(f"Quantized {model_name} to dynamic int8")
+    return model
+
+
+def onnx_export_dir(models_dir, model_name):
+    return os.path.join(models_dir, model_name.replace("/", "--") + "-onnx")
+
+
+def embedding_model_key(model_name, backend):
+    # caches keyed by model must not mix vectors from different backends; torch keeps the bare name
+    return model_name if backend == "torch" else f"{model_name}@{backend}"
@@ -0,0 +1,227 @@
+import json
+import os
+import threading
+import pandas as pd
+from src.logger import get_logger
+from src.custom_exception import CustomException
+from config.paths_config import *
+from utils.common_functions import read_yaml
+from utils.helpers import parse_and_clean, clean_text_nltk, source_file_name, content_hash
+from langchain_community.vectorstores import FAISS
+from src.url_fetcher import ConcurrentFetcher
+from src.data_processing import DataProcessor
+from src.stage_executor import Stage, StageExecutor
+from src.retrieval_engine import vector_db_kwargs
+from src.metrics import configure_metrics, timed, increment
+
+logger = get_logger(__name__)
+
+# Ingestion and processing as one pipeline, fetch -> clean -> chunk -> embed -> index, with the
+# documents handed over in memory through bounded queues instead of content_data.txt. Downloads,
+# HTML parsing and embedding overlap, so the run takes about as long as its slowest stage.
+# Chunk ids, metadata and the index manifest follow the incremental layout, so later runs of the
+# sequential path (data_processing.incremental) pick up from the index built here. Documents are
+# chunked in config order whatever order their downloads finish in, so dedup survivors and index
+# positions are the same from run to run; downloads run at most queue_size documents ahead of that order.
+
+
+class PipelinedIngestion:
+    def __init__(self, config, output_dir, chunks_df_path, vectordb_path):
+        self.ingestion_config = config["data_ingestion"]
+        self.urls = self.ingestion_config["urls"]
+        # every url goes through the pipeline once, in config order
+        self.order = list(dict.fromkeys(self.urls))
+        self.positions = {url: i for i, url in enumerate(self.order)}
+        self.refresh = self.ingestion_config.get("refresh", False)
+        self.config = config.get("pipelined_ingestion", {})
+        self.queue_size = self.config.get("queue_size", 8)
+        self.clean_workers = self.config.get("clean_workers", 2)
+        self.embed_batch_size = self.config.get("embed_batch_size", 256)
+        self.write_artifacts = self.config.get("write_artifacts", True)
+        configure_metrics(config)
+
+        # the processor brings the embedding model, chunking, dedup settings and the index follow-ups
+        self.processor = DataProcessor(config, CONTENT_DATA_TXT, output_dir, chunks_df_path, vectordb_path)
+        self.chunks_df_path = chunks_df_path
+        self.fetcher = None
+        self.deduplicator = None
+        self.sources = {}
+        self.arrived = {}
+        self.next_source = 0
+        self.window = threading.Condition()
+        self.pending = []
+        self.executor = None
+
+        os.makedirs(SOURCES_DIR, exist_ok=True)
+        logger.info("Pipelined ingestion started")
+
+    def source_file(self, url):
+        return os.path.join(SOURCES_DIR, source_file_name(url))
+
+    def read_source(self, url):
+        with open(self.source_file(url), 'r', encoding='utf-8') as file:
+            return file.read()
+
+    def wait_for_window(self, url):
+        # a url more than queue_size places ahead of the next one to chunk waits here, so the chunk
+        # stage never holds more than queue_size documents back behind a slow earlier download
+        with self.window:
+            while self.positions[url] >= self.next_source + self.queue_size and not self.executor.stop.is_set():
+                self.window.wait(timeout=0.1)
+
+    def fetch(self, url):
+        # network only; the HTML is parsed on the clean stage's threads. A url without content is passed
+        # on as "failed", so the chunk stage knows not to wait for it
+        self.wait_for_window(url)
+        local_copy = os.path.isfile(self.source_file(url))
+        if local_copy and not self.refresh:
+            return [(url, "cached", None)]
+        status, content = self.fetcher.download(url, conditional=local_copy)
+        if status == "fetched":
+            increment("pages_fetched")
+            return [(url, "fetched", content)]
+        if local_copy:
+            return [(url, "cached", None)]
+        logger.warning(f"No content fetched from {url}, skipping it")
+        return [(url, "failed", None)]
+
+    def clean(self, item):
+        url, status, content = item
+        if status == "failed":
+            return [(url, None)]
+        if status == "cached":
+            return [(url, self.read_source(url))]
+        text = parse_and_clean(content, url)
+        if not text:
+            logger.warning(f"No content fetched from {url}, skipping it")
+            return [(url, None)]
+        text = clean_text_nltk(text)
+        # the source file is the download cache, written whether or not the other artifacts are
+        with open(self.source_file(url), 'w', encoding='utf-8') as file:
+            file.write(text)
+        return [(url, text)]
+
+    def chunk(self, item):
+        # one worker: the deduplicator and the chunks.csv appends are not thread safe. Documents arrive
+        # in download order and are held back until every url before them in the config has come through
+        url, text = item
+        self.arrived[url] = text
+        outputs = []
+        while self.next_source < len(self.order) and self.order[self.next_source] in self.arrived:
+            url = self.order[self.next_source]
+            with self.window:
+                self.next_source += 1
+                self.window.notify_all()
+            text = self.arrived.pop(url)
+            if text is not None:
+                outputs.extend(self.chunk_source(url, text))
+        return outputs
+
+    def chunk_source(self, url, text):
+        digest = content_hash(text)
+        chunks, ids = self.processor.source_chunks(url, text, digest)
+        if self.write_artifacts:
+            pd.DataFrame(chunks, columns=["chunks_text"]).to_csv(self.chunks_df_path, mode='a', header=False, index=False)
+        chunks, ids, self.sources[url] = self.processor.dedup_source(self.deduplicator, digest, chunks, ids)
+        return [(url, chunks, ids)] if chunks else []
+
+    def embed(self, item):
+        # documents are gathered into batches of embed_batch_size chunks before the model sees them;
+        # one worker, parallelism comes from the embedding engine (data_processing.embedding_workers)
+        url, chunks, ids = item
+        self.pending.extend((chunk, chunk_id, url) for chunk, chunk_id in zip(chunks, ids))
+        if len(self.pending) < self.embed_batch_size:
+            return []
+        batch, self.pending = self.pending, []
+        return [self.embed_batch(batch)]
+
+    def flush_embeddings(self):
+        batch, self.pending = self.pending, []
+        return [self.embed_batch(batch)] if batch else []
+
+    def embed_batch(self, batch):
+        texts = [text for text, _, _ in batch]
+        return texts, self.processor.embedding_engine.embed(texts), [chunk_id for _, chunk_id, _ in batch], [{"source": url} for _, _, url in batch]
+
+    def index(self, item):
+        texts, embeddings, ids, metadatas = item
+        processor = self.processor
+        if processor.vector_db is None:
+            processor.vector_db = FAISS.from_embeddings(
+                zip(texts, embeddings), processor.model_embedding, metadatas=metadatas, ids=ids,
+                **vector_db_kwargs(processor.normalize_embeddings)
+            )
+        else:
+            processor.vector_db.add_embeddings(zip(texts, embeddings), metadatas=metadatas, ids=ids)
+        return []
+
+    def write_source_index(self):
+        # sources.json and content_data.txt in config order, as DataIngestion writes them
+        sources = [{"url": url, "file": self.source_file(url)} for url in self.urls if url in self.sources]
+        with open(SOURCES_INDEX_PATH, 'w', encoding='utf-8') as file:
+            json.dump(sources, file, indent=2)
+        if self.write_artifacts:
+            with open(CONTENT_DATA_TXT, 'w', encoding='utf-8') as file:
+                for source in sources:
+                    file.write(self.read_source(source["url"]) + '\n')
+
+    @timed("ingestion.pipelined")
+    def run_pipeline(self):
+        try:
+            processor = self.processor
+            processor.load_embedding_model()
+            self.fetcher = ConcurrentFetcher(self.ingestion_config, HTTP_CACHE_PATH)
+            self.fetcher.reset_stats()
+            self.deduplicator = processor.make_deduplicator()
+            if self.write_artifacts:
+                pd.DataFrame(columns=["chunks_text"]).to_csv(self.chunks_df_path, index=False)
+
+            self.executor = StageExecutor([
+                Stage("fetch", self.fetch, workers=self.fetcher.max_workers),
+                Stage("clean", self.clean, workers=self.clean_workers),
+                Stage("chunk", self.chunk),
+                Stage("embed", self.embed, finish=self.flush_embeddings),
+                Stage("index", self.index)
+            ], queue_size=self.queue_size)
+            self.executor.run(self.order)
+            self.fetcher.save_cache()
+            logger.info(f"Pipelined ingestion stages:\n{self.executor.report()}")
+
+            if processor.vector_db is None:
+                raise ValueError("no source produced any chunks")
+            self.write_source_index()
+            if self.deduplicator is not None:
+                self.deduplicator.save_mapping(DEDUP_MAP_PATH)
+            processor.manifest = {"settings": processor.index_settings(), "sources": self.sources}
+            logger.info(f"Pipelined ingestion indexed {processor.vector_db.index.ntotal} chunks from {len(self.sources)} sources")
+
+        except Exception as e:
+            logger.error(f"Error while running the pipelined ingestion: {e}")
+            raise CustomException("failed to run the pipelined ingestion", e)
+
+    def run(self):
+        processor = self.processor
+        try:
+            logger.info("starting Pipelined Ingestion Process")
+            self.run_pipeline()
+            processor.save_vector_db()
+            processor.save_manifest()
+            processor.update_ann_index()
+            processor.update_mmap_store()
+            processor.update_sharded_index()
+            processor.update_lexical_index()
+            logger.info(f"Embedding throughput: {processor.embedding_engine.throughput()}")
+            logger.info("Pipelined Ingestion Completed.......")
+
+        except CustomException as e:
+            logger.error(f"CustomException : {str(e)}")
+
+        finally:
+            if processor.embedding_engine is not None:
+                processor.embedding_engine.close()
+            logger.info("Pipelined Ingestion DONE...")
+
+
+if __name__ == "__main__":
+    pipelined_ingestion = PipelinedIngestion(read_yaml(CONFIG_PATH), PROCESSED_DIR, CHUNKS_DF_PATH, VECTORDB_PATH)
+    pipelined_ingestion.run()
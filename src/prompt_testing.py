@@ -1,15 +1,13 @@
 from langchain import PromptTemplate
-from langchain.chains import RetrievalQA
 from config.paths_config import *
-from langchain_huggingface  import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFacePipeline
+from utils.common_functions import read_yaml
+from src.data_retrieval import DataRetriever
 from transformers import pipeline
 
-embedding_model = HuggingFaceEmbeddings(model_name = 'all-MiniLM-L6-v2')
-    
-vector_db_loaded = FAISS.load_local(
-    'artifacts/processed/vector_db', embedding_model,allow_dangerous_deserialization=True)
+# memory-mapped store + ANN index when enabled in config, instead of unpickling the whole docstore
+retriever = DataRetriever(read_yaml(CONFIG_PATH), VECTORDB_PATH, RETRIEVAL_STORE_DIR, RETRIEVAL_DIR)
+retriever.load_vectordb()
+retriever.top_k = 5
 
 template = """<|user|> Relevant information: {context} Provide answer to question with relevant information provided above: {question}<|end|> <|assistant|>"""
 
@@ -29,20 +27,10 @@ llm_pipeline = pipeline(
     device=-1  # CPU; use 0 if you have a GPU
 )
 
-llm = HuggingFacePipeline(pipeline=llm_pipeline)
+question = 'tell me something about kpmg'
+context = "\n\n".join(row["document"] for row in retriever.retrieve(question))
 
-rag = RetrievalQA.from_chain_type(
- llm=llm,
- chain_type='stuff',
- retriever=vector_db_loaded.as_retriever(search_kwargs={"k": 5}),
- chain_type_kwargs={
- "prompt": prompt
- },
- verbose=True
-)
-
-x = rag.invoke('tell me something about kpmg')
-output_text = x['result']
+output_text = llm_pipeline(prompt.format(context=context, question=question))[0]['generated_text']
 end_token = "|end|"
 
 if end_token in output_text:
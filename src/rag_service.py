@@ -0,0 +1,202 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from src.logger import get_logger
+from src.custom_exception import CustomException
+from config.paths_config import *
+from utils.common_functions import read_yaml
+from src.data_retrieval import DataRetriever
+from src.data_generator import DataGenerator
+from src.micro_batcher import MicroBatcher
+from src.metrics import configure_metrics, metrics_enabled, prometheus_text, span
+
+logger = get_logger(__name__)
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class RAGService:
+    def __init__(self, config):
+        self.config = config
+        self.service_config = config["service"]
+        self.host = self.service_config["host"]
+        self.port = self.service_config["port"]
+        self.max_workers = self.service_config["max_workers"]
+        self.max_pending = self.service_config["max_pending"]
+        self.batching_config = config.get("micro_batching", {})
+
+        self.retriever = None
+        self.generator = None
+        self.executor = None
+        self.batchers = {}
+        self.pending = 0
+        configure_metrics(config)
+
+        logger.info("Initialized RAGService")
+
+    def load_models(self):
+        try:
+            # Load embedding model, vector DB and generator once for the lifetime of the process
+            logger.info("Loading embedding model, vector DB and generator for the service")
+            self.retriever = DataRetriever(self.config, VECTORDB_PATH, RETRIEVAL_STORE_DIR, RETRIEVAL_DIR)
+            self.retriever.load_vectordb()
+            self.generator = DataGenerator(self.config, RETRIEVAL_STORE_DIR, GENERATOR_DIR, GENERATOR_STORE_DIR)
+            self.generator.set_query_embedder(self.retriever.embed_query)
+
+            # Blocking model calls run here so the event loop keeps accepting connections
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="rag-worker")
+            if self.batching_config.get("enabled", False):
+                # concurrent questions share one embedding call, one index search and one generate()
+                batch_kwargs = {
+                    "max_batch_size": self.batching_config.get("max_batch_size", 16),
+                    "max_wait_ms": self.batching_config.get("max_wait_ms", 10)
+                }
+                self.batchers = {
+                    "/retrieve": MicroBatcher("retrieve", self.retrieve_batch, **batch_kwargs),
+                    "/answer": MicroBatcher("answer", self.answer_batch, **batch_kwargs)
+                }
+            logger.info(f"Models loaded, worker pool size {self.max_workers}")
+
+        except Exception as e:
+            logger.error("Failed to load models for the service")
+            raise CustomException("Error while loading models for the service", e)
+
+    def retrieve(self, question):
+        with span("service.retrieve"):
+            return {"question": question, "chunks": self.retriever.retrieve(question)}
+
+    def answer(self, question):
+        with span("service.answer"):
+            rows = self.retriever.retrieve(question)
+            answer = self.generator.answer_question(question, [row["document"] for row in rows])
+            return {"question": question, "answer": answer, "chunks": rows}
+
+    def retrieve_batch(self, questions):
+        with span("service.retrieve_batch"):
+            rows = self.retriever.retrieve_batch(questions)
+            return [{"question": question, "chunks": chunks} for question, chunks in zip(questions, rows)]
+
+    def answer_batch(self, questions):
+        with span("service.answer_batch"):
+            query_embeddings = self.retriever.embed_queries(questions)
+            rows = self.retriever.retrieve_batch(questions, query_embeddings)
+            pairs = [(question, [row["document"] for row in chunks]) for question, chunks in zip(questions, rows)]
+            answers = self.generator.cached_batch(pairs, query_vectors=query_embeddings)
+            return [
+                {"question": question, "answer": answer, "chunks": chunks}
+                for question, answer, chunks in zip(questions, answers, rows)
+            ]
+
+    async def dispatch(self, method, path, body):
+        routes = {"/retrieve": self.retrieve, "/answer": self.answer}
+
+        if method == "GET" and path == "/health":
+            cache = self.retriever.query_cache
+            answer_cache = self.generator.answer_cache
+            return 200, {
+                "status": "ok",
+                "pending": self.pending,
+                "query_cache": cache.stats() if cache else None,
+                "answer_cache": answer_cache.stats() if answer_cache else None,
+                "micro_batching": {path.strip("/"): batcher.stats() for path, batcher in self.batchers.items()} or None
+            }
+        if method == "GET" and path == "/metrics":
+            if not metrics_enabled():
+                return 404, {"error": "metrics are disabled in config.yaml"}
+            # Prometheus text format, sent as is
+            return 200, prometheus_text()
+        if method != "POST" or path not in routes:
+            return 404, {"error": f"no route for {method} {path}"}
+
+        try:
+            question = json.loads(body or b"{}").get("question", "").strip()
+        except (ValueError, AttributeError):
+            question = ""
+        if not question:
+            return 400, {"error": "request body must be JSON with a non-empty 'question'"}
+
+        if self.pending >= self.max_pending:
+            return 503, {"error": "service is at capacity, retry later"}
+
+        self.pending += 1
+        try:
+            start = time.perf_counter()
+            if path in self.batchers:
+                # waits on the event loop, so the batch can grow past the worker pool size
+                result = await asyncio.wrap_future(self.batchers[path].submit(question))
+            else:
+                result = await asyncio.get_running_loop().run_in_executor(self.executor, routes[path], question)
+            result["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            return 200, result
+        except Exception as e:
+            logger.error(f"Request to {path} failed: {e}")
+            return 500, {"error": str(e)}
+        finally:
+            self.pending -= 1
+
+    async def handle_connection(self, reader, writer):
+        # Minimal HTTP/1.1 with keep-alive: one JSON request/response per iteration
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, value = line.decode("latin-1").split(":", 1)
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                status, payload = await self.dispatch(method, path.split("?", 1)[0], body)
+                content_type = "text/plain; version=0.0.4" if isinstance(payload, str) else "application/json"
+                data = (payload if isinstance(payload, str) else json.dumps(payload)).encode("utf-8")
+                keep_alive = headers.get("connection", "keep-alive").lower() != "close"
+
+                writer.write(
+                    f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError, ValueError) as e:
+            logger.warning(f"Dropping malformed or interrupted connection: {e}")
+        finally:
+            writer.close()
+
+    async def serve(self):
+        server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        logger.info(f"RAG service listening on http://{self.host}:{self.port}")
+        async with server:
+            await server.serve_forever()
+
+    def run(self):
+        try:
+            self.load_models()
+            asyncio.run(self.serve())
+
+        except CustomException as e:
+            logger.error(f"RAG service encountered an error: {str(e)}")
+
+        except KeyboardInterrupt:
+            logger.info("RAG service stopped by user")
+
+        finally:
+            for batcher in self.batchers.values():
+                batcher.close()
+            if self.executor is not None:
+                self.executor.shutdown(wait=False, cancel_futures=True)
+            logger.info("RAG service shut down")
+
+
+if __name__ == "__main__":
+    rag_service = RAGService(read_yaml(CONFIG_PATH))
+    rag_service.run()
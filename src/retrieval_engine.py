@@ -0,0 +1,83 @@
+import faiss
+import numpy as np
+from src.logger import get_logger
+from src.custom_exception import CustomException
+
+logger = get_logger(__name__)
+
+
+def vector_db_kwargs(normalize_embeddings):
+    # Keyword arguments shared by FAISS.from_embeddings / FAISS.load_local so that the
+    # index is always built and re-opened with the same metric. The vectors are normalized when
+    # they are embedded (EmbeddingEngine), so LangChain's normalize_L2 is not needed.
+    if normalize_embeddings:
+        from langchain_community.vectorstores.utils import DistanceStrategy
+        return {"distance_strategy": DistanceStrategy.MAX_INNER_PRODUCT}
+    return {}
+
+
+def normalize_rows(vectors):
+    # L2 normalise every row so that inner product == cosine similarity
+    vectors = np.array(vectors, dtype=np.float32, ndmin=2)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def top_k_from_scores(scores, top_k):
+    # Partial top-k per row: argpartition is O(N), only the k winners get sorted
+    scores = np.atleast_2d(scores)
+    top_k = min(top_k, scores.shape[1])
+    if top_k == scores.shape[1]:
+        candidates = np.tile(np.arange(top_k), (scores.shape[0], 1))
+    else:
+        candidates = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1, kind="stable")
+    return np.take_along_axis(candidate_scores, order, axis=1), np.take_along_axis(candidates, order, axis=1)
+
+
+class RetrievalEngine:
+    def __init__(self, index):
+        self.index = index
+        self.inner_product = index.metric_type == faiss.METRIC_INNER_PRODUCT
+        self._normalized_vectors = None
+
+        if self.inner_product:
+            logger.info("RetrievalEngine using the index's native inner product k-NN search")
+        else:
+            logger.info("RetrievalEngine using normalized vectors with argpartition top-k (legacy L2 index)")
+
+    def _legacy_vectors(self):
+        # Legacy (L2) indexes store raw vectors: reconstruct them once per process,
+        # not once per query, and keep the normalized copy around.
+        if self._normalized_vectors is None:
+            self._normalized_vectors = normalize_rows(self.index.reconstruct_n(0, self.index.ntotal))
+        return self._normalized_vectors
+
+    def search(self, query_vectors, top_k):
+        try:
+            query_vectors = normalize_rows(query_vectors)
+            top_k = min(top_k, self.index.ntotal)
+
+            if self.inner_product:
+                # stored vectors are unit length, so inner product is the cosine similarity
+                return self.index.search(query_vectors, top_k)
+
+            scores = query_vectors @ self._legacy_vectors().T
+            return top_k_from_scores(scores, top_k)
+
+        except Exception as e:
+            logger.error("Failed to search the vector index")
+            raise CustomException("Error while searching the vector index", e)
+
+
+def reciprocal_rank_fusion(rankings, top_k, rrf_k=60):
+    # rankings: lists of chunk positions, best first; fused score = sum of 1 / (rrf_k + rank)
+    fused = {}
+    for ranking in rankings:
+        for rank, position in enumerate(ranking):
+            if position >= 0:
+                fused[int(position)] = fused.get(int(position), 0.0) + 1.0 / (rrf_k + rank + 1)
+    best = sorted(fused.items(), key=lambda item: -item[1])[:top_k]
+    return np.array([score for _, score in best], dtype=np.float32), np.array([position for position, _ in best], dtype=np.int64)
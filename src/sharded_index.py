@@ -0,0 +1,207 @@
+import bisect
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+import faiss
+import numpy as np
+from src.logger import get_logger
+from src.custom_exception import CustomException
+from src.ann_index import build_ann_index, index_spec, min_training_vectors, set_search_params
+from src.mmap_store import write_strings, MmapStrings, current_version_dir, INDEX_FILE, MMAP_FLAGS
+from src.retrieval_engine import top_k_from_scores
+
+logger = get_logger(__name__)
+
+# The vector DB split into N shards, each with its own index, docstore and ID map, built in parallel
+# and searched by fanning every query out to all shards and merging their top-k.
+#   <root>/CURRENT                          - live version directory, swapped atomically like the mmap store
+#   <root>/<version>/shards.json            - shard offsets, ntotal, dim, metric, index config and source stamp
+#   <root>/<version>/shard_000/index.faiss  - the shard's own (flat or vector_index type) index
+#   <root>/<version>/shard_000/texts, ids, metadata - its chunk texts, docstore ids and metadata (mmap_store format)
+# Shards hold contiguous ranges of vector DB positions, so global position = shard offset + local
+# position and the lexical index, the retrieval store and every other position based caller line up.
+# The merge is exact: any chunk in the global top-k is in the top-k of its own shard.
+
+SHARDS_META = "shards.json"
+
+
+def shard_dir(version_dir, shard):
+    return os.path.join(version_dir, f"shard_{shard:03d}")
+
+
+def shard_offsets(ntotal, num_shards):
+    # contiguous, balanced ranges: [offsets[i], offsets[i + 1]) belongs to shard i
+    num_shards = max(1, min(num_shards, ntotal))
+    return [ntotal * shard // num_shards for shard in range(num_shards + 1)]
+
+
+def read_shards_meta(root_dir):
+    version_dir = current_version_dir(root_dir)
+    if version_dir is None or not os.path.exists(os.path.join(version_dir, SHARDS_META)):
+        return None
+    with open(os.path.join(version_dir, SHARDS_META), "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def build_shard(directory, vectors, texts, ids, metadatas, index_config, metric):
+    os.makedirs(directory)
+    # a shard too small to train its approximate index searches exactly instead
+    if index_spec(index_config, len(vectors)) is None or len(vectors) < min_training_vectors(index_config):
+        index = faiss.IndexFlat(vectors.shape[1], metric)
+        index.add(vectors)
+    else:
+        index = build_ann_index(vectors, index_config, metric)
+    faiss.write_index(index, os.path.join(directory, INDEX_FILE))
+    write_strings(os.path.join(directory, "texts"), texts)
+    write_strings(os.path.join(directory, "ids"), ids)
+    write_strings(os.path.join(directory, "metadata"), [json.dumps(metadata) for metadata in metadatas])
+    return index.ntotal
+
+
+def build_sharded_index(vectors, texts, ids, metadatas, root_dir, num_shards, index_config=None, metric=faiss.METRIC_INNER_PRODUCT,
+                        build_workers=4, stamp=None):
+    try:
+        start = time.perf_counter()
+        index_config = index_config or {"type": "flat"}
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        offsets = shard_offsets(len(vectors), num_shards)
+        version = f"v{time.time_ns()}"
+        version_dir = os.path.join(root_dir, version)
+        os.makedirs(version_dir)
+
+        # faiss releases the GIL while it trains and adds, so threads build the shards in parallel
+        with ThreadPoolExecutor(max_workers=max(1, build_workers), thread_name_prefix="shard-build") as executor:
+            futures = [
+                executor.submit(build_shard, shard_dir(version_dir, shard), vectors[begin:end], texts[begin:end],
+                                ids[begin:end], metadatas[begin:end], index_config, metric)
+                for shard, (begin, end) in enumerate(zip(offsets[:-1], offsets[1:]))
+            ]
+            sizes = [future.result() for future in futures]
+
+        with open(os.path.join(version_dir, SHARDS_META), "w", encoding="utf-8") as file:
+            json.dump({
+                "num_shards": len(sizes), "offsets": offsets, "ntotal": int(len(vectors)), "dim": int(vectors.shape[1]),
+                "metric": int(metric), "index_config": index_config, "stamp": stamp
+            }, file)
+
+        # same switch-over as the mmap store: point CURRENT at the new version, then drop the old ones
+        tmp_pointer = os.path.join(root_dir, "CURRENT.tmp")
+        with open(tmp_pointer, "w", encoding="utf-8") as file:
+            file.write(version)
+        os.replace(tmp_pointer, os.path.join(root_dir, "CURRENT"))
+        for name in os.listdir(root_dir):
+            if name.startswith("v") and name != version:
+                shutil.rmtree(os.path.join(root_dir, name), ignore_errors=True)
+
+        seconds = time.perf_counter() - start
+        logger.info(f"Built {len(sizes)} shards ({min(sizes)}-{max(sizes)} chunks each) in {version_dir} in {seconds:.2f}s")
+        return seconds
+
+    except Exception as e:
+        logger.error("Failed to build the sharded index")
+        raise CustomException("Error while building the sharded index", e)
+
+
+def export_sharded_index(vector_db, root_dir, num_shards, index_config=None, build_workers=4, stamp=None):
+    # the exact vectors and docstore of a LangChain vector DB, in index position order
+    ntotal = vector_db.index.ntotal
+    ids = [vector_db.index_to_docstore_id[i] for i in range(ntotal)]
+    documents = [vector_db.docstore.search(doc_id) for doc_id in ids]
+    return build_sharded_index(
+        vector_db.index.reconstruct_n(0, ntotal), [document.page_content for document in documents], ids,
+        [document.metadata for document in documents], root_dir, num_shards, index_config=index_config,
+        metric=vector_db.index.metric_type, build_workers=build_workers, stamp=stamp
+    )
+
+
+class ShardedIndex:
+    # quacks like the faiss index RetrievalEngine expects: ntotal, d, metric_type, search, reconstruct_n
+    def __init__(self, shards, offsets, metric_type, search_workers):
+        self.shards = shards
+        self.offsets = offsets
+        self.metric_type = metric_type
+        self.ntotal = offsets[-1]
+        self.d = shards[0].d
+        self.executor = ThreadPoolExecutor(max_workers=search_workers, thread_name_prefix="shard-search") if search_workers > 1 else None
+
+    def search_shard(self, shard, query_vectors, top_k):
+        index = self.shards[shard]
+        scores, positions = index.search(query_vectors, min(top_k, index.ntotal))
+        # missing results (-1, from approximate shards) can never win the merge
+        missing = positions < 0
+        scores[missing] = -np.inf if self.metric_type == faiss.METRIC_INNER_PRODUCT else np.inf
+        return scores, np.where(missing, -1, positions + self.offsets[shard])
+
+    def search(self, query_vectors, top_k):
+        query_vectors = np.ascontiguousarray(query_vectors, dtype=np.float32)
+        shards = range(len(self.shards))
+        if self.executor is None:
+            results = [self.search_shard(shard, query_vectors, top_k) for shard in shards]
+        else:
+            results = list(self.executor.map(lambda shard: self.search_shard(shard, query_vectors, top_k), shards))
+
+        scores = np.concatenate([shard_scores for shard_scores, _ in results], axis=1)
+        positions = np.concatenate([shard_positions for _, shard_positions in results], axis=1)
+        # top-k of the union of the per shard top-k; L2 distances are ranked by their negation
+        inner_product = self.metric_type == faiss.METRIC_INNER_PRODUCT
+        top_scores, order = top_k_from_scores(scores if inner_product else -scores, top_k)
+        return (top_scores if inner_product else -top_scores), np.take_along_axis(positions, order, axis=1)
+
+    def reconstruct_n(self, start, count):
+        # legacy L2 indexes rank on reconstructed vectors; shards are flat there, so this is exact
+        vectors = np.concatenate([shard.reconstruct_n(0, shard.ntotal) for shard in self.shards])
+        return vectors[start:start + count]
+
+
+class ShardedVectorStore:
+    def __init__(self, root_dir, search_workers=0, nprobe=None, ef_search=None):
+        try:
+            start = time.perf_counter()
+            self.version_dir = current_version_dir(root_dir)
+            if self.version_dir is None:
+                raise FileNotFoundError(f"no sharded index in {root_dir}, run data processing first")
+            with open(os.path.join(self.version_dir, SHARDS_META), "r", encoding="utf-8") as file:
+                self.meta = json.load(file)
+
+            self.offsets = self.meta["offsets"]
+            num_shards = self.meta["num_shards"]
+            indexes, self.texts, self.ids, self.metadatas = [], [], [], []
+            for shard in range(num_shards):
+                directory = shard_dir(self.version_dir, shard)
+                index = faiss.read_index(os.path.join(directory, INDEX_FILE), MMAP_FLAGS)
+                set_search_params(index, nprobe=nprobe, ef_search=ef_search)
+                indexes.append(index)
+                self.texts.append(MmapStrings(os.path.join(directory, "texts")))
+                self.ids.append(MmapStrings(os.path.join(directory, "ids")))
+                self.metadatas.append(MmapStrings(os.path.join(directory, "metadata")))
+
+            # 0 = one search thread per shard
+            workers = search_workers or num_shards
+            self.index = ShardedIndex(indexes, self.offsets, self.meta["metric"], min(workers, num_shards))
+            logger.info(f"Opened {num_shards} shards with {self.index.ntotal} chunks in {1000 * (time.perf_counter() - start):.1f} ms")
+
+        except Exception as e:
+            logger.error("Failed to open the sharded index")
+            raise CustomException("Error while opening the sharded index", e)
+
+    def locate(self, position):
+        # (shard, local position) of a global position
+        if not 0 <= position < self.index.ntotal:
+            return None, None
+        shard = bisect.bisect_right(self.offsets, position) - 1
+        return shard, position - self.offsets[shard]
+
+    def text(self, position):
+        shard, local = self.locate(position)
+        return self.texts[shard][local] if shard is not None else None
+
+    def doc_id(self, position):
+        shard, local = self.locate(position)
+        return self.ids[shard][local] if shard is not None else None
+
+    def metadata(self, position):
+        shard, local = self.locate(position)
+        metadata = self.metadatas[shard][local] if shard is not None else None
+        return json.loads(metadata) if metadata is not None else None
@@ -0,0 +1,159 @@
+import queue
+import threading
+import time
+from src.logger import get_logger
+from src.custom_exception import CustomException
+from src.metrics import span, set_gauge
+
+logger = get_logger(__name__)
+
+# Runs a chain of stages on their own threads, connected by bounded queues. A stage that gets ahead
+# blocks on the full queue in front of the next one (backpressure), so memory stays at about
+# queue_size items per stage, and the wall time tends to the slowest stage instead of the sum.
+#   Stage("fetch", fetch_page, workers=8)          - function(item) returns a list of outputs
+#   Stage("embed", embed_batch, finish=flush)      - finish() returns what is still buffered at the end
+#   StageExecutor([...], queue_size=8).run(items)  - returns the last stage's outputs
+
+_DONE = object()
+
+
+class Stage:
+    def __init__(self, name, function, workers=1, finish=None):
+        self.name = name
+        self.function = function
+        self.workers = workers
+        self.finish = finish
+        self.active = workers
+        self.lock = threading.Lock()
+        # items in / out, seconds working, waiting for input, and blocked on a full output queue
+        self.stats = {"items_in": 0, "items_out": 0, "busy_s": 0.0, "idle_s": 0.0, "blocked_s": 0.0}
+
+    def add(self, key, value):
+        with self.lock:
+            self.stats[key] += value
+
+
+class StageExecutor:
+    def __init__(self, stages, queue_size=8):
+        self.stages = stages
+        self.queue_size = queue_size
+        # queues[i] feeds stages[i]; the last one collects the final outputs
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in stages] + [queue.Queue()]
+        self.stop = threading.Event()
+        self.error = None
+        self.wall_s = None
+
+    def put(self, q, item):
+        # gives up once another stage has failed, so nothing stays blocked on a full queue
+        while not self.stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(self, q):
+        while not self.stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def emit(self, index, stage, outputs):
+        start = time.perf_counter()
+        for output in outputs:
+            if not self.put(self.queues[index + 1], output):
+                return
+            stage.add("items_out", 1)
+        stage.add("blocked_s", time.perf_counter() - start)
+
+    def worker(self, index):
+        stage = self.stages[index]
+        try:
+            while True:
+                start = time.perf_counter()
+                item = self.get(self.queues[index])
+                stage.add("idle_s", time.perf_counter() - start)
+                if item is _DONE:
+                    break
+                stage.add("items_in", 1)
+                set_gauge(f"pipeline_queue_{stage.name}", self.queues[index].qsize())
+
+                start = time.perf_counter()
+                with span(f"pipeline.{stage.name}"):
+                    outputs = stage.function(item)
+                stage.add("busy_s", time.perf_counter() - start)
+                self.emit(index, stage, outputs or [])
+
+            with stage.lock:
+                stage.active -= 1
+                last = stage.active == 0
+            if last and not self.stop.is_set():
+                # the last worker out flushes the stage and tells every worker of the next one
+                if stage.finish is not None:
+                    start = time.perf_counter()
+                    with span(f"pipeline.{stage.name}"):
+                        outputs = stage.finish()
+                    stage.add("busy_s", time.perf_counter() - start)
+                    self.emit(index, stage, outputs or [])
+                next_workers = self.stages[index + 1].workers if index + 1 < len(self.stages) else 1
+                for _ in range(next_workers):
+                    self.put(self.queues[index + 1], _DONE)
+
+        except Exception as e:
+            logger.error(f"Stage {stage.name} failed: {e}")
+            if self.error is None:
+                self.error = (stage.name, e)
+            self.stop.set()
+
+    def feed(self, items):
+        try:
+            for item in items:
+                if not self.put(self.queues[0], item):
+                    return
+            for _ in range(self.stages[0].workers):
+                self.put(self.queues[0], _DONE)
+        except Exception as e:
+            logger.error(f"Reading the pipeline input failed: {e}")
+            if self.error is None:
+                self.error = ("input", e)
+            self.stop.set()
+
+    def run(self, items):
+        start = time.perf_counter()
+        threads = [threading.Thread(target=self.feed, args=(items,), name="pipeline-input", daemon=True)]
+        for index, stage in enumerate(self.stages):
+            threads += [
+                threading.Thread(target=self.worker, args=(index,), name=f"pipeline-{stage.name}-{n}", daemon=True)
+                for n in range(stage.workers)
+            ]
+        for thread in threads:
+            thread.start()
+
+        results = []
+        while True:
+            item = self.get(self.queues[-1])
+            if item is _DONE:
+                break
+            results.append(item)
+        for thread in threads:
+            thread.join()
+        self.wall_s = time.perf_counter() - start
+
+        if self.error is not None:
+            name, e = self.error
+            raise CustomException(f"pipeline stage {name} failed", e)
+        return results
+
+    def report(self):
+        # per stage busy time against the wall time; the busiest stage is the bottleneck
+        lines = [f"{'stage':<10} {'workers':>7} {'in':>7} {'out':>7} {'busy s':>9} {'idle s':>9} {'blocked s':>10}"]
+        for stage in self.stages:
+            s = stage.stats
+            lines.append(f"{stage.name:<10} {stage.workers:>7} {s['items_in']:>7} {s['items_out']:>7} "
+                         f"{s['busy_s']:9.2f} {s['idle_s']:9.2f} {s['blocked_s']:10.2f}")
+        lines.append(f"wall {self.wall_s:.2f} s, sum of busy time per worker "
+                     f"{sum(stage.stats['busy_s'] / stage.workers for stage in self.stages):.2f} s")
+        return "\n".join(lines)
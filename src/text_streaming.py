@@ -0,0 +1,107 @@
+import threading
+import time
+from contextlib import nullcontext
+from src.logger import get_logger
+from src.custom_exception import CustomException
+
+logger = get_logger(__name__)
+
+
+def stream_generate(model, tokenizer, inputs, generation_kwargs, timeout=None, lock=None):
+    # model.generate runs on a background thread and pushes decoded text into the streamer;
+    # the caller iterates text deltas as soon as they are decoded. `lock` (the owner's model lock)
+    # is held by that thread for the whole generate(), the streamer decodes with the shared tokenizer.
+    # Closing the iterator early (stop marker, abandoned stream) stops generate() at its next token.
+    from transformers import TextIteratorStreamer, StoppingCriteriaList
+    streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True, timeout=timeout)
+    stop = threading.Event()
+    errors = []
+
+    def generate():
+        try:
+            with lock or nullcontext():
+                model.generate(**inputs, **generation_kwargs, streamer=streamer,
+                               stopping_criteria=StoppingCriteriaList([StopOnEvent(stop)]))
+        except Exception as e:
+            # unblock the consumer, the error is re-raised on its side
+            errors.append(e)
+            streamer.end()
+
+    thread = threading.Thread(target=generate, name="stream-generate", daemon=True)
+    thread.start()
+    try:
+        for delta in streamer:
+            if delta:
+                yield delta
+    finally:
+        stop.set()
+        thread.join()
+
+    if errors:
+        logger.error("Background generation failed while streaming")
+        raise CustomException("Error while streaming generated text", errors[0])
+
+
+class StopOnEvent:
+    # stopping criterion for generate(): done as soon as the event is set
+    def __init__(self, event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        import torch
+        return torch.full((input_ids.shape[0],), self.event.is_set(), dtype=torch.bool, device=input_ids.device)
+
+
+def close_iterator(deltas):
+    close = getattr(deltas, "close", None)
+    if close is not None:
+        close()
+
+
+def stop_at(deltas, marker):
+    # pass deltas through until `marker` shows up, holding back just enough text to never emit part of it;
+    # stopping early closes `deltas`, which ends the generation behind them
+    buffer = ""
+    try:
+        for delta in deltas:
+            buffer += delta
+            if marker in buffer:
+                head = buffer.split(marker)[0]
+                if head:
+                    yield head
+                return
+            safe = len(buffer) - len(marker) + 1
+            if safe > 0:
+                yield buffer[:safe]
+                buffer = buffer[safe:]
+        if buffer:
+            yield buffer
+    finally:
+        close_iterator(deltas)
+
+
+class StreamTimer:
+    # time to first token and total time of one streamed request
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.ttft = None
+        self.total = None
+
+    def wrap(self, deltas):
+        # the total is taken however the stream ends: exhausted, or closed early by its consumer
+        try:
+            for delta in deltas:
+                if self.ttft is None:
+                    self.ttft = time.perf_counter() - self.start
+                yield delta
+        finally:
+            self.total = time.perf_counter() - self.start
+            if self.ttft is None:
+                self.ttft = self.total
+            close_iterator(deltas)
+
+    def as_dict(self):
+        return {
+            "ttft_ms": round(1000 * self.ttft, 2) if self.ttft is not None else None,
+            "total_ms": round(1000 * self.total, 2) if self.total is not None else None
+        }
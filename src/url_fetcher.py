@@ -0,0 +1,137 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from src.logger import get_logger
+from src.custom_exception import CustomException
+from utils.helpers import parse_and_clean
+
+logger = get_logger(__name__)
+
+
+class HostRateLimiter:
+    # Spaces out requests to the same host to at most `rate` per second
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.lock = threading.Lock()
+        self.next_allowed = {}
+
+    def wait(self, host):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_allowed.get(host, now))
+            self.next_allowed[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class ConcurrentFetcher:
+    def __init__(self, config, cache_path):
+        self.max_workers = config.get("fetch_workers", 8)
+        self.timeout = config.get("fetch_timeout", 10)
+        self.cache_path = cache_path
+        self.rate_limiter = HostRateLimiter(config.get("per_host_rate", 5))
+
+        # pooled keep-alive connections with retries and exponential backoff
+        retry = Retry(
+            total=config.get("fetch_retries", 3),
+            backoff_factor=config.get("fetch_backoff", 0.5),
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["GET"],
+            respect_retry_after_header=True
+        )
+        adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.max_workers, max_retries=retry)
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = "rag-genai/0.1 (ingestion)"
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.http_cache = self.load_cache()
+        self.cache_lock = threading.Lock()
+        self.stats = None
+
+    def load_cache(self):
+        if os.path.exists(self.cache_path):
+            with open(self.cache_path, "r", encoding="utf-8") as file:
+                return json.load(file)
+        return {}
+
+    def save_cache(self):
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        with open(self.cache_path, "w", encoding="utf-8") as file:
+            json.dump(self.http_cache, file, indent=2)
+
+    def reset_stats(self):
+        self.stats = {"fetched": 0, "not_modified": 0, "failed": 0, "bytes_downloaded": 0, "bytes_saved": 0}
+
+    def download(self, url, conditional):
+        # returns (status, raw html) with status in fetched | not_modified | failed; parsing is left
+        # to the caller, so the pipelined ingestion can run it on its own threads
+        headers = {}
+        cached = self.http_cache.get(url)
+        if conditional and cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        self.rate_limiter.wait(urlparse(url).netloc)
+        try:
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+            if response.status_code == 304:
+                with self.cache_lock:
+                    self.stats["not_modified"] += 1
+                    self.stats["bytes_saved"] += (cached or {}).get("bytes", 0)
+                return "not_modified", None
+            response.raise_for_status()
+
+        except requests.RequestException as e:
+            logger.warning(f"Error fetching {url}: {e}")
+            with self.cache_lock:
+                self.stats["failed"] += 1
+            return "failed", None
+
+        with self.cache_lock:
+            self.stats["fetched"] += 1
+            self.stats["bytes_downloaded"] += len(response.content)
+            self.http_cache[url] = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "bytes": len(response.content)
+            }
+        return "fetched", response.content
+
+    def fetch(self, url, conditional):
+        # returns (status, cleaned_text) with status in fetched | not_modified | failed
+        status, content = self.download(url, conditional)
+        if status != "fetched":
+            return status, None
+        text = parse_and_clean(content, url)
+        return ("fetched", text) if text else ("failed", None)
+
+    def fetch_all(self, urls, has_local_copy=lambda url: False):
+        # conditional GET only makes sense when we still hold the page's cleaned text
+        try:
+            self.reset_stats()
+            start = time.perf_counter()
+
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="fetch") as executor:
+                results = dict(zip(urls, executor.map(lambda url: self.fetch(url, has_local_copy(url)), urls)))
+
+            elapsed = time.perf_counter() - start
+            self.stats["seconds"] = round(elapsed, 3)
+            self.stats["pages_per_sec"] = round(len(urls) / elapsed, 2) if elapsed else 0.0
+            self.save_cache()
+            logger.info(f"Fetched {len(urls)} urls: {self.stats}")
+            return results
+
+        except Exception as e:
+            logger.error("Failed to fetch urls concurrently")
+            raise CustomException("Error while fetching urls concurrently", e)
@@ -1,11 +1,21 @@
-import requests
-from bs4 import BeautifulSoup
 import re
+import hashlib
+
+# requests and bs4 are imported by the functions that fetch and parse, so callers that only
+# need content_hash / source_file_name (retrieval, generation) do not pay for them
+
+def source_file_name(url):
+    # stable, filesystem safe name for the cleaned text of one source URL
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()[:16] + '.txt'
+
+def content_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
 
 def clean_text(content):
     return re.sub(r'\[\d+\]', '', content)
 
 def fetch_and_clean(url):
+    import requests
     try:
         response = requests.get(url, timeout=10)
         response.raise_for_status()
@@ -13,7 +23,11 @@ def fetch_and_clean(url):
         print(f"Error fetching {url}: {e}")
         return None
     # usually have text, status_code, headers,json,cookies,url,content
-    soup = BeautifulSoup(response.content, 'html.parser')
+    return parse_and_clean(response.content, url)
+
+def parse_and_clean(html_content, url):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html_content, 'html.parser')
     content = soup.find('div', {'class': 'mw-parser-output'})
     if not content:
         print(f"No main content found at {url}")